@@ -0,0 +1,81 @@
+"""
+Compare DBSCAN and voxel-connectivity clustering on synthetic scans.
+
+Each cloud is a dense main object (a noisy box surface) plus uniformly scattered floaters
+and a few small detached blobs. For each method we report run time, the size of the
+largest cluster, and its overlap (Jaccard) with DBSCAN's largest cluster.
+
+    python benchmarks/bench_clustering.py --sizes 100000 1000000 --eps 0.2 0.4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import open3d as o3d
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'backend'))
+
+from clean_ply import cluster_labels
+
+
+def synthetic_cloud(n, rng, floater_ratio=0.02, blobs=5):
+    """Points on the surface of a 10 x 6 x 4 box with jitter, plus floating noise and blobs."""
+    n_floaters = int(n * floater_ratio)
+    n_surface = n - n_floaters
+    size = np.array([10.0, 6.0, 4.0])
+    surface = rng.uniform(0, 1, (n_surface, 3)) * size
+    axis = rng.integers(0, 3, n_surface)
+    surface[np.arange(n_surface), axis] = rng.integers(0, 2, n_surface) * size[axis]
+    surface += rng.normal(0, 0.01, surface.shape)
+
+    noise = rng.uniform(-1, 2, (n_floaters // 2, 3)) * size  # Scattered through a box 3x the object's size
+    centers = rng.uniform(-10, 20, (blobs, 3))
+    blob = centers[rng.integers(0, blobs, n_floaters - len(noise))] + rng.normal(0, 0.1, (n_floaters - len(noise), 3))
+    return np.vstack([surface, noise, blob])
+
+
+def largest_cluster(labels):
+    valid = labels[labels >= 0]
+    if len(valid) == 0:
+        return np.zeros(len(labels), dtype=bool)
+    return labels == np.argmax(np.bincount(valid))
+
+
+def run(points, eps, min_points, methods):
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    results = {}
+    for method in methods:
+        started = time.perf_counter()
+        labels = cluster_labels(pcd, eps, min_points, method)
+        results[method] = (time.perf_counter() - started, largest_cluster(labels))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark clean_ply clustering methods')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50_000, 200_000, 1_000_000])
+    parser.add_argument('--eps', type=float, nargs='+', default=[0.2, 0.4])
+    parser.add_argument('--min-points', type=int, default=50)
+    parser.add_argument('--methods', nargs='+', default=['dbscan', 'voxel'], choices=['dbscan', 'voxel'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'points':>10} {'eps':>5} {'method':>7} {'seconds':>9} {'kept':>10} {'kept %':>7} {'jaccard':>8}")
+    for n in args.sizes:
+        points = synthetic_cloud(n, rng)
+        for eps in args.eps:
+            results = run(points, eps, args.min_points, args.methods)
+            reference = results.get('dbscan', next(iter(results.values())))[1]
+            for method, (seconds, kept) in results.items():
+                union = np.count_nonzero(kept | reference)
+                jaccard = np.count_nonzero(kept & reference) / union if union else 1.0
+                print(f"{len(points):>10} {eps:>5} {method:>7} {seconds:>9.3f} {kept.sum():>10} "
+                      f"{100 * kept.mean():>6.1f}% {jaccard:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare YOLO throughput with and without cross-stream batching in the inference server.
+
+N threads stand in for N drone pipelines, each sending frames one at a time and waiting
+for the result, like FramePipeline's inference stage. Runs once with batching disabled
+(max_batch=1, so every frame is its own forward pass) and once batching up to N frames.
+
+    python benchmarks/bench_inference.py --streams 1 2 4 8 --frames 50 --weights yolo11n.pt
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'backend'))
+
+from inference_server import InferenceServer
+from model_registry import ModelRegistry, load_yolo, warmup_yolo
+
+
+def run(registry, name, streams, frames, max_batch, max_wait, size):
+    server = InferenceServer(name, max_batch=max_batch, max_wait=max_wait, registry=registry)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8) for _ in range(streams)]
+
+    def stream(image):
+        for _ in range(frames):
+            server.infer(image)
+
+    threads = [threading.Thread(target=stream, args=(image,)) for image in images]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.stop()
+    return streams * frames / elapsed, server.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched inference across streams')
+    parser.add_argument('--weights', default='yolo11x.pt')
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--frames', type=int, default=50, help='Frames per stream')
+    parser.add_argument('--max-wait', type=float, default=0.005, help='Batching latency budget in seconds')
+    parser.add_argument('--size', type=int, nargs=2, default=[960, 720], metavar=('W', 'H'))
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    registry.register(args.weights, lambda: load_yolo(args.weights), warmup_yolo)
+    registry.get(args.weights)
+
+    print(f"{'streams':>7} {'mode':>9} {'frames/s':>9} {'mean batch':>11} {'queue ms':>9} {'forward ms':>11}")
+    for streams in args.streams:
+        for mode, max_batch in (("unbatched", 1), ("batched", streams)):
+            fps, stats = run(registry, args.weights, streams, args.frames, max_batch, args.max_wait, args.size)
+            print(f"{streams:>7} {mode:>9} {fps:>9.1f} {stats['mean_batch']:>11.2f} "
+                  f"{stats['queue_wait']['avg_ms']:>9.1f} {stats['forward']['avg_ms']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
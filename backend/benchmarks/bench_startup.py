@@ -0,0 +1,91 @@
+"""
+Measure backend startup: how long until the server answers, and until models are warm.
+
+Runs `uvicorn main:app` from src/backend several times and records, per run:
+  - import: seconds to `import main` in a fresh interpreter
+  - first response: process start -> first answer from /api/health
+  - drone_status: process start -> first answer (any status) from /api/drone_status
+  - ready: process start -> /api/health reports ready (models warm, database set up)
+
+    python benchmarks/bench_startup.py --runs 3 --port 8765
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'backend')
+
+
+def request(url, timeout=1.0):
+    """Status code and body of a GET, or None if nothing is listening yet."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def import_time():
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def serve_times(port, ready_timeout):
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)], cwd=SRC,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    times = {"first response": None, "drone_status": None, "ready": None}
+    try:
+        while time.perf_counter() - started < ready_timeout and times["ready"] is None:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            elapsed = time.perf_counter() - started
+            health = request(base + "/api/health")
+            if health is not None:
+                times["first response"] = times["first response"] or elapsed
+                if times["drone_status"] is None and request(base + "/api/drone_status") is not None:
+                    times["drone_status"] = time.perf_counter() - started
+                if health[0] == 200 and json.loads(health[1]).get("ready"):
+                    times["ready"] = time.perf_counter() - started
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark backend startup time')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ready-timeout', type=float, default=180.0, help='Give up waiting for readiness after this many seconds')
+    args = parser.parse_args()
+
+    results = {"import": [], "first response": [], "drone_status": [], "ready": []}
+    for run in range(args.runs):
+        results["import"].append(import_time())
+        for name, seconds in serve_times(args.port, args.ready_timeout).items():
+            if seconds is not None:
+                results[name].append(seconds)
+        print(f"run {run + 1}: " + ", ".join(f"{k} {v[-1]:.2f}s" for k, v in results.items() if len(v) == run + 1))
+
+    print(f"\n{'stage':<16} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for name, values in results.items():
+        if values:
+            print(f"{name:<16} {statistics.median(values):>9.2f} {min(values):>7.2f} {max(values):>7.2f}")
+        else:
+            print(f"{name:<16} {'n/a':>9}")
+
+
+if __name__ == '__main__':
+    main()
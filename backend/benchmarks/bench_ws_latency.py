@@ -0,0 +1,144 @@
+"""
+Measure detection-to-client latency on /ws with many viewers, some of them slow.
+
+Starts `uvicorn main:app` from src/backend with DRONE_SIMULATED drones (so no hardware is
+needed; the usual .env with database settings and the YOLO weights are), deploys them over
+/ws, then connects viewers using the binary transport. Each DRONE_DATA frame carries its
+capture time, so per viewer we record arrival - capture: the time from the camera frame to
+its detections reaching the client. Slow viewers sleep after every message to simulate a
+bad link; with per-client queues they should not hold back the others. The server's own
+publish -> delivery lag per subscriber comes from /api/metrics.
+
+    python benchmarks/bench_ws_latency.py --clients 1 10 50 --slow 2 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import websockets
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src', 'backend')
+sys.path.insert(0, SRC)
+
+from transport import unpack_frame
+
+
+def get_json(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float('nan')
+
+
+async def viewer(url, duration, delay, latencies):
+    async with websockets.connect(url, max_size=None) as ws:
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.01, deadline - time.time()))
+            except asyncio.TimeoutError:
+                break
+            if isinstance(message, bytes):
+                _, timestamp, _, _, _ = unpack_frame(message)
+                latencies.append(time.time() - timestamp)
+            if delay:
+                await asyncio.sleep(delay)
+
+
+async def deploy(base, drones, timeout):
+    async with websockets.connect(f"{base}/ws?transport=binary", max_size=None) as ws:
+        for i in range(drones):
+            await ws.send(json.dumps({"event": "DEPLOY", "droneId": f"drone-{i + 1}"}))
+        # Wait until the first drone streams; a rejected command fails at once
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if isinstance(message, bytes):
+                return True
+            event = json.loads(message)
+            if event.get("event") == "error":
+                raise RuntimeError(f"Deploy failed: {event.get('message')}")
+    return False
+
+
+async def hub_lag(http, after):
+    """Median publish -> delivery lag over the server's open subscriptions, sampled mid-run."""
+    await asyncio.sleep(after)
+    metrics = await asyncio.to_thread(get_json, http + "/api/metrics", 5.0) or {}
+    lags = [s["lag_ms"] for s in metrics.get("hub", {}).get("subscribers", []) if s.get("lag_ms") is not None]
+    return statistics.median(lags) if lags else float('nan')
+
+
+async def run_load(base, http, clients, slow, slow_delay, drones, duration):
+    fast_latencies, slow_latencies = [], []
+    tasks = []
+    for i in range(clients):
+        is_slow = i < slow
+        url = f"{base}/ws?transport=binary&drone=drone-{i % drones + 1}"
+        tasks.append(viewer(url, duration, slow_delay if is_slow else 0.0, slow_latencies if is_slow else fast_latencies))
+    lag, *_ = await asyncio.gather(hub_lag(http, duration / 2), *tasks)
+    return fast_latencies, slow_latencies, lag
+
+
+def report(clients, group, latencies, viewers, duration, lag):
+    if not viewers:
+        return
+    ms = [v * 1000 for v in latencies]
+    print(f"{clients:>7} {group:>5} {len(latencies) / viewers / duration:>10.1f} "
+          f"{percentile(ms, 0.5):>8.1f} {percentile(ms, 0.95):>8.1f} {max(ms, default=float('nan')):>8.1f} {lag:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /ws detection-to-client latency under load')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--slow', type=int, default=2, help='How many of the viewers are slow')
+    parser.add_argument('--slow-delay', type=float, default=0.5, help='Seconds a slow viewer spends per message')
+    parser.add_argument('--drones', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per load level')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--start-timeout', type=float, default=180.0)
+    args = parser.parse_args()
+
+    http, ws = f"http://127.0.0.1:{args.port}", f"ws://127.0.0.1:{args.port}"
+    env = {**os.environ, "DRONE_SIMULATED": str(args.drones)}
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port)], cwd=SRC,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        started = time.time()
+        while get_json(http + "/api/health") is None:
+            if server.poll() is not None or time.time() - started > args.start_timeout:
+                raise RuntimeError("Server did not start")
+            time.sleep(0.2)
+        if not asyncio.run(deploy(ws, args.drones, args.start_timeout)):
+            raise RuntimeError("No frames arrived after deploying")
+
+        print(f"{'clients':>7} {'group':>5} {'frames/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'hub lag ms':>11}")
+        for clients in args.clients:
+            slow = min(args.slow, clients - 1)
+            fast_latencies, slow_latencies, lag = asyncio.run(
+                run_load(ws, http, clients, slow, args.slow_delay, args.drones, args.duration))
+            report(clients, "fast", fast_latencies, clients - slow, args.duration, lag)
+            report(clients, "slow", slow_latencies, slow, args.duration, lag)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
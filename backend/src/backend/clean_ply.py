@@ -1,47 +1,257 @@
+import argparse
 import open3d as o3d
 import numpy as np
 import logging
 from tqdm import tqdm
+from octree_tiles import build_tiles
 
-def remove_floating_artifacts(input_file, output_file, voxel_size=0.1, min_points=50, eps=0.2):
-    logging.info(f"Starting to process {input_file}")
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+def read_ply_header(path):
+    """
+    Parse a PLY header. Returns (format, vertex count, vertex dtype, data offset), where the
+    dtype is None if the vertex layout cannot be memory-mapped (list properties, or other
+    elements stored before the vertices).
+    """
+    with open(path, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise ValueError(f"{path} is not a PLY file")
+        fmt, count, props, element, mappable = None, 0, [], None, True
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"Truncated PLY header in {path}")
+            tokens = line.split()
+            if not tokens:
+                continue
+            if tokens[0] == b'format':
+                fmt = tokens[1].decode()
+            elif tokens[0] == b'element':
+                element = tokens[1].decode()
+                if element == 'vertex':
+                    count = int(tokens[2])
+                elif count == 0:
+                    mappable = False  # Another element precedes the vertices
+            elif tokens[0] == b'property' and element == 'vertex':
+                if tokens[1] == b'list':
+                    mappable = False
+                else:
+                    props.append((tokens[2].decode(), PLY_TYPES[tokens[1].decode()]))
+            elif tokens[0] == b'end_header':
+                offset = f.tell()
+                break
+
+    if fmt == 'ascii' or not mappable:
+        return fmt, count, None, offset
+    endian = '<' if fmt == 'binary_little_endian' else '>'
+    return fmt, count, np.dtype([(name, endian + t) for name, t in props]), offset
+
+def iter_ply_chunks(path, chunk_points):
+    """Yield (xyz, rgb or None) float64 arrays from a binary PLY, memory-mapped chunk by chunk."""
+    _, count, dtype, offset = read_ply_header(path)
+    vertices = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+    has_color = all(c in dtype.names for c in ('red', 'green', 'blue'))
+    for start in tqdm(range(0, count, chunk_points), desc="Reading chunks", unit="chunk"):
+        chunk = vertices[start:start + chunk_points]
+        xyz = np.stack([chunk['x'], chunk['y'], chunk['z']], axis=1).astype(np.float64)
+        rgb = None
+        if has_color:
+            rgb = np.stack([chunk['red'], chunk['green'], chunk['blue']], axis=1).astype(np.float64)
+            if dtype['red'].kind in 'ui':
+                rgb /= np.iinfo(dtype['red']).max
+        yield xyz, rgb
+
+def _reduce_voxels(keys, sums, counts):
+    """Merge rows that share a voxel key, summing their coordinate/color sums and counts."""
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    merged = np.stack([np.bincount(inverse, weights=sums[:, i], minlength=len(unique_keys))
+                       for i in range(sums.shape[1])], axis=1)
+    return unique_keys, merged, np.bincount(inverse, weights=counts, minlength=len(unique_keys))
+
+def voxel_downsample_chunks(chunks, voxel_size, origin=(0.0, 0.0, 0.0)):
+    """
+    Voxel down-sample a stream of (xyz, rgb) chunks by averaging the points in each voxel.
+    Memory is bounded by the number of occupied voxels, not by the number of input points.
+    Voxels are counted from `origin`; open3d's voxel_down_sample uses min bound - voxel_size / 2.
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    keys, sums, counts = None, None, None
+    has_color = None
+    for xyz, rgb in chunks:
+        has_color = rgb is not None
+        values = np.hstack([xyz, rgb]) if has_color else xyz
+        chunk_keys, chunk_sums, chunk_counts = _reduce_voxels(
+            np.floor((xyz - origin) / voxel_size).astype(np.int64), values, np.ones(len(xyz)))
+        if keys is None:
+            keys, sums, counts = chunk_keys, chunk_sums, chunk_counts
+        else:
+            keys, sums, counts = _reduce_voxels(np.vstack([keys, chunk_keys]),
+                                                np.vstack([sums, chunk_sums]),
+                                                np.concatenate([counts, chunk_counts]))
+
+    pcd = o3d.geometry.PointCloud()
+    if keys is None:
+        return pcd
+    means = sums / counts[:, None]
+    pcd.points = o3d.utility.Vector3dVector(means[:, :3])
+    if has_color:
+        pcd.colors = o3d.utility.Vector3dVector(means[:, 3:6])
+    return pcd
+
+def load_downsampled(input_file, voxel_size, chunk_points=10_000_000):
+    """Load and voxel down-sample a point cloud, streaming large binary PLY files in chunks."""
+    dtype, count = None, 0
+    if input_file.lower().endswith('.ply'):
+        _, count, dtype, _ = read_ply_header(input_file)
+
+    if dtype is not None and count > chunk_points:
+        logging.info(f"Streaming {count} points in chunks of {chunk_points}...")
+        # A first pass finds the bounds, so the grid lines up with open3d's in-memory path
+        min_bound = np.min([xyz.min(axis=0) for xyz, _ in iter_ply_chunks(input_file, chunk_points)], axis=0)
+        return voxel_downsample_chunks(iter_ply_chunks(input_file, chunk_points), voxel_size,
+                                       min_bound - voxel_size / 2)
 
-    # Load the point cloud
-    logging.info("Loading point cloud...")
     pcd = o3d.io.read_point_cloud(input_file)
     logging.info(f"Loaded point cloud with {len(pcd.points)} points")
+    return pcd.voxel_down_sample(voxel_size)
+
+# The 13 neighbour offsets that are lexicographically positive; with their negations they
+# make up the full 26-neighbourhood, so each adjacent voxel pair is visited once
+NEIGHBOR_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                             if (dx, dy, dz) > (0, 0, 0)], dtype=np.int64)
+
+def _connected_components(n, i, j):
+    """Label the components of an n-node graph with edges (i, j) by min-label hooking and pointer jumping."""
+    labels = np.arange(n)
+    while True:
+        # Hook each root onto the smallest root it shares an edge with; parents are always smaller, so no cycles
+        lo = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, labels[i], lo)
+        np.minimum.at(labels, labels[j], lo)
+        # Pointer jumping flattens every tree so labels[x] is its root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels[i], labels[j]):
+            return labels
+
+def voxel_cluster(points, eps, min_points):
+    """
+    Cluster points by connectivity of the occupied voxels of a grid with cell size `eps`.
+    Voxels touching in the 26-neighbourhood join the same cluster. Returns DBSCAN-style
+    per-point labels, where clusters with fewer than `min_points` points are noise (-1).
+    Runs in near-linear time, unlike DBSCAN whose cost grows with `eps`.
+    """
+    points = np.asarray(points)
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    keys = np.floor(points / eps).astype(np.int64)
+    keys -= keys.min(axis=0) - 1  # Leave an empty layer so -1 offsets never wrap
+    dims = keys.max(axis=0) + 2
+    strides = np.array([dims[1] * dims[2], dims[2], 1], dtype=np.int64)
+    codes, point_voxel, voxel_counts = np.unique(keys @ strides, return_inverse=True, return_counts=True)
+    point_voxel = point_voxel.reshape(-1)
+
+    # Find occupied neighbours by binary search over the sorted voxel codes
+    edges_i, edges_j = [], []
+    for offset in NEIGHBOR_OFFSETS @ strides:
+        neighbors = codes + offset
+        found = np.searchsorted(codes, neighbors)
+        found[found == len(codes)] = 0
+        hit = codes[found] == neighbors
+        edges_i.append(np.nonzero(hit)[0])
+        edges_j.append(found[hit])
+    voxel_labels = _connected_components(len(codes), np.concatenate(edges_i), np.concatenate(edges_j))
 
-    # Voxel down-sampling to reduce computation time
-    logging.info("Performing voxel down-sampling...")
-    downsampled_pcd = pcd.voxel_down_sample(voxel_size)
+    # Drop small components and renumber the rest 0..k-1
+    roots, voxel_labels = np.unique(voxel_labels, return_inverse=True)
+    sizes = np.bincount(voxel_labels.reshape(-1), weights=voxel_counts, minlength=len(roots))
+    keep = sizes >= min_points
+    renumber = np.full(len(roots), -1, dtype=np.int64)
+    renumber[keep] = np.arange(keep.sum())
+    return renumber[voxel_labels.reshape(-1)][point_voxel]
+
+def cluster_labels(pcd, eps, min_points, method='dbscan'):
+    """Per-point cluster labels (-1 for noise) using open3d's DBSCAN or voxel connectivity."""
+    if method == 'voxel':
+        return voxel_cluster(np.asarray(pcd.points), eps, min_points)
+    if method == 'dbscan':
+        return np.array(pcd.cluster_dbscan(eps=eps, min_points=min_points))
+    raise ValueError(f"Unknown clustering method: {method}")
+
+def remove_floating_artifacts(input_file, output_file, voxel_size=0.1, min_points=50, eps=0.2,
+                              max_retries=5, chunk_points=10_000_000, cluster_method='dbscan',
+                              tiles_dir=None):
+    logging.info(f"Starting to process {input_file}")
+
+    # Load the point cloud once; voxel down-sampling reduces computation time
+    logging.info("Loading and down-sampling point cloud...")
+    downsampled_pcd = load_downsampled(input_file, voxel_size, chunk_points)
     logging.info(f"Down-sampled to {len(downsampled_pcd.points)} points")
 
-    # Compute normals
-    logging.info("Computing normals...")
-    downsampled_pcd.estimate_normals(search_param=o3d.geometry.KDTreeSearchParamHybrid(radius=0.2, max_nn=50))
-    logging.info("Normals computed")
-
-    # Cluster the point cloud
-    logging.info("Clustering point cloud...")
-    labels = np.array(downsampled_pcd.cluster_dbscan(eps=eps, min_points=min_points))
-    logging.info(f"Clustering complete. Found {len(np.unique(labels[labels >= 0]))} clusters")
-
-    # Check if any clusters were found
-    if len(labels[labels >= 0]) > 0:
-        # Get the largest cluster (assumed to be the main object)
-        largest_cluster_label = np.argmax(np.bincount(labels[labels >= 0]))
-        
-        # Create a new point cloud with only the largest cluster
-        cleaned_pcd = downsampled_pcd.select_by_index(np.where(labels == largest_cluster_label)[0])
-        
-        # Save the cleaned point cloud
-        o3d.io.write_point_cloud(output_file, cleaned_pcd)
-        logging.info(f"Cleaned point cloud saved to {output_file}")
-    else:
+    for attempt in range(max_retries + 1):
+        # Cluster the point cloud
+        logging.info(f"Clustering point cloud ({cluster_method})...")
+        labels = cluster_labels(downsampled_pcd, eps, min_points, cluster_method)
+        logging.info(f"Clustering complete. Found {len(np.unique(labels[labels >= 0]))} clusters")
+
+        # Check if any clusters were found
+        if len(labels[labels >= 0]) > 0:
+            # Get the largest cluster (assumed to be the main object)
+            largest_cluster_label = np.argmax(np.bincount(labels[labels >= 0]))
+
+            # Create a new point cloud with only the largest cluster
+            cleaned_pcd = downsampled_pcd.select_by_index(np.where(labels == largest_cluster_label)[0])
+
+            # Save the cleaned point cloud
+            o3d.io.write_point_cloud(output_file, cleaned_pcd)
+            logging.info(f"Cleaned point cloud saved to {output_file}")
+
+            # Optionally export level-of-detail tiles for the map viewer
+            if tiles_dir:
+                colors = np.asarray(cleaned_pcd.colors) if cleaned_pcd.has_colors() else None
+                index = build_tiles(np.asarray(cleaned_pcd.points), colors, tiles_dir)
+                logging.info(f"Wrote {len(index['nodes'])} octree tiles to {tiles_dir}")
+            return cleaned_pcd
+
+        if attempt == max_retries:
+            break
         logging.warning("No clusters found. Trying with more relaxed parameters...")
-        return remove_floating_artifacts(input_file, output_file, voxel_size * 1.5, min_points - 10, eps * 1.5)
+        voxel_size, min_points, eps = voxel_size * 1.5, max(1, min_points - 10), eps * 1.5
+        # Coarsen the cloud already in memory instead of re-reading the input
+        downsampled_pcd = downsampled_pcd.voxel_down_sample(voxel_size)
+
+    raise RuntimeError(f"No clusters found in {input_file} after {max_retries} retries")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Remove floating artifacts from a point cloud')
+    parser.add_argument('input_file', type=str, help='Path to the input point cloud')
+    parser.add_argument('output_file', type=str, help='Path to the cleaned output point cloud')
+    parser.add_argument('--voxel-size', type=float, default=0.1, help='Voxel size for down-sampling')
+    parser.add_argument('--min-points', type=int, default=50, help='Minimum points per cluster')
+    parser.add_argument('--eps', type=float, default=0.2, help='DBSCAN neighbourhood radius')
+    parser.add_argument('--chunk-points', type=int, default=10_000_000,
+                        help='Binary PLY files with more points than this are streamed in chunks of this size')
+    parser.add_argument('--cluster-method', choices=['dbscan', 'voxel'], default='dbscan',
+                        help='DBSCAN, or the faster voxel-grid connectivity clustering')
+    parser.add_argument('--tiles', type=str, default=None,
+                        help='Also export octree level-of-detail tiles to this directory')
+    args = parser.parse_args()
+
+    remove_floating_artifacts(args.input_file, args.output_file, args.voxel_size, args.min_points,
+                              args.eps, chunk_points=args.chunk_points, cluster_method=args.cluster_method,
+                              tiles_dir=args.tiles)
 
-# Example usage
-input_file = "jas.ply"
-output_file = "cleaned_jas.ply"
-remove_floating_artifacts(input_file, output_file)
+if __name__ == '__main__':
+    main()
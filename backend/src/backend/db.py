@@ -0,0 +1,389 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+def run_query(conn, sql, params=None):
+    """Execute one statement on a DB-API connection. Returns (columns, rows); writes are committed."""
+    with conn.cursor() as cursor:
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, params)
+        if cursor.description is None:
+            conn.commit()
+            return [], []
+        return [column[0] for column in cursor.description], cursor.fetchall()
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of blocking DB-API connections for use from async code.
+
+    Connections are opened lazily up to `size` and checked out per request. Every call on a
+    connection runs in a worker thread, so the event loop never blocks on the driver. A
+    connection idle for longer than `health_check_interval`, or one whose last user hit an
+    error, is pinged on checkout and transparently replaced if it is dead.
+    """
+
+    def __init__(self, connect, size=4, health_check_interval=30.0):
+        self._connect = connect
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self._idle = asyncio.Queue()  # Connections, or None for a free slot a waiter should open
+        self._checked_at = {}  # id(conn) -> last time it was known to be healthy
+        self._opened = 0
+        self._vacant = 0  # None entries in _idle
+
+        self.checkouts = 0
+        self.reconnects = 0
+        self.total_wait_time = 0.0
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            run_query(conn, "SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _free_slot(self):
+        # Wakes a caller waiting for an idle connection, which then opens a new one
+        self._vacant += 1
+        self._idle.put_nowait(None)
+
+    async def _open(self):
+        self._opened += 1
+        try:
+            conn = await asyncio.to_thread(self._connect)
+        except BaseException:
+            self._opened -= 1
+            self._free_slot()
+            raise
+        self._checked_at[id(conn)] = time.monotonic()
+        return conn
+
+    async def _acquire(self):
+        if self._idle.empty() and self._opened < self.size:
+            return await self._open()
+
+        conn = await self._idle.get()
+        if conn is None:
+            self._vacant -= 1
+            return await self._open()
+        if time.monotonic() - self._checked_at.get(id(conn), 0.0) > self.health_check_interval:
+            if await asyncio.to_thread(self._ping, conn):
+                self._checked_at[id(conn)] = time.monotonic()
+            else:
+                logging.warning("Pooled database connection is dead, reconnecting")
+                self._discard(conn)
+                self.reconnects += 1
+                return await self._open()
+        return conn
+
+    def _forget(self, conn):
+        self._checked_at.pop(id(conn), None)
+        self._opened -= 1
+
+    def _discard(self, conn):
+        self._forget(conn)
+        self._close(conn)
+
+    def _close_abandoned(self, future, conn):
+        if not future.cancelled():
+            future.exception()  # Nobody awaits it any more; don't warn about an unretrieved error
+        self._close(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        start = time.perf_counter()
+        conn = await self._acquire()
+        self.checkouts += 1
+        self.total_wait_time += time.perf_counter() - start
+        try:
+            yield conn
+        except Exception:
+            # Force a health check before this connection is handed out again
+            self._checked_at[id(conn)] = 0.0
+            self._idle.put_nowait(conn)
+            raise
+        except BaseException:
+            # Cancelled: a worker thread may still be using the connection, so it never goes
+            # back to the pool (run closes it once the thread is done) and a new one replaces it
+            self._forget(conn)
+            self._free_slot()
+            raise
+        else:
+            self._idle.put_nowait(conn)
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) on a pooled connection in a worker thread."""
+        async with self.connection() as conn:
+            future = asyncio.get_running_loop().run_in_executor(None, fn, conn, *args)
+            try:
+                # Shielded so the thread's future outlives a cancelled caller
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(lambda _: self._close_abandoned(future, conn))
+                raise
+
+    async def query(self, sql, params=None):
+        return await self.run(run_query, sql, params)
+
+    async def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is None:
+                self._vacant -= 1
+            else:
+                self._discard(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "open": self._opened,
+            "idle": self._idle.qsize() - self._vacant,
+            "checkouts": self.checkouts,
+            "reconnects": self.reconnects,
+            "avg_wait_ms": self.total_wait_time / self.checkouts * 1000 if self.checkouts else 0.0,
+        }
+
+
+class SingleStoreBackend:
+    """Runs batched statements on pooled singlestoredb connections."""
+
+    placeholder = "%s"
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @staticmethod
+    def _executemany(conn, sql, rows):
+        with conn.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        conn.commit()
+
+    @staticmethod
+    def _insert_each(conn, sql, rows):
+        ids = []
+        with conn.cursor() as cursor:
+            for row in rows:
+                cursor.execute(sql, row)
+                ids.append(cursor.lastrowid)
+        conn.commit()
+        return ids
+
+    async def executemany(self, sql, rows):
+        await self.pool.run(self._executemany, sql, rows)
+
+    async def insert_each(self, sql, rows):
+        """Insert rows one statement at a time in one transaction; returns their ids."""
+        return await self.pool.run(self._insert_each, sql, rows)
+
+
+class SQLiteBackend:
+    """Drop-in stand-in for SingleStoreBackend, e.g. for local development and tests."""
+
+    placeholder = "?"
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _executemany(self, sql, rows):
+        with self._lock:
+            self.conn.executemany(sql, rows)
+            self.conn.commit()
+
+    def _insert_each(self, sql, rows):
+        with self._lock:
+            ids = [self.conn.execute(sql, row).lastrowid for row in rows]
+            self.conn.commit()
+        return ids
+
+    async def executemany(self, sql, rows):
+        await asyncio.to_thread(self._executemany, sql, rows)
+
+    async def insert_each(self, sql, rows):
+        return await asyncio.to_thread(self._insert_each, sql, rows)
+
+
+class SQLiteConnection:
+    """
+    sqlite3 behind the DB-API surface this module uses (cursors as context managers), so a
+    ConnectionPool and everything on top of it runs against SQLite in development and tests.
+    """
+
+    class _Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def __enter__(self):
+            return self._cursor
+
+        def __exit__(self, *exc):
+            self._cursor.close()
+
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+    def cursor(self):
+        return self._Cursor(self.conn.cursor())
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class BatchWriter:
+    """
+    Write-behind buffer for INSERTs.
+
+    `add` only appends to an in-memory buffer; a background task groups buffered rows by
+    table and columns and writes each group with one executemany when `max_batch` rows are
+    waiting or `flush_interval` seconds have passed. The buffer holds at most `max_buffered`
+    rows: when the database falls behind, the oldest rows are dropped and counted.
+
+    Rows added with `on_written` need their ids, which executemany does not report; those
+    are inserted one statement at a time (still one transaction per group) and the callback
+    gets each row's id.
+
+    A group whose insert fails is retried with the next flushes after `retry_backoff`
+    seconds, doubling each time, up to `max_retries` times. After that its rows are
+    dropped and counted, and their `on_written` callbacks get None.
+    """
+
+    def __init__(self, backend, max_batch=500, flush_interval=1.0, max_buffered=10000, max_retries=3,
+                 retry_backoff=1.0):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._buffer = deque(maxlen=max_buffered)
+        self._retries = []  # (due time, attempt, [(table, columns, values, on_written)]) for failed groups
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self.on_flush = []  # Callbacks called with the table name after rows were written to it
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.total_flush_time = 0.0
+
+    def add(self, table, row, on_written=None):
+        """Queue one row (a column -> value dict) for insertion into `table`; `on_written(id)` follows the insert."""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.rows_dropped += 1
+        self._buffer.append((table, tuple(row), tuple(row.values()), on_written))
+        if len(self._buffer) >= self.max_batch:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and flush what is left; failed groups get one last try now."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(final=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _written(self, table, callbacks, ids):
+        for on_written, row_id in zip(callbacks, ids):
+            if on_written is None:
+                continue
+            try:
+                on_written(row_id)
+            except Exception:
+                logging.exception(f"Callback for a row written to {table} failed")
+
+    async def flush(self, final=False):
+        async with self._flush_lock:
+            now = time.monotonic()
+            due = [retry for retry in self._retries if final or retry[0] <= now]
+            if not self._buffer and not due:
+                return
+            self._retries = [retry for retry in self._retries if not (final or retry[0] <= now)]
+
+            # A group is keyed by (table, columns, whether ids are needed) and remembers its attempt
+            groups = {}
+            for _, attempt, entries in due:
+                groups.setdefault((entries[0][0], entries[0][1], entries[0][3] is not None, attempt), []).extend(entries)
+            for entry in self._buffer:
+                groups.setdefault((entry[0], entry[1], entry[3] is not None, 0), []).append(entry)
+            self._buffer.clear()
+
+            start = time.perf_counter()
+            for (table, columns, need_ids, attempt), entries in groups.items():
+                rows = [entry[2] for entry in entries]
+                callbacks = [entry[3] for entry in entries]
+                placeholders = ", ".join([self.backend.placeholder] * len(columns))
+                sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                try:
+                    if need_ids:
+                        ids = await self.backend.insert_each(sql, rows)
+                    else:
+                        await self.backend.executemany(sql, rows)
+                    self.rows_written += len(rows)
+                except Exception:
+                    self.errors += 1
+                    if attempt < self.max_retries and not final:
+                        logging.exception(f"Batch insert of {len(rows)} rows into {table} failed, will retry")
+                        self._retries.append((time.monotonic() + self.retry_backoff * 2 ** attempt, attempt + 1, entries))
+                    else:
+                        logging.exception(f"Batch insert of {len(rows)} rows into {table} failed, dropping them")
+                        self.rows_dropped += len(rows)
+                        self._written(table, callbacks, [None] * len(rows))
+                    continue
+                for callback in self.on_flush:
+                    callback(table)
+                if need_ids:
+                    self._written(table, callbacks, ids)
+            elapsed = time.perf_counter() - start
+
+            self.flushes += 1
+            self.last_flush_time = elapsed
+            self.max_flush_time = max(self.max_flush_time, elapsed)
+            self.total_flush_time += elapsed
+
+    def stats(self):
+        return {
+            "buffered": len(self._buffer),
+            "retrying": sum(len(entries) for _, _, entries in self._retries),
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "last_flush_ms": self.last_flush_time * 1000,
+            "max_flush_ms": self.max_flush_time * 1000,
+            "avg_flush_ms": self.total_flush_time / self.flushes * 1000 if self.flushes else 0.0,
+        }
@@ -2,16 +2,20 @@ from uagents import Agent, Context, Model
 from typing import List
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import base64
-from djitellopy import Tello
 import time
-import netifaces
+import asyncio
+import logging
+from fleet import Fleet
+from overlay import OverlayRenderer
+from model_registry import registry, load_yolo, warmup_yolo
+from inference_server import inference_server
 
 class DroneStatus(Model):
     name: str
     is_connected: bool
     battery_level: int
+    drone_id: str = ""
 
 class DetectedObject(Model):
     class_name: str
@@ -22,163 +26,183 @@ class DroneData(Model):
     detected_objects: List[DetectedObject]
     drone_status: DroneStatus
     frame: str  # Base64 encoded frame
+    frame_id: int = 0
+    timestamp: float = 0.0
 
 class DeployCommand(Model):
     command: str
+    drone_id: str = ""  # Empty: the first drone
 
 class MoveCommand(Model):
     x: int
     y: int
     z: int
     yaw: int
+    drone_id: str = ""
 
 class DroneList(Model):
     drones: List[DroneStatus]
 
 drone_agent = Agent(name="drone_agent", seed="drone_agent_seed")
-model = YOLO('yolo11x.pt')
-tello = None
+# Weights load in the background (or on first detection) instead of at import
+registry.register("yolo11x", lambda: load_yolo('yolo11x.pt'), warmup_yolo)
 
-def get_available_drones():
-    wifi_interfaces = [iface for iface in netifaces.interfaces()]
-    drones = []
-    for i, iface in enumerate(wifi_interfaces):
-        drones.append(DroneStatus(
-            name=f"Drone {i+1}",
-            is_connected=False,
-            battery_level=100  # Assume full battery for available drones
+def detect_objects(frame):
+    # Frames from every drone are batched into shared forward passes on one copy of the model
+    result = inference_server("yolo11x").infer(frame)
+    detected_objects = []
+
+    for box in result.boxes:
+        cls = int(box.cls)
+        class_name = result.names[cls]
+        conf = float(box.conf)
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        detected_objects.append(DetectedObject(
+            class_name=class_name,
+            confidence=conf,
+            bbox=[x1, y1, x2, y2]
         ))
-    return drones
+
+    return detected_objects
+
+overlay = OverlayRenderer(box_thickness=2)
+
+def annotate_frame(frame, detected_objects):
+    return overlay.draw(frame, [(*obj.bbox, obj.class_name, obj.confidence, (0, 255, 0)) for obj in detected_objects])
+
+def encode_frame(frame):
+    _, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes()
+
+# Drones come from DRONE_HOSTS / DRONE_SIMULATED (see fleet.Fleet)
+fleet = Fleet.from_env(detect_objects, encode_frame)
+latest_drone_data = {}  # drone_id -> newest DroneData
+on_detection = []  # Callbacks taking each detection dict a mission reports
+
+def get_available_drones():
+    return [DroneStatus(**status) for status in fleet.statuses()]
+
+def latest_frame(drone_id=None):
+    """Newest pipeline result (raw JPEG in `encoded`) for a drone, or None before its first frame."""
+    try:
+        return fleet.get(drone_id).latest()
+    except KeyError:
+        return None
 
 @drone_agent.on_event("startup")
 async def initialize(ctx: Context):
+    registry.preload("yolo11x")
     available_drones = get_available_drones()
     ctx.storage.set("available_drones", available_drones)
-    ctx.storage.set("drone_data", DroneData(detected_objects=[], drone_status=DroneStatus(name="Drone 1", is_connected=False, battery_level=0), frame=""))
+    ctx.storage.set("drone_data", DroneData(detected_objects=[], drone_status=available_drones[0], frame=""))
     ctx.logger.info(f"Drone agent initialized with {len(available_drones)} available drones")
 
+def get_session(ctx: Context, drone_id):
+    try:
+        return fleet.get(drone_id)
+    except KeyError:
+        ctx.logger.error(f"Unknown drone: {drone_id}")
+        return None
+
 @drone_agent.on_message(model=DeployCommand)
 async def handle_deploy_command(ctx: Context, sender: str, msg: DeployCommand):
-    global tello
-    ctx.logger.info(f"Received deploy command: {msg.command}")
-    if msg.command == "takeoff":
-        tello = Tello()
-        tello.connect()
-        tello.streamon()
-        time.sleep(4)
-        tello.takeoff()
-        ctx.storage.set("tello", tello)
-        await search_and_rescue(ctx)
+    ctx.logger.info(f"Received deploy command: {msg.command} for {msg.drone_id or 'first drone'}")
+    session = get_session(ctx, msg.drone_id)
+    if session and msg.command == "takeoff":
+        # Connecting, takeoff and the mission run in the drone's session; the handler returns at once
+        session.deploy(lambda session: search_and_rescue(ctx, session))
 
 @drone_agent.on_message(model=MoveCommand)
 async def handle_move_command(ctx: Context, sender: str, msg: MoveCommand):
-    tello = ctx.storage.get("tello")
-    if tello:
-        tello.send_rc_control(msg.x, msg.y, msg.z, msg.yaw)
-        time.sleep(0.1)
+    session = get_session(ctx, msg.drone_id)
+    if session:
+        session.move(msg.x, msg.y, msg.z, msg.yaw)
 
 @drone_agent.on_message(model=DroneList)
 async def handle_drone_list_request(ctx: Context, sender: str, msg: DroneList):
-    available_drones = ctx.storage.get("available_drones")
-    await ctx.send(sender, DroneList(drones=available_drones))
-
-def detect_objects(frame):
-    results = model(frame)
-    detected_objects = []
-
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            cls = int(box.cls)
-            class_name = model.names[cls]
-            conf = float(box.conf)
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            detected_objects.append(DetectedObject(
-                class_name=class_name,
-                confidence=conf,
-                bbox=[x1, y1, x2, y2]
-            ))
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f"{class_name}: {conf:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-    return frame, detected_objects
+    await ctx.send(sender, DroneList(drones=get_available_drones()))
 
 @drone_agent.on_interval(period=0.1)
 async def process_video_stream(ctx: Context):
-    tello = ctx.storage.get("tello")
-    if not tello:
-        return
-
-    frame_read = tello.get_frame_read()
-    frame = cv2.cvtColor(frame_read.frame, cv2.COLOR_RGB2BGR)
-    if frame is None:
-        return
+    # Each session's pipeline does the heavy lifting off the event loop; this only publishes new results
+    for session in fleet:
+        result = session.latest()
+        if result is None:
+            continue
+        previous = latest_drone_data.get(session.drone_id)
+        if previous is not None and previous.frame_id == result.frame_id:
+            continue
 
-    processed_frame, detected_objects = detect_objects(frame)
-    
-    _, buffer = cv2.imencode('.jpg', processed_frame)
-    jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-    
-    drone_connected = tello.stream_on
-    battery_level = tello.get_battery()
-
-    drone_data = DroneData(
-        detected_objects=detected_objects,
-        drone_status=DroneStatus(
-            name="Drone 1",
-            is_connected=drone_connected,
-            battery_level=battery_level
-        ),
-        frame=jpg_as_text
-    )
-
-    ctx.storage.set("drone_data", drone_data)
+        drone_data = DroneData(
+            detected_objects=result.detected_objects,
+            drone_status=DroneStatus(**session.status()),
+            frame=base64.b64encode(result.encoded).decode('utf-8'),
+            frame_id=result.frame_id,
+            timestamp=result.timestamp
+        )
+        latest_drone_data[session.drone_id] = drone_data
+        ctx.storage.set("drone_data", drone_data)
 
 @drone_agent.on_interval(period=5.0)
 async def share_data(ctx: Context):
-    drone_data = ctx.storage.get("drone_data")
-    await ctx.send("drone_metadata", drone_data)
-
-async def search_and_rescue(ctx: Context):
-    tello = ctx.storage.get("tello")
+    for drone_data in list(latest_drone_data.values()) or [ctx.storage.get("drone_data")]:
+        await ctx.send("drone_metadata", drone_data)
+
+# Missions deployed from the dashboard have no agent context (ctx is None); they only report
+# through the on_detection callbacks
+async def report_detection(ctx: Context, detection_data):
+    if ctx is not None:
+        await ctx.send("detection", detection_data)
+    for callback in on_detection:
+        callback(detection_data)
+
+async def send_drone_metadata(ctx: Context, session):
+    drone_data = latest_drone_data.get(session.drone_id)
+    if ctx is not None and drone_data is not None:
+        await ctx.send("drone_metadata", drone_data)  # Send updated drone data
+
+async def search_and_rescue(ctx: Context, session):
+    tello = session.tello
     if not tello:
-        ctx.logger.error("Tello drone not initialized")
+        logging.error(f"{session.name} not initialized")
         return
 
     while True:
-        tello.move_forward(30)  # Move forward 30 cm
-        time.sleep(1)  # Wait for the movement to complete
+        await session.call(tello.move_forward, 30)  # Move forward 30 cm
+        await asyncio.sleep(1)  # Wait for the movement to complete
 
-        drone_data = ctx.storage.get("drone_data")
-        if not drone_data:
+        result = session.latest()
+        if result is None:
             continue
 
-        for obj in drone_data.detected_objects:
+        for obj in result.detected_objects:
             if obj.class_name == "person" and obj.confidence > 0.7:
                 detection_data = {
                     "type": "person",
                     "location": obj.bbox,
                     "timestamp": time.time(),
-                    "confidence": obj.confidence
+                    "confidence": obj.confidence,
+                    "drone_id": session.drone_id
                 }
-                await ctx.send("detection", detection_data)
-                await ctx.send("drone_metadata", drone_data)  # Send updated drone data
-                await approach_person(ctx, obj)
+                await report_detection(ctx, detection_data)
+                await send_drone_metadata(ctx, session)
+                await approach_person(ctx, session, obj)
                 return
             elif obj.class_name in ["tree", "fire", "flood", "power line"] and obj.confidence > 0.6:
                 detection_data = {
                     "type": obj.class_name,
                     "location": obj.bbox,
                     "timestamp": time.time(),
-                    "confidence": obj.confidence
+                    "confidence": obj.confidence,
+                    "drone_id": session.drone_id
                 }
-                await ctx.send("detection", detection_data)
-                await ctx.send("drone_metadata", drone_data)  # Send updated drone data
-                ctx.logger.info(f"Detected {obj.class_name} with confidence {obj.confidence}")
+                await report_detection(ctx, detection_data)
+                await send_drone_metadata(ctx, session)
+                logging.info(f"{session.name} detected {obj.class_name} with confidence {obj.confidence}")
                 return
 
-async def approach_person(ctx: Context, person_obj):
-    tello = ctx.storage.get("tello")
+async def approach_person(ctx: Context, session, person_obj):
+    tello = session.tello
     frame_height, frame_width = 720, 960  # Assuming Tello's default resolution
 
     while True:
@@ -187,42 +211,30 @@ async def approach_person(ctx: Context, person_obj):
         center_x = (x1 + x2) / 2
         frame_center_x = frame_width / 2
         yaw = int((center_x - frame_center_x) / frame_center_x * 100)  # Scale to -100 to 100
-        tello.send_rc_control(0, 0, 0, yaw)
-        time.sleep(0.1)
+        session.scheduler.rc(0, 0, 0, yaw)
+        await asyncio.sleep(0.1)
 
         # Move towards the person
         person_height = y2 - y1
         if person_height < frame_height * 0.8:  # If person occupies less than 80% of frame height
-            tello.move_forward(30)
-            time.sleep(1)
+            await session.call(tello.move_forward, 30)
+            await asyncio.sleep(1)
         else:
             break
 
-    await circle_flight_sequence(ctx)
+    await circle_flight_sequence(ctx, session)
 
-async def circle_flight_sequence(ctx: Context):
-    tello = ctx.storage.get("tello")
-    tello.send_rc_control(0, 0, 0, 0)
-    time.sleep(0.1)
-    tello.send_rc_control(-100, -100, -100, 100)
-    time.sleep(2)
-    tello.send_rc_control(0, 10, 20, 0)
-    time.sleep(3)
-    tello.send_rc_control(0, 0, 0, 0)
-    time.sleep(2)
+async def circle_flight_sequence(ctx: Context, session):
+    steps = [((0, 0, 0, 0), 0.1), ((-100, -100, -100, 100), 2), ((0, 10, 20, 0), 3), ((0, 0, 0, 0), 2)]
 
     v_up = 0
     for _ in range(4):
-        tello.send_rc_control(40, -5, v_up, -35)
-        time.sleep(4)
-        tello.send_rc_control(0, 0, 0, 0)
-        time.sleep(0.5)
+        steps += [((40, -5, v_up, -35), 4), ((0, 0, 0, 0), 0.5)]
+
+    # Cancellable: cancelling the mission stops the manoeuvre and leaves the drone hovering
+    await session.scheduler.sequence(steps)
 
 @drone_agent.on_event("shutdown")
 async def shutdown(ctx: Context):
-    tello = ctx.storage.get("tello")
-    if tello:
-        tello.land()
-        tello.streamoff()
-        tello.end()
+    await fleet.close()
     ctx.logger.info("Drone agent shut down")
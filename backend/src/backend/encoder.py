@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+# Quality tiers from best to most degraded: (JPEG quality, resolution scale, max frames per second)
+QUALITY_TIERS = [
+    (85, 1.0, 10),
+    (70, 1.0, 10),
+    (60, 0.75, 8),
+    (50, 0.5, 5),
+    (40, 0.5, 2),
+]
+DEFAULT_QUALITY = 95  # cv2.imencode's default, used for untiered full-size frames
+
+
+def encode_jpeg(image, quality, scale):
+    if scale != 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def frame_signature(image, detected_objects=(), size=(64, 48), grid=4):
+    """
+    Small grayscale thumbnail plus the detections (boxes snapped to `grid` pixels), used to
+    detect near-identical consecutive frames.
+    """
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    detections = tuple((obj.class_name, tuple(int(v) // grid for v in obj.bbox)) for obj in detected_objects)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16), detections
+
+
+def signature_difference(a, b, block=8):
+    """
+    Largest mean absolute difference (0-255) over `block`-pixel squares of two thumbnails.
+    A small moving object changes one block a lot while barely moving the whole-frame mean.
+    """
+    diff = np.abs(a - b).astype(np.float32)
+    height, width = diff.shape
+    blocks = diff[:height - height % block, :width - width % block]
+    blocks = blocks.reshape(height // block, block, width // block, block)
+    return float(blocks.mean(axis=(1, 3)).max())
+
+
+class SharedEncoder:
+    """
+    Encodes pipeline results per quality tier and overlay choice, once per (frame, tier,
+    overlay) no matter how many clients ask. Concurrent requests for the same key await the
+    same encode. Pipeline frames are clean; when a client wants boxes burned in, `annotate`
+    draws them onto a copy, at most once per frame.
+    """
+
+    def __init__(self, keep_frames=2, annotate=None):
+        self.keep_frames = keep_frames
+        self.annotate = annotate  # (image, detected_objects) -> image
+        self._encodes = {}  # (frame_id, tier, overlay) -> Future[bytes]
+        self._annotated = {}  # frame_id -> Future[image]
+        self._signatures = {}  # (frame_id, overlay) -> (thumbnail, detections)
+        self.encode_count = 0
+        self.reuse_count = 0
+        self.annotate_count = 0
+
+    async def _shared(self, cache, key, fn, *args):
+        """Run `fn(*args)` in a thread once per key; concurrent callers share the result."""
+        future = cache.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = cache[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            cache.pop(key, None)
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; don't warn when there are none
+            raise
+        future.set_result(value)
+        return value
+
+    async def image(self, result, overlay=False):
+        """The frame to encode: clean, or with the detection overlay drawn on a copy."""
+        if not overlay or self.annotate is None:
+            return result.image
+        self._evict(result.frame_id)
+        if result.frame_id not in self._annotated:
+            self.annotate_count += 1
+        return await self._shared(self._annotated, result.frame_id,
+                                  lambda: self.annotate(result.image.copy(), result.detected_objects))
+
+    async def signature(self, result, overlay=False):
+        key = (result.frame_id, overlay)
+        signature = self._signatures.get(key)
+        if signature is None:
+            signature = self._signatures[key] = frame_signature(await self.image(result, overlay),
+                                                                       result.detected_objects)
+        return signature
+
+    async def encode(self, result, tier=None, overlay=False):
+        """JPEG for a quality tier (None: full size at the default quality), with or without the overlay."""
+        key = (result.frame_id, tier, overlay)
+        self._evict(result.frame_id)
+        quality, scale = (DEFAULT_QUALITY, 1.0) if tier is None else QUALITY_TIERS[tier][:2]
+        image = await self.image(result, overlay)
+        if key in self._encodes:
+            self.reuse_count += 1
+        else:
+            self.encode_count += 1
+        return await self._shared(self._encodes, key, encode_jpeg, image, quality, scale)
+
+    def _evict(self, newest_frame_id):
+        oldest = newest_frame_id - self.keep_frames
+        for cache in (self._encodes, self._signatures):
+            for key in [k for k in cache if k[0] <= oldest]:
+                del cache[key]
+        for frame_id in [f for f in self._annotated if f <= oldest]:
+            del self._annotated[frame_id]
+
+
+class ClientStreamController:
+    """
+    Per-client rate and quality control driven by backpressure.
+
+    Congestion is measured from the number of unacknowledged frames and the round-trip time
+    when the client sends ACKs, or from how long the socket send takes when it does not.
+    Congested clients step down a quality tier; clients that keep up step back up.
+    """
+
+    def __init__(self, tier=0, max_in_flight=2, rtt_budget=0.3, upgrade_after=20,
+                 change_cooldown=0.5, diff_threshold=2.0, keepalive=1.0):
+        self.tier = tier
+        self.max_in_flight = max_in_flight
+        self.rtt_budget = rtt_budget
+        self.upgrade_after = upgrade_after
+        self.change_cooldown = change_cooldown
+        self.diff_threshold = diff_threshold  # Largest per-block mean absolute thumbnail difference, 0-255
+        self.keepalive = keepalive  # Always send at least this often, even if the scene is static
+
+        self.rtt = None  # EWMA, seconds
+        self.acks_seen = False
+        self.in_flight = {}  # frame_id -> send time
+        self.last_sent_at = 0.0
+        self.last_signature = None
+        self.last_change_at = 0.0
+        self.good_sends = 0
+        self.sent = 0
+        self.skipped_identical = 0
+        self.skipped_rate = 0
+
+    def _observe_rtt(self, sample):
+        self.rtt = sample if self.rtt is None else 0.8 * self.rtt + 0.2 * sample
+
+    def _expire(self, now):
+        for frame_id in [f for f, t in self.in_flight.items() if now - t > 5.0]:
+            del self.in_flight[frame_id]
+
+    def should_send(self, signature, now=None):
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        _, _, max_fps = QUALITY_TIERS[self.tier]
+        if now - self.last_sent_at < 1.0 / max_fps or len(self.in_flight) > 2 * self.max_in_flight:
+            self.skipped_rate += 1
+            return False
+        if (self.last_signature is not None and now - self.last_sent_at < self.keepalive
+                and not self.changed(signature, self.last_signature)):
+            self.skipped_identical += 1
+            return False
+        return True
+
+    def changed(self, signature, previous):
+        """A frame is new if its detections differ or any block of the thumbnail moved past the threshold."""
+        (thumbnail, detections), (previous_thumbnail, previous_detections) = signature, previous
+        if detections != previous_detections:
+            return True
+        return signature_difference(thumbnail, previous_thumbnail) >= self.diff_threshold
+
+    def on_sent(self, frame_id, signature, send_seconds, now=None):
+        now = time.monotonic() if now is None else now
+        self.sent += 1
+        self.last_sent_at = now
+        self.last_signature = signature
+        if self.acks_seen:
+            self.in_flight[frame_id] = now
+        else:
+            # Without ACKs, a send that takes long means the socket buffer is full
+            self._observe_rtt(send_seconds)
+        self._adapt(now)
+
+    def on_ack(self, frame_id, now=None):
+        now = time.monotonic() if now is None else now
+        self.acks_seen = True
+        sent_at = self.in_flight.pop(frame_id, None)
+        if sent_at is not None:
+            self._observe_rtt(now - sent_at)
+
+    def _adapt(self, now):
+        congested = len(self.in_flight) > self.max_in_flight or (self.rtt or 0.0) > self.rtt_budget
+        if congested:
+            self.good_sends = 0
+            if self.tier < len(QUALITY_TIERS) - 1 and now - self.last_change_at > self.change_cooldown:
+                self.tier += 1
+                self.last_change_at = now
+        else:
+            self.good_sends += 1
+            if self.tier > 0 and self.good_sends >= self.upgrade_after:
+                self.tier -= 1
+                self.good_sends = 0
+                self.last_change_at = now
+
+    def metrics(self):
+        return {
+            "tier": self.tier,
+            "rtt_ms": self.rtt * 1000 if self.rtt is not None else None,
+            "in_flight": len(self.in_flight),
+            "sent": self.sent,
+            "skipped_identical": self.skipped_identical,
+            "skipped_rate": self.skipped_rate,
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from flight_scheduler import FlightScheduler
+from pipeline import FramePipeline
+from telemetry import TelemetryFeed
+
+
+def tello_factory(host):
+    def connect():
+        # Imported here so a simulated fleet runs without djitellopy installed
+        from djitellopy import Tello
+        return Tello(host=host)
+    return connect
+
+
+def simulated_factory(host):
+    def connect():
+        from sim_tello import SimulatedTello
+        return SimulatedTello(host=host)
+    return connect
+
+
+class DroneSession:
+    """
+    One drone and everything that belongs to it: the connection, a frame pipeline, the
+    latest telemetry and a command scheduler.
+
+    Blocking djitellopy calls for this drone run one at a time on the session's own thread
+    (see flight_scheduler.FlightScheduler), so a slow or unreachable drone never stalls the
+    event loop or the other drones. Missions run as tasks that go through the same
+    scheduler, which lets manual MOVE commands interleave with them instead of waiting for
+    the mission to finish.
+
+    Tellos have no GPS, so `location` is where the drone launched from, as (lat, lng); it
+    is what gets recorded for the drone and for the people it finds.
+    """
+
+    def __init__(self, drone_id, name, factory, detect, encode, period=0.1, telemetry_period=0.5, location=(0.0, 0.0)):
+        self.drone_id = drone_id
+        self.name = name
+        self.factory = factory  # () -> unconnected Tello-like object
+        self.detect = detect
+        self.encode = encode
+        self.period = period
+        self.telemetry_period = telemetry_period
+        self.location = location
+        self.tello = None
+        self.pipeline = None
+        self.state = "idle"  # idle -> connecting -> connected -> flying, or error
+        self.error = None
+        self.telemetry = None  # TelemetryFeed, once connected
+        self.mission = None  # Task running deploy + mission
+        self.on_result = []  # Callbacks taking (session, FrameResult) for each new frame
+        self._telemetry_task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"drone-{drone_id}")
+        self.scheduler = FlightScheduler(self._executor, name=name)
+
+    def submit(self, fn, *args):
+        """Queue a blocking call for this drone; returns a future with its result."""
+        return self.scheduler.submit(fn, *args)
+
+    async def call(self, fn, *args):
+        return await self.scheduler.call(fn, *args)
+
+    async def connect(self):
+        if self.tello is not None:
+            return
+        self.state, self.error = "connecting", None
+        tello = self.factory()
+        try:
+            await self.call(tello.connect)
+            await self.call(tello.streamon)
+            # Starts the decoder thread and waits for the first frame, so keep it off the loop too
+            frame_read = await self.call(tello.get_frame_read)
+        except Exception as e:
+            self.state, self.error = "error", str(e)
+            logging.exception(f"Could not connect to {self.name}")
+            raise
+        self.tello = tello
+        self.scheduler.send_rc = tello.send_rc_control
+        self.state = "connected"
+
+        def capture_frame():
+            frame = frame_read.frame
+            if frame is None:
+                return None
+            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+        # Clean frames; overlays are drawn per consumer (see encoder.SharedEncoder)
+        self.pipeline = FramePipeline(capture_frame, self.detect, None, self.encode, period=self.period,
+                                      on_result=self._publish)
+        self.pipeline.start()
+        # The state packet is read here once per period; status reads come from the snapshot
+        self.telemetry = TelemetryFeed(tello.get_current_state, lambda: getattr(tello, "stream_on", False),
+                                       self.telemetry_period)
+        self._telemetry_task = asyncio.create_task(self.telemetry.run())
+        logging.info(f"{self.name} connected")
+
+    def _publish(self, result):
+        for callback in self.on_result:
+            try:
+                callback(self, result)
+            except Exception:
+                logging.exception(f"Frame callback for {self.name} failed")
+
+    def deploy(self, mission=None, stream_warmup=4.0):
+        """
+        Connect, take off and fly `mission(session)` in a background task, returning at once.
+        A second deploy while one is in progress is ignored.
+        """
+        if self.mission is not None and not self.mission.done():
+            logging.info(f"{self.name} is already deployed")
+            return self.mission
+        self.mission = asyncio.create_task(self._deploy(mission, stream_warmup))
+        return self.mission
+
+    async def _deploy(self, mission, stream_warmup):
+        try:
+            await self.connect()
+            # The video stream needs a few seconds before takeoff; wait without blocking anyone
+            await asyncio.sleep(stream_warmup)
+            await self.call(self.tello.takeoff)
+            self.state = "flying"
+            if mission is not None:
+                await mission(self)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e)
+            logging.exception(f"Deployment of {self.name} failed")
+
+    def move(self, x, y, z, yaw):
+        """Set the RC stick values; bursts collapse to the newest. Ignored until the drone is connected."""
+        if self.tello is not None:
+            self.scheduler.rc(x, y, z, yaw)
+
+    def latest(self):
+        return self.pipeline.latest if self.pipeline is not None else None
+
+    def status(self):
+        snapshot = self.telemetry.snapshot if self.telemetry is not None and self.tello is not None else None
+        return {
+            "drone_id": self.drone_id,
+            "name": self.name,
+            "is_connected": snapshot.connected if snapshot else False,
+            "battery_level": snapshot.battery_level if snapshot else 0,
+        }
+
+    def metrics(self):
+        return {
+            **self.status(),
+            "state": self.state,
+            "error": self.error,
+            "commands": self.scheduler.metrics(),
+            "telemetry_version": self.telemetry.snapshot.version if self.telemetry and self.telemetry.snapshot else None,
+            "pipeline": self.pipeline.metrics() if self.pipeline is not None else None,
+        }
+
+    async def close(self):
+        if self.mission is not None:
+            self.mission.cancel()
+        self.scheduler.clear()
+        if self.pipeline is not None:
+            await self.pipeline.stop()
+        tello, self.tello = self.tello, None
+        if self._telemetry_task is not None:
+            self._telemetry_task.cancel()
+        if tello is not None:
+            for fn in (tello.land, tello.streamoff, tello.end):
+                try:
+                    await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+                except Exception:
+                    logging.exception(f"Shutting down {self.name} failed")
+        self.scheduler.close()
+        self._executor.shutdown(wait=False)
+        self.state = "idle"
+
+
+class Fleet:
+    """
+    The drones this backend controls, by id ("drone-1", "drone-2", ...).
+
+    Configured from the environment: DRONE_HOSTS is a comma-separated list of Tello IP
+    addresses (each needs its own route, e.g. one Wi-Fi adapter per drone), and
+    DRONE_SIMULATED=N adds N simulated drones (see sim_tello.py). With neither set there
+    is one real drone at the Tello's default address. Drones launch from RESCUE_BASE_LAT /
+    RESCUE_BASE_LNG (the dashboard's map center by default).
+    """
+
+    def __init__(self, sessions):
+        self.sessions = {session.drone_id: session for session in sessions}
+        # Shared by every session: callbacks taking (session, FrameResult) for each new frame
+        self.on_result = []
+        for session in sessions:
+            session.on_result = self.on_result
+
+    @classmethod
+    def from_env(cls, detect, encode, period=0.1):
+        hosts = [h.strip() for h in os.getenv("DRONE_HOSTS", "").split(",") if h.strip()]
+        simulated = int(os.getenv("DRONE_SIMULATED", "0"))
+        if not hosts and not simulated:
+            hosts = ["192.168.10.1"]
+        factories = [tello_factory(host) for host in hosts]
+        factories += [simulated_factory(f"sim-{i + 1}") for i in range(simulated)]
+        location = (float(os.getenv("RESCUE_BASE_LAT", 35.7796)), float(os.getenv("RESCUE_BASE_LNG", -78.6382)))
+        sessions = []
+        for i, factory in enumerate(factories):
+            drone_id = f"drone-{i + 1}"
+            sessions.append(DroneSession(drone_id, f"Drone {i + 1}", factory, detect, encode, period,
+                                         location=location))
+        return cls(sessions)
+
+    def get(self, drone_id=None):
+        """The session for `drone_id`; empty or None means the first drone. Raises KeyError."""
+        if not drone_id:
+            return next(iter(self.sessions.values()))
+        return self.sessions[drone_id]
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def statuses(self):
+        return [session.status() for session in self]
+
+    def metrics(self):
+        return {drone_id: session.metrics() for drone_id, session in self.sessions.items()}
+
+    async def close(self):
+        await asyncio.gather(*(session.close() for session in self), return_exceptions=True)
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from pipeline import StageStats
+
+HOVER = (0, 0, 0, 0)
+
+
+class FlightScheduler:
+    """
+    Per-drone command scheduler that runs on the event loop.
+
+    Discrete commands (takeoff, move_forward, ...) run in submission order. RC commands do
+    not queue: there is one slot holding the newest (x, y, z, yaw), so a burst of joystick
+    MOVE events collapses into the latest one, sent at most once per `rc_interval`. The
+    blocking Tello call itself runs on `executor` (one thread per drone), so nothing here
+    ever blocks the loop. Timed manoeuvres run as sequences: awaitable, cancellable tasks
+    that hover the drone when cancelled.
+    """
+
+    def __init__(self, executor, rc_interval=0.05, name="drone"):
+        self.executor = executor
+        self.rc_interval = rc_interval  # Tello handles about 20 RC packets per second
+        self.name = name
+        self.send_rc = None  # (x, y, z, yaw) -> None, e.g. tello.send_rc_control; set once connected
+        self.sequence_task = None
+        self.commands_run = 0
+        self.rc_sent = 0
+        self.rc_coalesced = 0
+        self.queue_latency = StageStats()  # Submit -> start, discrete commands
+        self.rc_latency = StageStats()  # Newest RC value set -> sent
+        self.execution = StageStats()  # Time inside the Tello call
+        self._commands = deque()  # (fn, args, future, submitted)
+        self._rc = None  # (values, submitted)
+        self._last_rc_at = 0.0
+        self._wakeup = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        # Created on first use so the task belongs to whichever loop drives the fleet
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _call(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.execution.record(time.perf_counter() - started)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._commands or self._rc is not None:
+                if self._commands:
+                    fn, args, future, submitted = self._commands.popleft()
+                    if future.cancelled():
+                        continue
+                    self.queue_latency.record(time.perf_counter() - submitted)
+                    try:
+                        result = await self._call(fn, *args)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+                    self.commands_run += 1
+                    continue
+
+                wait = self._last_rc_at + self.rc_interval - time.perf_counter()
+                if wait > 0:
+                    # Rate limit; newer values and discrete commands may arrive meanwhile
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), wait)
+                        self._wakeup.clear()
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                (values, submitted), self._rc = self._rc, None
+                if self.send_rc is None:
+                    continue
+                self._last_rc_at = time.perf_counter()
+                self.rc_latency.record(self._last_rc_at - submitted)
+                try:
+                    await self._call(self.send_rc, *values)
+                    self.rc_sent += 1
+                except Exception:
+                    logging.exception(f"RC command to {self.name} failed")
+
+    def submit(self, fn, *args):
+        """Queue a blocking drone call; returns a future with its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._commands.append((fn, args, future, time.perf_counter()))
+        self._ensure_worker()
+        return future
+
+    async def call(self, fn, *args):
+        return await self.submit(fn, *args)
+
+    def rc(self, x, y, z, yaw):
+        """Set the RC values to send next, replacing any not yet sent."""
+        if self._rc is not None:
+            self.rc_coalesced += 1
+        self._rc = ((x, y, z, yaw), time.perf_counter())
+        self._ensure_worker()
+
+    def hover(self):
+        self.rc(*HOVER)
+
+    async def _fly(self, steps):
+        try:
+            for values, duration in steps:
+                self.rc(*values)
+                await asyncio.sleep(duration)
+        except asyncio.CancelledError:
+            self.hover()
+            raise
+
+    def sequence(self, steps):
+        """
+        Fly ((x, y, z, yaw), seconds) steps in a task and return it; await it to wait for
+        the manoeuvre, cancel it to stop (the drone hovers). Starting a sequence cancels the
+        previous one.
+        """
+        if self.sequence_task is not None and not self.sequence_task.done():
+            self.sequence_task.cancel()
+        self.sequence_task = asyncio.create_task(self._fly(list(steps)))
+        return self.sequence_task
+
+    def pending(self):
+        return len(self._commands) + (self._rc is not None)
+
+    def clear(self):
+        """Drop queued commands and any running sequence, e.g. before landing."""
+        if self.sequence_task is not None:
+            self.sequence_task.cancel()
+        while self._commands:
+            self._commands.popleft()[2].cancel()
+        self._rc = None
+
+    def close(self):
+        self.clear()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def metrics(self):
+        return {
+            "pending": self.pending(),
+            "commands_run": self.commands_run,
+            "rc_sent": self.rc_sent,
+            "rc_coalesced": self.rc_coalesced,
+            "queue_latency": self.queue_latency.as_dict(),
+            "rc_latency": self.rc_latency.as_dict(),
+            "execution": self.execution.as_dict(),
+        }
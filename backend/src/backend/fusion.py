@@ -0,0 +1,139 @@
+import itertools
+import math
+
+from tracker import iou
+
+
+class Entity:
+    def __init__(self, entity_id, class_name, confidence, bbox, timestamp):
+        self.id = entity_id
+        self.class_name = class_name
+        self.confidence = confidence
+        self.bbox = list(bbox)
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.confirmed = False
+        self.reported_bbox = None
+        self.reported_confidence = None
+        self.record_id = None  # persons.id, once its row is written
+
+    def center(self):
+        x1, y1, x2, y2 = self.bbox
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
+    def size(self):
+        x1, y1, x2, y2 = self.bbox
+        return max(math.hypot(x2 - x1, y2 - y1), 1.0)
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "class_name": self.class_name,
+            "confidence": self.confidence,
+            "bbox": [int(v) for v in self.bbox],
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "hits": self.hits,
+        }
+
+
+class DetectionFusion:
+    """
+    Clusters per-frame detections into stable entities with ids.
+
+    Detections of the same class are matched to live entities by box overlap, or by center
+    distance relative to box size for fast movers. An entity is reported as "new" once it
+    has been seen `min_hits` times, and as "update" only when it has moved by more than
+    `move_threshold` box sizes or its confidence rose by `confidence_delta` since the last
+    report. Entities not seen for `ttl` time units are forgotten. Timestamps can be seconds
+    or frame numbers, as long as `ttl` uses the same unit.
+    """
+
+    def __init__(self, classes=None, iou_threshold=0.3, center_tolerance=0.5, min_hits=3,
+                 ttl=10.0, move_threshold=0.5, confidence_delta=0.1, smoothing=0.5):
+        self.classes = set(classes) if classes else None
+        self.iou_threshold = iou_threshold
+        self.center_tolerance = center_tolerance
+        self.min_hits = min_hits
+        self.ttl = ttl
+        self.move_threshold = move_threshold
+        self.confidence_delta = confidence_delta
+        self.smoothing = smoothing
+        self.entities = {}
+        self._ids = itertools.count(1)
+
+    def _match_score(self, entity, bbox):
+        overlap = iou(entity.bbox, bbox)
+        if overlap >= self.iou_threshold:
+            return 1.0 + overlap
+        cx, cy = entity.center()
+        distance = math.hypot((bbox[0] + bbox[2]) / 2 - cx, (bbox[1] + bbox[3]) / 2 - cy) / entity.size()
+        return 1.0 - distance if distance <= self.center_tolerance else None
+
+    def update(self, detections, timestamp):
+        """
+        Fuse one frame of (class_name, confidence, bbox) detections.
+
+        Returns a list of ("new" | "update", Entity) events.
+        """
+        for entity_id in [i for i, e in self.entities.items() if timestamp - e.last_seen > self.ttl]:
+            del self.entities[entity_id]
+
+        detections = [d for d in detections if self.classes is None or d[0] in self.classes]
+        candidates = []
+        for d, (class_name, _, bbox) in enumerate(detections):
+            for entity in self.entities.values():
+                if entity.class_name == class_name:
+                    score = self._match_score(entity, bbox)
+                    if score is not None:
+                        candidates.append((score, entity.id, d))
+        candidates.sort(reverse=True)
+
+        matched_entities, matched_detections, touched = set(), set(), []
+        for _, entity_id, d in candidates:
+            if entity_id in matched_entities or d in matched_detections:
+                continue
+            matched_entities.add(entity_id)
+            matched_detections.add(d)
+            entity = self.entities[entity_id]
+            _, confidence, bbox = detections[d]
+            a = self.smoothing
+            entity.bbox = [a * new + (1 - a) * old for new, old in zip(bbox, entity.bbox)]
+            entity.confidence = max(entity.confidence, confidence)
+            entity.last_seen = timestamp
+            entity.hits += 1
+            touched.append(entity)
+
+        for d, (class_name, confidence, bbox) in enumerate(detections):
+            if d not in matched_detections:
+                entity = Entity(next(self._ids), class_name, confidence, bbox, timestamp)
+                self.entities[entity.id] = entity
+                touched.append(entity)
+
+        events = []
+        for entity in touched:
+            if not entity.confirmed:
+                if entity.hits >= self.min_hits:
+                    entity.confirmed = True
+                    events.append(("new", entity))
+                    self._mark_reported(entity)
+            elif self._changed(entity):
+                events.append(("update", entity))
+                self._mark_reported(entity)
+        return events
+
+    def forget(self, entity_id):
+        """Drop an entity, so its next sightings start a new one (and a new "new" event)."""
+        self.entities.pop(entity_id, None)
+
+    def _changed(self, entity):
+        rx1, ry1, rx2, ry2 = entity.reported_bbox
+        cx, cy = entity.center()
+        moved = math.hypot(cx - (rx1 + rx2) / 2, cy - (ry1 + ry2) / 2) / entity.size()
+        return moved > self.move_threshold or entity.confidence - entity.reported_confidence >= self.confidence_delta
+
+    @staticmethod
+    def _mark_reported(entity):
+        entity.reported_bbox = list(entity.bbox)
+        entity.reported_confidence = entity.confidence
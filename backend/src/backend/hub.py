@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class Message:
+    topic: str
+    data: Any  # str (JSON text), bytes, or an unserialized object for in-process consumers
+    seq: int
+    published_at: float  # time.perf_counter()
+
+    @property
+    def binary(self):
+        return isinstance(self.data, bytes)
+
+
+class Subscription:
+    """
+    One subscriber's view of the hub: a bounded queue plus a latest-only slot per topic.
+
+    Topics subscribed with policy "latest" (e.g. video frames) keep only the newest
+    message, so a slow client skips straight to the present. Topics with policy "drop"
+    queue up to `maxsize` messages, dropping the oldest when full. Neither ever blocks the
+    publisher.
+    """
+
+    def __init__(self, hub, topics, maxsize=64, name=None):
+        self.hub = hub
+        self.topics = dict(topics)  # topic -> "drop" | "latest"
+        self.maxsize = maxsize
+        self.name = name
+        self._queue = deque()
+        self._latest = {}  # topic -> Message, for "latest" topics
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+        self.replaced = 0  # Latest-only messages overwritten before delivery
+        self.lag = None  # EWMA of publish -> get, seconds
+        self.max_lag = 0.0
+
+    def offer(self, message):
+        if self.topics.get(message.topic) == "latest":
+            if message.topic in self._latest:
+                self.replaced += 1
+            self._latest[message.topic] = message
+        else:
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(message)
+        self._ready.set()
+
+    def _pop(self):
+        if self._queue:
+            return self._queue.popleft()
+        if self._latest:
+            # Oldest pending topic first, so one busy topic cannot starve the others
+            topic = min(self._latest, key=lambda t: self._latest[t].seq)
+            return self._latest.pop(topic)
+        return None
+
+    def _delivered(self, message):
+        lag = time.perf_counter() - message.published_at
+        self.lag = lag if self.lag is None else 0.9 * self.lag + 0.1 * lag
+        self.max_lag = max(self.max_lag, lag)
+        self.delivered += 1
+        return message
+
+    def get_nowait(self):
+        """The next message, or None if nothing is pending."""
+        message = self._pop()
+        if message is None:
+            self._ready.clear()
+            return None
+        return self._delivered(message)
+
+    async def get(self):
+        """Wait for the next message; None once the subscription is closed and drained."""
+        while True:
+            message = self.get_nowait()
+            if message is not None or self.closed:
+                return message
+            await self._ready.wait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def pending(self):
+        return len(self._queue) + len(self._latest)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "topics": self.topics,
+            "pending": self.pending(),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "replaced": self.replaced,
+            "lag_ms": self.lag * 1000 if self.lag is not None else None,
+            "max_lag_ms": self.max_lag * 1000,
+        }
+
+
+class Hub:
+    """
+    In-process pub/sub for pushing server events to WebSocket clients.
+
+    A message is serialized once when published (dicts become JSON text; str and bytes go
+    out as they are) and the same object is handed to every subscriber of its topic, so an
+    extra viewer costs a queue append rather than another serialization. Publishing never
+    waits for subscribers; see Subscription for how slow ones lose messages.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # topic -> set of Subscription
+        self._seq = itertools.count(1)
+        self.published = {}  # topic -> count
+        self.serialized = 0
+
+    def subscribe(self, topics, maxsize=64, name=None):
+        """`topics` maps topic -> "drop" | "latest"; a list subscribes every topic with "drop"."""
+        if not isinstance(topics, dict):
+            topics = {topic: "drop" for topic in topics}
+        subscription = Subscription(self, topics, maxsize, name)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        subscription._ready.set()
+        for topic in subscription.topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def has_subscribers(self, topic):
+        return bool(self._subscribers.get(topic))
+
+    def publish(self, topic, data, serialize=True):
+        """
+        Publish to everyone subscribed to `topic`; returns the number of subscribers reached.
+        With `serialize=False` objects are delivered as they are (in-process consumers only).
+        """
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return 0
+        if serialize and not isinstance(data, (str, bytes)):
+            data = json.dumps(data, default=str)
+            self.serialized += 1
+        message = Message(topic, data, next(self._seq), time.perf_counter())
+        for subscription in list(subscribers):
+            subscription.offer(message)
+        self.published[topic] = self.published.get(topic, 0) + 1
+        return len(subscribers)
+
+    def stats(self):
+        subscriptions = {s for subscribers in self._subscribers.values() for s in subscribers}
+        return {
+            "topics": {topic: len(subscribers) for topic, subscribers in self._subscribers.items()},
+            "published": dict(self.published),
+            "serialized": self.serialized,
+            "subscribers": [s.stats() for s in subscriptions],
+        }
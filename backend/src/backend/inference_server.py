@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from model_registry import registry as default_registry
+from pipeline import StageStats
+
+_STOP = object()
+
+
+def predict_frames(model, frames):
+    """Default batch call: ultralytics takes a list of BGR frames and returns one Results per frame."""
+    return list(model(frames, verbose=False))
+
+
+class InferenceServer:
+    """
+    Serves one model to any number of callers from a single thread, batching their inputs.
+
+    Callers on any thread submit inputs and get a Future. The server thread takes the first
+    waiting request plus whatever else arrives within `max_wait` seconds (up to `max_batch`),
+    runs one forward pass and resolves each Future with its own result. Requests that queue
+    up while a pass is running form the next batch, so a busy server batches with no added
+    wait. Only one copy of the model is loaded (through the model registry), however many
+    streams use it. Inputs with different `key(input)` values (e.g. tensor shapes) are never
+    put in the same forward pass.
+    """
+
+    def __init__(self, model_name, run=predict_frames, max_batch=8, max_wait=0.005, key=None, registry=None):
+        self.model_name = model_name
+        self.name = model_name  # For logs and stats; inference_server() adds the variant
+        self.run = run  # (model, inputs) -> one result per input
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.key = key
+        self.registry = registry or default_registry
+        self.queue_wait = StageStats()  # Submit -> start of the forward pass
+        self.forward = StageStats()  # One forward pass (per group)
+        self.batch_sizes = Counter()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._serve, name=f"inference-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, item):
+        self.start()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def infer(self, item, timeout=None):
+        """Blocking: the model's result for one input."""
+        return self.submit(item).result(timeout)
+
+    async def infer_async(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self._queue.put(_STOP)  # Serve what we have, stop on the next round
+                break
+            batch.append(request)
+        return batch
+
+    def _serve(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [request for request in batch if request[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                model = self.registry.get(self.model_name)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            groups = {}
+            for request in batch:
+                groups.setdefault(self.key(request[0]) if self.key else None, []).append(request)
+            for group in groups.values():
+                started = time.perf_counter()
+                for _, _, submitted in group:
+                    self.queue_wait.record(started - submitted)
+                try:
+                    results = self.run(model, [item for item, _, _ in group])
+                    if len(results) != len(group):
+                        raise RuntimeError(f"{self.model_name} returned {len(results)} results for {len(group)} inputs")
+                except Exception as e:
+                    logging.exception(f"Inference on {self.model_name} failed for a batch of {len(group)}")
+                    for _, future, _ in group:
+                        future.set_exception(e)
+                    continue
+                self.forward.record(time.perf_counter() - started)
+                self.batch_sizes[len(group)] += 1
+                for (_, future, _), result in zip(group, results):
+                    future.set_result(result)
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def stats(self):
+        passes = sum(self.batch_sizes.values())
+        inputs = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "passes": passes,
+            "inputs": inputs,
+            "mean_batch": inputs / passes if passes else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "queue_wait": self.queue_wait.as_dict(),
+            "forward": self.forward.as_dict(),
+            "pending": self._queue.qsize(),
+        }
+
+
+_servers = {}  # (model name, variant) -> InferenceServer
+_servers_lock = threading.Lock()
+
+
+def inference_server(model_name, variant=None, **options):
+    """
+    The process-wide server for a registered model, created on first use.
+
+    Callers that run the model differently (another `run`, input size or thresholds) must
+    pass a `variant` naming those settings, and get a server of their own; callers sharing
+    a variant share the server that the first of them created, with its `run` and `key`.
+    Asking for a shared server with a different max_batch or max_wait raises ValueError.
+    """
+    with _servers_lock:
+        server = _servers.get((model_name, variant))
+        if server is None:
+            server = _servers[(model_name, variant)] = InferenceServer(model_name, **options)
+            if variant is not None:
+                server.name = f"{model_name}[{variant}]"
+            return server
+    for option in ("max_batch", "max_wait"):
+        if option in options and options[option] != getattr(server, option):
+            raise ValueError(f"Inference server {server.name} already runs with {option}={getattr(server, option)}, "
+                             f"not {options[option]}")
+    return server
+
+
+def server_stats():
+    return {server.name: server.stats() for server in list(_servers.values())}
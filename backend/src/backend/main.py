@@ -1,28 +1,55 @@
 import cv2
-import numpy as np
-from ultralytics import YOLO
-import torch
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import json
 import base64
 import time
 import singlestoredb
+import logging
 import os
+import re
+from datetime import datetime
+from types import SimpleNamespace
 from dotenv import load_dotenv
-from drone_agent import drone_agent, DroneData, DroneStatus, DetectedObject, DeployCommand, MoveCommand, DroneList
-from uagents import Context
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, SystemMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
-from typing import List
+from drone_agent import drone_agent, DroneStatus, annotate_frame, fleet, get_available_drones, on_detection, search_and_rescue
+from transport import FLAG_ANNOTATED, pack_frame
+from encoder import QUALITY_TIERS, SharedEncoder, ClientStreamController
+from db import BatchWriter, ConnectionPool, SingleStoreBackend
+from state_cache import LatestStateCache
+from spatial import SpatialIndex
+from routing import RoutePlanner
+from fusion import DetectionFusion
+from octree_tiles import TileSet
+from model_registry import registry
+from inference_server import inference_server, server_stats
+from telemetry import DeltaFilter
+from hub import Hub
+from query_layer import QueryLayer
+from pipeline import DropOldestQueue
+from typing import List, Literal, Optional
+from pydantic import BaseModel
 
 
 load_dotenv()
 
+class Hazard(BaseModel):
+    type: Literal['pole', 'fire', 'tree', 'flood']
+    location_lat: float
+    location_lng: float
+    severity: Literal['Low', 'Moderate', 'High', 'Critical']
+    details: str = ""
+    created_by: str = ""
+
+class TileQuery(BaseModel):
+    planes: List[List[float]] = []  # Frustum planes (a, b, c, d), inside where a*x + b*y + c*z + d >= 0
+    camera: Optional[List[float]] = None
+    max_level: Optional[int] = None
+    max_points: int = 2_000_000
+    error_threshold: float = 0.01
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -34,53 +61,194 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
-torch.set_default_device(device)
-
-# SingleStore connection
-conn = singlestoredb.connect(
-    host=os.getenv('SINGLESTORE_HOST'),
-    port=int(os.getenv('SINGLESTORE_PORT')),
-    user=os.getenv('SINGLESTORE_USER'),
-    password=os.getenv('SINGLESTORE_PASSWORD'),
-    database=os.getenv('SINGLESTORE_DATABASE')
-)
-
-# Create tables if they don't exist
-with conn.cursor() as cursor:
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS persons (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        location_lat FLOAT,
-        location_lng FLOAT,
-        timestamp DATETIME
-    )
-    """)
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS drone_status (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(255),
-        is_connected BOOLEAN,
-        battery_level INT,
-        location_lat FLOAT,
-        location_lng FLOAT,
-        timestamp DATETIME
+def load_agent_stack():
+    """The langchain/Gemini stack used by /ws_agent; importing it takes seconds, so it loads in the background."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_core.tools import tool
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from langgraph.checkpoint.memory import MemorySaver
+    from langgraph.prebuilt import create_react_agent
+    return SimpleNamespace(ChatGoogleGenerativeAI=ChatGoogleGenerativeAI, tool=tool, HumanMessage=HumanMessage,
+                           SystemMessage=SystemMessage, MemorySaver=MemorySaver, create_react_agent=create_react_agent)
+
+registry.register("agent_stack", load_agent_stack)
+started_at = time.time()
+
+# SingleStore connection pool; connections are opened on first use
+def connect_singlestore(buffered=True):
+    return singlestoredb.connect(
+        host=os.getenv('SINGLESTORE_HOST'),
+        port=int(os.getenv('SINGLESTORE_PORT')),
+        user=os.getenv('SINGLESTORE_USER'),
+        password=os.getenv('SINGLESTORE_PASSWORD'),
+        database=os.getenv('SINGLESTORE_DATABASE'),
+        buffered=buffered
     )
-    """)
 
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS hazards (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        type ENUM('pole', 'fire', 'tree', 'flood'),
-        location_lat FLOAT,
-        location_lng FLOAT,
-        severity ENUM('Low', 'Moderate', 'High', 'Critical'),
-        details TEXT,
-        created_by VARCHAR(255),
-        created_at DATETIME
-    )
-    """)
+pool = ConnectionPool(connect_singlestore, size=int(os.getenv('SINGLESTORE_POOL_SIZE', 4)))
+
+def create_tables(conn):
+    # Create tables if they don't exist
+    with conn.cursor() as cursor:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS persons (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            confidence FLOAT,
+            bbox_x1 INT,
+            bbox_y1 INT,
+            bbox_x2 INT,
+            bbox_y2 INT,
+            image LONGTEXT,
+            location_lat FLOAT,
+            location_lng FLOAT,
+            timestamp DATETIME
+        )
+        """)
+        # Older persons tables were created without a location
+        cursor.execute("SHOW COLUMNS FROM persons")
+        columns = {row[0] for row in cursor.fetchall()}
+        for column in ("location_lat", "location_lng"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE persons ADD COLUMN {column} FLOAT")
+        
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS drone_status (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255),
+            is_connected BOOLEAN,
+            battery_level INT,
+            location_lat FLOAT,
+            location_lng FLOAT,
+            timestamp DATETIME
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS hazards (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            type ENUM('pole', 'fire', 'tree', 'flood'),
+            location_lat FLOAT,
+            location_lng FLOAT,
+            severity ENUM('Low', 'Moderate', 'High', 'Critical'),
+            details TEXT,
+            created_by VARCHAR(255),
+            created_at DATETIME
+        )
+        """)
+    conn.commit()
+
+# Telemetry and detection rows are buffered and written in batches off the event loop
+writer = BatchWriter(SingleStoreBackend(pool))
+
+# Serves /api/drone_status and /api/persons from memory; the ingest path keeps it current
+state_cache = LatestStateCache()
+
+# Grid index over hazards and persons for box, radius and nearest-neighbour queries
+spatial_index = SpatialIndex()
+spatial_refresh_task = None
+
+def hazards_in_box(min_lat, min_lng, max_lat, max_lng):
+    return [{"id": item_id, "location_lat": lat, "location_lng": lng, **payload}
+            for item_id, lat, lng, payload in spatial_index["hazards"].within_box(min_lat, min_lng, max_lat, max_lng)]
+
+# Hazard-aware route search over cached cost grids; new hazards are queued for the planner's
+# thread, which updates the grids and repairs cached routes before its next plan
+route_planner = RoutePlanner(hazards_in_box)
+
+def on_index_insert(kind, row):
+    if kind == "hazards":
+        route_planner.add_hazard(row)
+
+spatial_index.on_insert.append(on_index_insert)
+
+# Merges repeated person detections across frames into stable entities (timestamps in seconds).
+# Boxes from different cameras are not comparable, so each drone gets its own.
+person_fusions = {}
+
+def person_fusion_for(drone_id):
+    if drone_id not in person_fusions:
+        person_fusions[drone_id] = DetectionFusion(classes=["person"], ttl=10.0)
+    return person_fusions[drone_id]
+
+# Where rescue teams set out from when a route request does not say (defaults to the dashboard's map center)
+RESCUE_BASE = (float(os.getenv('RESCUE_BASE_LAT', 35.7796)), float(os.getenv('RESCUE_BASE_LNG', -78.6382)))
+
+async def plan_rescue_route(person_id, avoid, start=None):
+    """Route from `start` (or the rescue base) to a person, or None if the person has no known location."""
+    try:
+        person = spatial_index["persons"].items.get(int(person_id))
+    except (TypeError, ValueError):
+        person = None
+    if person is None:
+        return None
+    return await route_planner.plan(start or RESCUE_BASE, person[:2], avoid)
+
+def on_rows_written(table):
+    if table == "persons":
+        state_cache.invalidate("persons")
+    if table in SpatialIndex.QUERIES:
+        asyncio.create_task(spatial_index.refresh(pool, table))
+
+async def refresh_spatial_index(interval=5.0):
+    # Picks up rows inserted outside this process, e.g. through the agent's execute_sql tool
+    while True:
+        await asyncio.sleep(interval)
+        await spatial_index.refresh(pool)
+
+writer.on_flush.append(on_rows_written)
+
+# The agent's execute_sql goes through this: paged, compact results, cached until the data changes
+# Queries the database cannot page are streamed on unbuffered connections, so a large result never sits in memory
+query_layer = QueryLayer(pool, stream_pool=ConnectionPool(lambda: connect_singlestore(buffered=False), size=1))
+writer.on_flush.append(query_layer.bump)
+
+# drone_status rows are written (and served) only when a value moves past its delta or the heartbeat is due
+status_filter = DeltaFilter(heartbeat=float(os.getenv('DRONE_STATUS_HEARTBEAT', 30.0)))
+
+def record_drone_status(row):
+    """Queue a drone_status row unless it repeats the last one; returns whether it was recorded."""
+    if not status_filter.should_emit(row["name"], row):
+        return False
+    writer.add("drone_status", row)
+    state_cache.update_drone_status(row)
+    return True
+
+database_state = {"state": "starting", "error": None}
+database_task = None
+
+async def init_database():
+    """Create tables and load the spatial index without holding up the server's startup."""
+    global spatial_refresh_task
+    try:
+        await pool.run(create_tables)
+        await spatial_index.refresh(pool)
+    except Exception as e:
+        database_state.update(state="failed", error=str(e))
+        print(f"Database initialization failed: {e}")
+        return
+    database_state["state"] = "ready"
+    spatial_refresh_task = asyncio.create_task(refresh_spatial_index())
+
+@app.on_event("startup")
+async def start_database():
+    global database_task, ingest_task
+    # Nothing here blocks: models warm up in threads and the database initializes in a task,
+    # so REST routes answer (from cache or a lazily opened connection) straight away
+    registry.preload()
+    writer.start()
+    database_task = asyncio.create_task(init_database())
+    ingest_task = asyncio.create_task(ingest())
+
+@app.on_event("shutdown")
+async def stop_database():
+    if database_task is not None:
+        database_task.cancel()
+    if ingest_task is not None:
+        ingest_task.cancel()
+    if spatial_refresh_task is not None:
+        spatial_refresh_task.cancel()
+    await writer.stop()
+    await pool.close()
 
 def connect_to_drone():
     global tello
@@ -124,22 +292,21 @@ def disconnect_from_drone():
         tello = None
 
 def detect_objects(frame):
-    results = model(frame)
+    # Shares the drone agent's model copy and batches with its frames
+    result = inference_server("yolo11x").infer(frame)
     persons = []
 
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            cls = int(box.cls)
-            class_name = model.names[cls]
-            if class_name == "person":
-                conf = float(box.conf)
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                persons.append({
-                    "confidence": conf,
-                    "bbox": [x1, y1, x2, y2]
-                })
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    for box in result.boxes:
+        cls = int(box.cls)
+        class_name = result.names[cls]
+        if class_name == "person":
+            conf = float(box.conf)
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            persons.append({
+                "confidence": conf,
+                "bbox": [x1, y1, x2, y2]
+            })
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
     return frame, persons
 
@@ -166,14 +333,15 @@ async def process_video_stream(websocket: WebSocket):
             _, buffer = cv2.imencode('.jpg', processed_frame)
             jpg_as_text = base64.b64encode(buffer).decode('utf-8')
             
-            # Submit data to the database
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                INSERT INTO drone_status (name, is_connected, battery_level, location_lat, location_lng, timestamp)
-                VALUES (%s, %s, %s, %s, %s, NOW())
-                """, ("Drone 1", drone_connected, battery_level, location_lat, location_lng))
-
-            conn.commit()
+            # Queue the status row; the batch writer submits it to the database
+            record_drone_status({
+                "name": "Drone 1",
+                "is_connected": drone_connected,
+                "battery_level": battery_level,
+                "location_lat": location_lat,
+                "location_lng": location_lng,
+                "timestamp": datetime.now()
+            })
 
             # Send data to the WebSocket client
             await websocket.send_json({
@@ -187,71 +355,222 @@ async def process_video_stream(websocket: WebSocket):
     finally:
         disconnect_from_drone()
 
+# One encode per (frame, quality tier), shared by every adaptive /ws client, per drone (frame ids are per pipeline).
+# Pipeline frames are clean; the overlay is drawn lazily for clients that want it burned in
+frame_encoders = {}
+
+def frame_encoder_for(drone_id):
+    if drone_id not in frame_encoders:
+        frame_encoders[drone_id] = SharedEncoder(annotate=annotate_frame)
+    return frame_encoders[drone_id]
+
+async def frame_message(result, drone_status: DroneStatus, binary: bool, overlay=True, tier=None):
+    """
+    One DRONE_DATA message for a pipeline frame: packed bytes, or JSON text with a base64 frame.
+    With `overlay=False` the JPEG is clean and the client draws `detected_objects` itself.
+    """
+    if overlay or tier is not None:
+        jpeg = await frame_encoder_for(drone_status.drone_id).encode(result, tier, overlay)
+    else:
+        jpeg = result.encoded
+
+    # Boxes are in source pixels; the JPEG is the source resized by `scale`
+    source_height, source_width = result.image.shape[:2]
+    metadata = {
+        "event": "DRONE_DATA",
+        "detected_objects": [obj.dict() for obj in result.detected_objects],
+        "droneStatus": drone_status.dict(),
+        "annotated": overlay,
+        "sourceWidth": source_width,
+        "sourceHeight": source_height,
+        "scale": QUALITY_TIERS[tier][1] if tier is not None else 1.0
+    }
+    if binary:
+        flags = FLAG_ANNOTATED if overlay else 0
+        return pack_frame(result.frame_id, result.timestamp, jpeg, metadata, flags)
+    return json.dumps({
+        **metadata,
+        "frame": base64.b64encode(jpeg).decode('utf-8'),
+        "frameId": result.frame_id
+    })
+
+async def send_frame(websocket: WebSocket, result, drone_status: DroneStatus, binary: bool, controller,
+                     overlay=True):
+    """Send a pipeline frame to one adaptive /ws client, at the quality and rate its controller allows."""
+    signature = await frame_encoder_for(drone_status.drone_id).signature(result, overlay)
+    if not controller.should_send(signature):
+        return
+    message = await frame_message(result, drone_status, binary, overlay, controller.tier)
+    start = time.perf_counter()
+    if binary:
+        await websocket.send_bytes(message)
+    else:
+        await websocket.send_text(message)
+    controller.on_sent(result.frame_id, signature, time.perf_counter() - start)
+
+# Everything /ws pushes goes through the hub: the ingest task below builds each message once
+# and every viewer's subscription gets the same object
+hub = Hub()
+ingest_queue = DropOldestQueue(maxsize=16)
+ingest_task = None
+
+def frame_topic(drone_id, binary, overlay):
+    return f"frames/{drone_id}/{'binary' if binary else 'json'}/{'annotated' if overlay else 'clean'}"
+
+fleet.on_result.append(lambda session, result: ingest_queue.put((session, result)))
+on_detection.append(lambda detection: hub.publish("detections", {"event": "DETECTION", "data": detection}))
+
+def publish_person(change, entity, drone_id, record_id):
+    if record_id is None:
+        # The writer gave up on the row; the person is forgotten so a later sighting is reported afresh
+        logging.warning(f"Could not record person {entity.id} seen by {drone_id}")
+        person_fusion_for(drone_id).forget(entity.id)
+        return
+    entity.record_id = record_id
+    hub.publish("persons", {
+        "event": f"PERSON_{change.upper()}",
+        "person": {**entity.as_dict(), "id": record_id, "entityId": entity.id, "droneId": drone_id}
+    })
+
+async def ingest_result(session, result):
+    """Fuse detections, record status and publish frames for one new pipeline result, once for all viewers."""
+    drone_status = DroneStatus(**session.status())
+    now = datetime.now()
+
+    # A person gets a row when first confirmed; clients hear about it once the row (and so
+    # its persons.id, the id /api/persons uses) exists, and later moves only go to clients
+    lat, lng = session.location
+    detections = [(obj.class_name, obj.confidence, obj.bbox) for obj in result.detected_objects]
+    for change, entity in person_fusion_for(session.drone_id).update(detections, result.timestamp or time.time()):
+        if change == "new":
+            x1, y1, x2, y2 = (int(v) for v in entity.bbox)
+            writer.add("persons", {
+                "confidence": entity.confidence,
+                "bbox_x1": x1,
+                "bbox_y1": y1,
+                "bbox_x2": x2,
+                "bbox_y2": y2,
+                "image": base64.b64encode(result.encoded).decode('utf-8'),
+                "location_lat": lat,
+                "location_lng": lng,
+                "timestamp": now
+            }, on_written=lambda record_id, entity=entity: publish_person("new", entity, session.drone_id, record_id))
+        elif entity.record_id is not None:
+            publish_person(change, entity, session.drone_id, entity.record_id)
+
+    record_drone_status({
+        "name": drone_status.name,
+        "is_connected": drone_status.is_connected,
+        "battery_level": drone_status.battery_level,
+        "location_lat": lat,
+        "location_lng": lng,
+        "timestamp": now
+    })
+
+    # Only the variants someone is watching get built
+    for binary in (False, True):
+        for overlay in (False, True):
+            topic = frame_topic(session.drone_id, binary, overlay)
+            if hub.has_subscribers(topic):
+                hub.publish(topic, await frame_message(result, drone_status, binary, overlay))
+    # Adaptive clients pick their own tier and rate, from encodes shared through the frame encoder
+    hub.publish(f"results/{session.drone_id}", (result, drone_status), serialize=False)
+
+async def ingest():
+    while True:
+        session, result = await ingest_queue.get()
+        try:
+            await ingest_result(session, result)
+        except Exception as e:
+            print(f"Ingest of frame {result.frame_id} from {session.name} failed: {e}")
+
+async def serve_concurrently(*coroutines):
+    """
+    Run a connection's coroutines (e.g. receiving and pushing) side by side until the first
+    one returns or raises, then cancel the rest and propagate its outcome.
+    """
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def deliver(websocket: WebSocket, message, binary: bool, controller, overlay: bool):
+    if message.topic.startswith("results/"):
+        result, drone_status = message.data
+        await send_frame(websocket, result, drone_status, binary, controller, overlay)
+    elif message.binary:
+        await websocket.send_bytes(message.data)
+    else:
+        await websocket.send_text(message.data)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
+    # Clients connecting with ?transport=binary get frames as binary messages (see transport.py)
+    binary = websocket.query_params.get("transport") == "binary"
+    # ?adaptive=1 scales JPEG quality, resolution and frame rate to the client's backpressure.
+    # Such clients should reply {"event": "ACK", "frameId": ...} to each frame so round-trip can be measured.
+    controller = ClientStreamController() if websocket.query_params.get("adaptive") == "1" else None
+    # ?overlay=client sends clean frames; the client draws detected_objects over them
+    overlay = websocket.query_params.get("overlay") != "client"
+    # ?drone=<id> picks whose video this client watches (default: the first drone)
     try:
+        watched = fleet.get(websocket.query_params.get("drone")).drone_id
+    except KeyError:
+        await websocket.close(code=1008, reason="Unknown drone")
+        return
+    # Frames are latest-only, so a slow client skips to the newest; events queue (oldest dropped when full)
+    frames = f"results/{watched}" if controller is not None else frame_topic(watched, binary, overlay)
+    subscription = hub.subscribe({frames: "latest", "persons": "drop", "detections": "drop"},
+                                 name=f"ws {websocket.client.host if websocket.client else ''}")
+    # Client commands and server pushes are handled concurrently; the two share the socket
+    send_lock = asyncio.Lock()
+
+    async def receive():
         while True:
-            try:
-                data = await websocket.receive_json()
-                event = data["event"]
-
-                if event == "GET_DRONES":
-                    ctx = Context()
-                    response = await ctx.send(drone_agent.address, DroneList(drones=[]))
-                    if isinstance(response, DroneList):
-                        await websocket.send_json({
-                            "event": "DRONE_LIST",
-                            "drones": [drone.dict() for drone in response.drones]
-                        })
-                    else:
-                        print(f"Unexpected response: {response}")
-                elif event == "DEPLOY":
-                    await drone_agent.send(drone_agent.address, DeployCommand(command="takeoff"))
-                elif event == "MOVE":
-                    x, y, z, yaw = data.get("x", 0), data.get("y", 0), data.get("z", 0), data.get("yaw", 0)
-                    await drone_agent.send(drone_agent.address, MoveCommand(x=x, y=y, z=z, yaw=yaw))
-
-                # Handle incoming messages from the drone agent
-                detection_data = await drone_agent.receive("detection")
-                if detection_data:
-                    await websocket.send_json({
-                        "event": "DETECTION",
-                        "data": detection_data
-                    })
-
-                drone_data = await drone_agent.receive("drone_metadata")
-                if isinstance(drone_data, DroneData):
-                    # Insert data into SingleStore
-                    with conn.cursor() as cursor:
-                        for obj in drone_data.detected_objects:
-                            if obj.class_name == "person":
-                                cursor.execute("""
-                                INSERT INTO persons (confidence, bbox_x1, bbox_y1, bbox_x2, bbox_y2, image, timestamp)
-                                VALUES (%s, %s, %s, %s, %s, %s, NOW())
-                                """, (obj.confidence, *obj.bbox, drone_data.frame))
-                        
-                        cursor.execute("""
-                        INSERT INTO drone_status (name, is_connected, battery_level, location_lat, location_lng, timestamp)
-                        VALUES (%s, %s, %s, %s, %s, NOW())
-                        """, (drone_data.drone_status.name, drone_data.drone_status.is_connected, drone_data.drone_status.battery_level, 0, 0))  # Replace 0, 0 with actual lat/lng when available
-                    
-                    conn.commit()
+            data = await websocket.receive_json()
+            event = data["event"]
 
+            # Commands address a drone with "droneId"; without one they go to the first drone
+            drone_id = data.get("droneId", "")
+            if event == "GET_DRONES":
+                async with send_lock:
                     await websocket.send_json({
-                        "event": "DRONE_DATA",
-                        "detected_objects": [obj.dict() for obj in drone_data.detected_objects],
-                        "frame": drone_data.frame,
-                        "droneStatus": drone_data.drone_status.dict(),
-                        "message": "Data inserted into SingleStore"
+                        "event": "DRONE_LIST",
+                        "drones": [drone.dict() for drone in get_available_drones()]
                     })
+            elif event in ("DEPLOY", "MOVE"):
+                # Straight to the drone's session; both return at once
+                try:
+                    session = fleet.get(drone_id)
+                except KeyError:
+                    async with send_lock:
+                        await websocket.send_json({"event": "error", "message": f"Unknown drone: {drone_id}"})
+                    continue
+                if event == "DEPLOY":
+                    session.deploy(lambda session: search_and_rescue(None, session))
+                else:
+                    session.move(data.get("x", 0), data.get("y", 0), data.get("z", 0), data.get("yaw", 0))
+            elif event == "ACK" and controller is not None:
+                controller.on_ack(data.get("frameId"))
 
-            except asyncio.TimeoutError:
-                pass
-            
-            await asyncio.sleep(0.1)
+    async def push():
+        # Wakes as soon as the hub has something for this client
+        async for message in subscription:
+            async with send_lock:
+                await deliver(websocket, message, binary, controller, overlay)
+
+    try:
+        await serve_concurrently(receive(), push())
     except WebSocketDisconnect:
         print("WebSocket disconnected")
+    finally:
+        subscription.close()
         
 @app.websocket("/ws_agent")
 async def agent_websocket_endpoint(websocket: WebSocket):
@@ -259,6 +578,15 @@ async def agent_websocket_endpoint(websocket: WebSocket):
     WebSocket endpoint for handling agent interactions.
     """
     await websocket.accept()
+    # Loaded in the background at startup; only the first early connection waits for it
+    lc = await registry.get_async("agent_stack")
+    tool = lc.tool
+    # Incoming messages are read while an answer streams out; both sides share the socket
+    send_lock = asyncio.Lock()
+
+    async def send(payload):
+        async with send_lock:
+            await websocket.send_json(payload)
 
     # Define the system prompt
     system_prompt = """You are an AI assistant for a search and rescue application. Your primary role is to support drone operators in mapping hazards and plotting safe routes.
@@ -270,7 +598,7 @@ Key capabilities:
 
 Database schema:
 - persons: Stores information about detected persons
-  (id INT, location_lat FLOAT, location_lng FLOAT, timestamp DATETIME)
+  (id INT, confidence FLOAT, bbox_x1 INT, bbox_y1 INT, bbox_x2 INT, bbox_y2 INT, image LONGTEXT, location_lat FLOAT, location_lng FLOAT, timestamp DATETIME)
 - drone_status: Stores drone status information
   (id INT, name VARCHAR(255), is_connected BOOLEAN, battery_level INT, location_lat FLOAT, location_lng FLOAT, timestamp DATETIME)
 - hazards: Stores information about detected hazards
@@ -294,7 +622,7 @@ Remember, your guidance directly impacts the safety of both rescue teams and tho
             humans: Boolean value to determine if humans should be displayed on the map. Default is True.
         """
         # Send the hazards back as JSON
-        await websocket.send_json({
+        await send({
             "event": "display_hazards",
             "hazards": hazards,
             "drones": drones,
@@ -303,151 +631,300 @@ Remember, your guidance directly impacts the safety of both rescue teams and tho
         return {"status": "success", "message": "Sent hazards, drones, and humans to the frontend."}
 
     @tool
-    async def plan_route(id: str, hazards: List[str]):
+    async def plan_route(id: str, hazards: List[str], start_lat: Optional[float] = None, start_lng: Optional[float] = None):
         """
         Plan a route to help people avoid hazards. You only need the id of the person in need of rescue and the list of hazards to avoid.
 
         Args:
             id: The ID of the person in need of rescue.
             hazards: List of types of hazards to avoid. List of one or more of the following: "all", "person", "fire", "tree", "power", "flood". Default is empty list to signify no hazards avoided.
+            start_lat: Latitude the rescue team starts from. Defaults to the rescue base.
+            start_lng: Longitude the rescue team starts from. Defaults to the rescue base.
         """
-        # Send the id and hazards back as JSON
-        await websocket.send_json({
+        start = (start_lat, start_lng) if start_lat is not None and start_lng is not None else None
+        route = await plan_rescue_route(id, hazards, start)
+        # Send the id, hazards and the planned route back as JSON
+        await send({
             "event": "plan_route",
             "id": id,
-            "hazards": hazards
+            "hazards": hazards,
+            "route": route
         })
-        return {"status": "success", "message": "Route has been planned and sent to the frontend."}
+        if route is None:
+            return {"status": "success", "message": "Person location unknown; the frontend will plan the route."}
+        if not route["found"]:
+            return {"status": "error", "message": "No route avoids the requested hazards."}
+        return {"status": "success", "message": f"Route of {route['distance_m']:.0f} m has been planned and sent to the frontend."}
     
     @tool
-    async def execute_sql(query: str):
+    async def execute_sql(query: str, offset: int = 0, limit: int = 50):
         """
-        Execute an SQL query against the database. 
+        Execute an SQL query against the database. Results come back as a compact table of at most `limit` rows
+        with the total row count, plus per-column summaries when there are more rows than shown. Prefer aggregates
+        (COUNT, AVG, GROUP BY, ORDER BY ... LIMIT) over listing many rows.
 
         Args:
             query: The SQL query to execute.
+            offset: Number of rows to skip, to page through a large result. Default is 0.
+            limit: Maximum number of rows to return, at most 200. Default is 50.
 
         Returns:
-            A dictionary containing the query results or an error message.
+            The query results as a table, or an error message.
         """
         try:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
-                results = cursor.fetchall()
-                columns = [column[0] for column in cursor.description]
-                data = [dict(zip(columns, row)) for row in results]
-                print("Here are the results of the query:", data)
-            return "Here are the results of the query:" + str(data)
+            return "Here are the results of the query:\n" + await query_layer.execute(query, offset, limit)
         except Exception as e:
             return str(e)
 
+    @tool
+    async def find_nearby(kind: str, lat: float, lng: float, radius_m: float = 500.0, limit: int = 10):
+        """
+        Find hazards or persons near a location, nearest first. Prefer this over SQL for location questions.
+
+        Args:
+            kind: What to search for. One of "hazards" or "persons".
+            lat: Latitude of the search center.
+            lng: Longitude of the search center.
+            radius_m: Search radius in meters. Default is 500.
+            limit: Maximum number of results. Default is 10.
+        """
+        if kind not in SpatialIndex.QUERIES:
+            return f"Unknown kind {kind!r}, expected 'hazards' or 'persons'."
+        found = spatial_index[kind].nearest(lat, lng, k=limit, max_radius_m=radius_m)
+        return [{"id": item_id, "distance_m": round(distance, 1), "location": {"lat": ilat, "lng": ilng}, **payload}
+                for distance, item_id, ilat, ilng, payload in found]
+
     # Initialize tools
-    tools = [display_hazards, plan_route, execute_sql]
+    tools = [display_hazards, plan_route, execute_sql, find_nearby]
 
     # Initialize memory
-    memory = MemorySaver()
+    memory = lc.MemorySaver()
 
     # Initialize the LLM
-    llm = ChatGoogleGenerativeAI(
+    llm = lc.ChatGoogleGenerativeAI(
         model="gemini-1.5-pro",
         api_key=os.getenv("GEMINI_API_KEY"),
         temperature=0.0
     )
 
     # Create the agent executor
-    agent_executor = create_react_agent(llm, tools, state_modifier=system_prompt, checkpointer=memory)
+    agent_executor = lc.create_react_agent(llm, tools, state_modifier=system_prompt, checkpointer=memory)
 
     # Configuration for the agent
     config = {"configurable": {"thread_id": "agent_ws_connection"}}
 
-    try:
+    queries = asyncio.Queue()
+    answering = False
+
+    async def receive():
         while True:
             try:
                 data = await asyncio.wait_for(websocket.receive_json(), timeout=120.0)
-                event = data.get("event")
-
-                if event == "query":
-                    user_message = data.get("message", "")
-                    if user_message:
-                        # Process the message through the agent
-                        async for event in agent_executor.astream_events(
-                            {
-                                "messages": [
-                                    HumanMessage(content=user_message)
-                                ]
-                            }, 
-                            config, 
-                            version="v1"
-                        ):
-                            kind = event.get("event")
-                            
-                            if kind == "on_chat_model_stream":
-                                
-                                content = event["data"]["chunk"].content
-                                if content:
-                                    # Stream the chunk back to the client as it arrives
-                                    await websocket.send_json({
-                                        "event": "chat_chunk",
-                                        "content": content
-                                    })
-                            elif kind == "on_tool_start":
-                                # Optionally handle tool start
-                                pass
-                            elif kind == "on_tool_end":
-                                # Optionally handle tool end
-                                pass
-                            elif kind == "on_chain_start":
-                                # Optionally handle chain start
-                                pass
-                            elif kind == "on_chain_end":
-                                # Optionally handle chain end
-                                pass
-
-                        # After streaming all chunks, you might want to send a final message
-                        await websocket.send_json({
-                            "event": "AGENT_RESPONSE_COMPLETE",
-                            "message": "Agent response complete."
-                        })
-                    else:
-                        await websocket.send_json({
-                            "event": "error",
-                            "message": "No message provided for AGENT_QUERY."
-                        })
+            except asyncio.TimeoutError:
+                if not answering and queries.empty():
+                    await send({
+                        "event": "timeout",
+                        "message": "No message received in 120 seconds."
+                    })
+                continue
+
+            event = data.get("event")
+            if event == "query":
+                user_message = data.get("message", "")
+                if user_message:
+                    # Answered in order by answer(); receiving carries on meanwhile
+                    queries.put_nowait(user_message)
                 else:
-                    await websocket.send_json({
+                    await send({
                         "event": "error",
-                        "message": "Unknown event type."
+                        "message": "No message provided for AGENT_QUERY."
                     })
-
-            except asyncio.TimeoutError:
-                await websocket.send_json({
-                    "event": "timeout",
-                    "message": "No message received in 120 seconds."
+            else:
+                await send({
+                    "event": "error",
+                    "message": "Unknown event type."
                 })
-            
-            await asyncio.sleep(0.1)
+
+    async def answer():
+        nonlocal answering
+        while True:
+            user_message = await queries.get()
+            answering = True
+            # Process the message through the agent
+            async for event in agent_executor.astream_events(
+                {
+                    "messages": [
+                        lc.HumanMessage(content=user_message)
+                    ]
+                }, 
+                config, 
+                version="v1"
+            ):
+                kind = event.get("event")
+                
+                if kind == "on_chat_model_stream":
+                    
+                    content = event["data"]["chunk"].content
+                    if content:
+                        # Stream the chunk back to the client as it arrives
+                        await send({
+                            "event": "chat_chunk",
+                            "content": content
+                        })
+
+            # After streaming all chunks, you might want to send a final message
+            await send({
+                "event": "AGENT_RESPONSE_COMPLETE",
+                "message": "Agent response complete."
+            })
+            answering = False
+
+    try:
+        await serve_concurrently(receive(), answer())
     except WebSocketDisconnect:
         print("Agent WebSocket disconnected")
 
+def cached_json(request: Request, resource: str, body):
+    """JSON response tagged with the cache version of `resource`, or 304 if the client already has it."""
+    etag = state_cache.etag(resource)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=jsonable_encoder(body), headers={"ETag": etag})
+
+async def load_persons():
+    _, persons = await pool.query("""
+    SELECT id, confidence, bbox_x1, bbox_y1, bbox_x2, bbox_y2, image, timestamp, location_lat, location_lng
+    FROM persons ORDER BY timestamp DESC LIMIT 10
+    """)
+    return [{"id": p[0], "confidence": p[1], "bbox": p[2:6], "image": p[6], "timestamp": p[7],
+             "location_lat": p[8], "location_lng": p[9]} for p in persons]
+
+async def load_drone_status():
+    columns, rows = await pool.query("""
+    SELECT name, is_connected, battery_level, location_lat, location_lng, timestamp
+    FROM drone_status ORDER BY timestamp DESC LIMIT 1
+    """)
+    return [dict(zip(columns, row)) for row in rows]
+
 @app.get("/api/persons")
-async def get_persons():
+async def get_persons(request: Request):
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM persons ORDER BY timestamp DESC LIMIT 10")
-            persons = cursor.fetchall()
-        return [{"id": p[0], "confidence": p[1], "bbox": p[2:6], "image": p[6], "timestamp": p[7]} for p in persons]
+        persons = await state_cache.get_persons(load_persons)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return cached_json(request, "persons", persons)
 
 @app.get("/api/drone_status") 
-async def get_drone_status(): 
+async def get_drone_status(request: Request, name: Optional[str] = None): 
     try:
+        drone = await state_cache.get_drone_status(load_drone_status, name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if drone is None:
+        raise HTTPException(status_code=404, detail="No drone status recorded yet")
+    return cached_json(request, "drone_status", drone)
+
+def spatial_results(found):
+    return [{"id": item_id, "distance_m": distance, "location": {"lat": lat, "lng": lng}, **payload}
+            for distance, item_id, lat, lng, payload in found]
+
+def get_spatial_index(kind: str):
+    if kind not in SpatialIndex.QUERIES:
+        raise HTTPException(status_code=404, detail=f"Unknown kind {kind!r}")
+    return spatial_index[kind]
+
+@app.get("/api/{kind}/within_box")
+async def get_within_box(kind: str, min_lat: float, min_lng: float, max_lat: float, max_lng: float):
+    found = get_spatial_index(kind).within_box(min_lat, min_lng, max_lat, max_lng)
+    return spatial_results((None, item_id, lat, lng, payload) for item_id, lat, lng, payload in found)
+
+@app.get("/api/{kind}/within_radius")
+async def get_within_radius(kind: str, lat: float, lng: float, radius_m: float):
+    return spatial_results(get_spatial_index(kind).within_radius(lat, lng, radius_m))
+
+@app.get("/api/{kind}/nearest")
+async def get_nearest(kind: str, lat: float, lng: float, k: int = 5, max_radius_m: Optional[float] = None):
+    return spatial_results(get_spatial_index(kind).nearest(lat, lng, k, max_radius_m))
+
+@app.get("/api/route")
+async def get_route(person_id: str, avoid: List[str] = Query(default=[]),
+                    start_lat: Optional[float] = None, start_lng: Optional[float] = None):
+    start = (start_lat, start_lng) if start_lat is not None and start_lng is not None else None
+    route = await plan_rescue_route(person_id, avoid, start)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"No location known for person {person_id}")
+    return route
+
+@app.post("/api/hazards")
+async def create_hazard(hazard: Hazard):
+    row = {**hazard.dict(), "created_at": datetime.now()}
+
+    def insert(conn):
         with conn.cursor() as cursor:
-            cursor.execute("SELECT * FROM drone_status ORDER BY timestamp DESC LIMIT 1")
-            drone = cursor.fetchone()
-        return {"name": drone[1], "isConnected": drone[2], "batteryLevel": drone[3], "location": {"lat": drone[4], "lng": drone[5]}, "timestamp": drone[6]}
+            cursor.execute(f"""
+            INSERT INTO hazards ({', '.join(row)})
+            VALUES ({', '.join(['%s'] * len(row))})
+            """, tuple(row.values()))
+            hazard_id = cursor.lastrowid
+        conn.commit()
+        return hazard_id
+
+    try:
+        row["id"] = await pool.run(insert)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    spatial_index.insert("hazards", row)
+    return row
+
+TILES_DIR = os.getenv('TILES_DIR', 'tiles')
+tile_sets = {}
+
+def get_tile_set(scan: str):
+    """The tile set exported (by clean_ply --tiles) to TILES_DIR/<scan>, reloaded if re-exported."""
+    index_path = os.path.join(TILES_DIR, scan, "index.json")
+    if not re.fullmatch(r"[\w-]+", scan) or not os.path.exists(index_path):
+        raise HTTPException(status_code=404, detail=f"Unknown scan {scan!r}")
+    tile_set = tile_sets.get(scan)
+    if tile_set is None or tile_set.mtime != os.path.getmtime(index_path):
+        tile_set = tile_sets[scan] = TileSet(os.path.join(TILES_DIR, scan))
+    return tile_set
+
+@app.get("/api/tiles/{scan}/index")
+async def get_tile_index(scan: str):
+    return get_tile_set(scan).index
+
+@app.post("/api/tiles/{scan}/query")
+async def query_tiles(scan: str, query: TileQuery):
+    if any(len(plane) != 4 for plane in query.planes) or (query.camera is not None and len(query.camera) != 3):
+        raise HTTPException(status_code=422, detail="Planes need 4 values and the camera 3")
+    tiles = get_tile_set(scan).select(query.planes, query.camera, query.max_level,
+                                      query.max_points, query.error_threshold)
+    return [{**tile, "url": f"/api/tiles/{scan}/{tile['name']}"} for tile in tiles]
+
+@app.get("/api/tiles/{scan}/{node}")
+async def get_tile(scan: str, node: str):
+    try:
+        path = get_tile_set(scan).path(node)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown tile {node!r}")
+    return FileResponse(path, media_type="application/octet-stream")
+
+@app.get("/api/health")
+async def get_health():
+    """Liveness plus readiness of the heavy pieces; `ready` turns true once models are warm and the database is set up."""
+    return {
+        "status": "ok",
+        "ready": registry.ready() and database_state["state"] == "ready",
+        "uptime_s": time.time() - started_at,
+        "models": registry.status(),
+        "database": database_state,
+    }
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return {"db_writer": writer.stats(), "db_pool": pool.stats(), "fleet": fleet.metrics(),
+            "inference": server_stats(), "drone_status_filter": status_filter.stats(),
+            "hub": hub.stats(), "query_layer": query_layer.stats()}
 
 if __name__ == "__main__":
     import uvicorn
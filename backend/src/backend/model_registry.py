@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+import time
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of heavy resources (model weights, ML stacks) that load on demand.
+
+    Each entry is a loader plus an optional warm-up run on the loaded object. `get` loads
+    on first use and blocks until ready; concurrent callers share one load. `preload`
+    starts loading in background threads so the server can answer requests meanwhile, and
+    `status` reports where each entry is for health checks.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = {
+                    "loader": loader, "warmup": warmup, "value": None, "state": "pending",
+                    "error": None, "load_ms": None, "warmup_ms": None, "done": threading.Event(),
+                }
+
+    def _load(self, name):
+        entry = self._entries[name]
+        with self._lock:
+            if entry["state"] in ("loading", "ready"):
+                owner = False
+            else:
+                entry["state"], entry["error"], owner = "loading", None, True
+                entry["done"].clear()
+        if not owner:
+            entry["done"].wait()
+            return
+
+        try:
+            started = time.perf_counter()
+            value = entry["loader"]()
+            entry["load_ms"] = (time.perf_counter() - started) * 1000
+            if entry["warmup"] is not None:
+                started = time.perf_counter()
+                entry["warmup"](value)
+                entry["warmup_ms"] = (time.perf_counter() - started) * 1000
+            entry["value"], entry["state"] = value, "ready"
+            logging.info(f"Loaded {name} in {entry['load_ms']:.0f} ms (warm-up {entry['warmup_ms'] or 0:.0f} ms)")
+        except Exception as e:
+            entry["state"], entry["error"] = "failed", str(e)
+            logging.exception(f"Failed to load {name}")
+        finally:
+            entry["done"].set()
+
+    def get(self, name):
+        """The loaded object, loading it in this thread if nobody has started yet."""
+        entry = self._entries[name]
+        if entry["state"] != "ready":
+            self._load(name)
+            if entry["state"] != "ready":
+                raise RuntimeError(f"{name} failed to load: {entry['error']}")
+        return entry["value"]
+
+    async def get_async(self, name):
+        if self.ready(name):
+            return self._entries[name]["value"]
+        return await asyncio.to_thread(self.get, name)
+
+    def preload(self, *names):
+        """Start loading (and warming up) the given entries, or all of them, in background threads."""
+        for name in names or list(self._entries):
+            if self._entries[name]["state"] == "pending":
+                threading.Thread(target=self._load, args=(name,), name=f"load-{name}", daemon=True).start()
+
+    def ready(self, name=None):
+        names = [name] if name else list(self._entries)
+        return all(self._entries[n]["state"] == "ready" for n in names)
+
+    def status(self):
+        return {
+            name: {k: entry[k] for k in ("state", "error", "load_ms", "warmup_ms")}
+            for name, entry in self._entries.items()
+        }
+
+
+registry = ModelRegistry()
+
+
+def load_yolo(weights, device=None):
+    # Imported here so that importing the server does not pay for torch/ultralytics
+    import torch
+    from ultralytics import YOLO
+
+    model = YOLO(weights)
+    if device:
+        model.to(device)
+    elif torch.cuda.is_available():
+        model.to('cuda:0')
+    return model
+
+
+def warmup_yolo(model, imgsz=640):
+    """One dummy inference so the first real frame does not pay for kernel/graph setup."""
+    import numpy as np
+
+    model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
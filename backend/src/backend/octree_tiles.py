@@ -0,0 +1,165 @@
+import heapq
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+INDEX_FILE = "index.json"
+NODE_NAME = re.compile(r"r[0-7]*")  # Root is "r"; each child appends its octant digit
+
+
+def write_ply(path, xyz, rgb=None):
+    """Write a binary little-endian PLY with float32 positions and optional uchar colors in [0, 1]."""
+    fields = [('x', '<f4'), ('y', '<f4'), ('z', '<f4')]
+    if rgb is not None:
+        fields += [('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+    vertices = np.empty(len(xyz), dtype=fields)
+    vertices['x'], vertices['y'], vertices['z'] = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(xyz)}",
+              "property float x", "property float y", "property float z"]
+    if rgb is not None:
+        colors = np.clip(np.round(rgb * 255), 0, 255).astype(np.uint8)
+        vertices['red'], vertices['green'], vertices['blue'] = colors[:, 0], colors[:, 1], colors[:, 2]
+        header += ["property uchar red", "property uchar green", "property uchar blue"]
+    with open(path, 'wb') as f:
+        f.write(("\n".join(header + ["end_header"]) + "\n").encode('ascii'))
+        vertices.tofile(f)
+
+
+def build_tiles(points, colors, out_dir, max_points=50000, grid=32, max_depth=10):
+    """
+    Split a point cloud into octree level-of-detail tiles under `out_dir`.
+
+    Every node keeps at most one point per cell of a `grid`^3 lattice over its cube and
+    passes the rest down to its eight children, so each level adds detail to its parents
+    (tiles are additive, never duplicated). Nodes with at most `max_points` points, or at
+    `max_depth`, keep everything. Writes one PLY per node plus an index.json describing
+    the tree and returns the index.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    colors = None if colors is None or len(colors) == 0 else np.asarray(colors)
+    os.makedirs(out_dir, exist_ok=True)
+    lo = points.min(axis=0)
+    size = max(float((points.max(axis=0) - lo).max()), 1e-9)
+
+    nodes = {}
+    stack = [("r", lo, size, np.arange(len(points)))]
+    while stack:
+        name, origin, size_, idx = stack.pop()
+        level = len(name) - 1
+        spacing = size_ / grid
+        if len(idx) <= max_points or level >= max_depth:
+            keep, rest = idx, idx[:0]
+        else:
+            cells = np.minimum(((points[idx] - origin) / spacing).astype(np.int64), grid - 1)
+            _, first = np.unique((cells[:, 0] * grid + cells[:, 1]) * grid + cells[:, 2], return_index=True)
+            chosen = np.zeros(len(idx), dtype=bool)
+            chosen[first] = True
+            keep, rest = idx[chosen], idx[~chosen]
+
+        write_ply(os.path.join(out_dir, f"{name}.ply"), points[keep],
+                  colors[keep] if colors is not None else None)
+
+        children = []
+        if len(rest):
+            half = size_ / 2
+            upper = points[rest] >= origin + half
+            octants = upper[:, 0] * 4 + upper[:, 1] * 2 + upper[:, 2]
+            for octant in range(8):
+                child_idx = rest[octants == octant]
+                if len(child_idx):
+                    child = name + str(octant)
+                    offset = half * np.array([(octant >> 2) & 1, (octant >> 1) & 1, octant & 1])
+                    children.append(child)
+                    stack.append((child, origin + offset, half, child_idx))
+
+        nodes[name] = {
+            "level": level,
+            "bounds": [float(v) for v in (*origin, *(origin + size_))],
+            "spacing": spacing,
+            "points": int(len(keep)),
+            "file": f"{name}.ply",
+            "children": sorted(children),
+        }
+
+    index = {
+        "version": 1,
+        "bounds": [float(v) for v in (*lo, *(lo + size))],
+        "points": int(len(points)),
+        "has_colors": colors is not None,
+        "nodes": nodes,
+    }
+    with open(os.path.join(out_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def outside_frustum(bounds, planes):
+    """True if the box is entirely behind one of the (a, b, c, d) planes; inside is a*x + b*y + c*z + d >= 0."""
+    x0, y0, z0, x1, y1, z1 = bounds
+    for a, b, c, d in planes:
+        # Test the box corner furthest along the plane normal
+        if a * (x1 if a >= 0 else x0) + b * (y1 if b >= 0 else y0) + c * (z1 if c >= 0 else z0) + d < 0:
+            return True
+    return False
+
+
+def box_distance(bounds, point):
+    x0, y0, z0, x1, y1, z1 = bounds
+    x, y, z = point
+    return math.sqrt(max(x0 - x, 0, x - x1) ** 2 + max(y0 - y, 0, y - y1) ** 2 + max(z0 - z, 0, z - z1) ** 2)
+
+
+class TileSet:
+    """A tile directory written by `build_tiles`, with view-dependent tile selection."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.mtime = os.path.getmtime(self.index_path)
+        with open(self.index_path) as f:
+            self.index = json.load(f)
+        self.nodes = self.index["nodes"]
+
+    def path(self, name):
+        if not NODE_NAME.fullmatch(name) or name not in self.nodes:
+            raise KeyError(name)
+        return os.path.join(self.directory, self.nodes[name]["file"])
+
+    def select(self, planes=(), camera=None, max_level=None, max_points=2_000_000, error_threshold=0.01):
+        """
+        Tiles to load for a view, most needed first.
+
+        Nodes outside the frustum `planes` are skipped. A visible node is refined while its
+        point spacing subtends more than `error_threshold` radians from `camera` (or, without
+        a camera, down to `max_level`). Nodes are taken in order of that error until
+        `max_points` is reached (the root is always included), so coarse tiles arrive before
+        the detail they support.
+        """
+        selected = []
+        total = 0
+        frontier = [(-math.inf, "r")]
+        while frontier:
+            _, name = heapq.heappop(frontier)
+            node = self.nodes[name]
+            if selected and total + node["points"] > max_points:
+                continue
+            total += node["points"]
+            selected.append({"name": name, "level": node["level"], "points": node["points"],
+                             "bounds": node["bounds"]})
+            if max_level is not None and node["level"] >= max_level:
+                continue
+            for child_name in node["children"]:
+                child = self.nodes[child_name]
+                if planes and outside_frustum(child["bounds"], planes):
+                    continue
+                if camera is None:
+                    error = -child["level"]  # Breadth-first when there is no camera
+                else:
+                    error = child["spacing"] / max(box_distance(child["bounds"], camera), 1e-6)
+                    if error < error_threshold:
+                        continue
+                heapq.heappush(frontier, (-error, child_name))
+        return selected
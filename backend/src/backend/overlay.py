@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class OverlayRenderer:
+    """
+    Draws detection boxes and labels onto frames in one pass.
+
+    Label text is rasterized once per (text, color) into a small sprite and pasted on later
+    frames, instead of calling cv2.getTextSize/putText for every label on every frame.
+    Labels show the confidence as ":.2f", so there are at most 101 sprites per class and
+    color. `filled` draws labels on a solid box-colored background; otherwise only the
+    glyphs are blended in. A label that would cross the frame edge is drawn with
+    cv2.putText as before, because OpenCV clips glyph strokes differently from a cropped
+    sprite. Elsewhere the result matches putText except on the odd antialiased pixel where
+    two glyph strokes overlap: putText blends it twice, the sprite once, so a channel can
+    be off by one.
+    """
+
+    def __init__(self, font_scale=0.9, text_thickness=2, box_thickness=2, filled=False,
+                 text_color=None, max_sprites=1024, font=cv2.FONT_HERSHEY_SIMPLEX):
+        self.font = font
+        self.font_scale = font_scale
+        self.text_thickness = text_thickness
+        self.box_thickness = box_thickness
+        self.filled = filled
+        self.text_color = text_color  # None: same as the box
+        self.max_sprites = max_sprites
+        self._sprites = OrderedDict()  # (text, color) -> sprite, see sprite()
+        self._lock = threading.Lock()  # Frames may be annotated from several worker threads
+        self.hits = 0
+        self.misses = 0
+
+    def label_text(self, name, confidence):
+        return f"{name}: {confidence:.2f}"
+
+    def sprite(self, text, color):
+        """
+        Pre-blended label sprite as (color * alpha, 255 - alpha, opaque, dy, dx): compositing
+        is (frame * (255 - alpha) + color * alpha) / 255, anchored at (x1 + dx, y1 + dy).
+        `opaque` is the plain BGR patch when no pixel needs blending, else None.
+        """
+        key = (text, color)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self.hits += 1
+                self._sprites.move_to_end(key)
+                return sprite
+
+        self.misses += 1
+        (width, height), _ = cv2.getTextSize(text, self.font, self.font_scale, self.text_thickness)
+        # Glyph strokes can overhang the measured text box, so render with a margin
+        pad = self.text_thickness + 2
+        # putText antialiases; rendering white on black gives the per-pixel coverage.
+        # The text baseline sits 10 px above the box's top edge, as the original labels did.
+        alpha = np.zeros((height + 11 + 2 * pad, width + 1 + 2 * pad), dtype=np.uint16)
+        coverage = np.zeros(alpha.shape, dtype=np.uint8)
+        cv2.putText(coverage, text, (pad, pad + height), self.font, self.font_scale, 255, self.text_thickness)
+        alpha[:] = coverage
+
+        text_color = np.array(self.text_color or ((255, 255, 255) if self.filled else color), dtype=np.uint16)
+        premultiplied = alpha[..., None] * text_color
+        if self.filled:
+            # The label background (inclusive of its edges, like cv2.rectangle) is fully opaque
+            inner = (slice(pad, pad + height + 11), slice(pad, pad + width + 1))
+            a = alpha[inner][..., None]
+            premultiplied[inner] = np.array(color, dtype=np.uint16) * (255 - a) + text_color * a
+            alpha[inner] = 255
+        # Crop to the pixels the label actually touches
+        rows, cols = np.nonzero(alpha)
+        r0, r1, c0, c1 = rows.min(), rows.max() + 1, cols.min(), cols.max() + 1
+        alpha, premultiplied = alpha[r0:r1, c0:c1], premultiplied[r0:r1, c0:c1]
+        # Full 3-channel inverse; broadcasting a single channel makes the blend several times slower
+        inverse = np.repeat((255 - alpha)[..., None], 3, axis=2)
+        opaque = ((premultiplied + 127) // 255).astype(np.uint8) if (alpha == 255).all() else None
+        sprite = (premultiplied, inverse, opaque, r0 - (height + 10 + pad), c0 - pad)
+        with self._lock:
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.max_sprites:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def draw(self, frame, boxes):
+        """Draw (x1, y1, x2, y2, name, confidence, color) boxes onto `frame` in place and return it."""
+        frame_h, frame_w = frame.shape[:2]
+        for x1, y1, x2, y2, name, confidence, color in boxes:
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, self.box_thickness)
+
+            text = self.label_text(name, confidence)
+            premultiplied, inverse, opaque, dy, dx = self.sprite(text, tuple(color))
+            top, left = y1 + dy, x1 + dx
+            bottom, right = top + premultiplied.shape[0], left + premultiplied.shape[1]
+            if top < 0 or left < 0 or bottom > frame_h or right > frame_w:
+                if bottom > 0 and right > 0 and top < frame_h and left < frame_w:
+                    self.draw_label(frame, x1, y1, text, color)
+                continue
+            region = frame[top:bottom, left:right]
+            if opaque is not None:
+                region[:] = opaque
+            else:
+                region[:] = (region * inverse + premultiplied + 127) // 255
+        return frame
+
+    def draw_label(self, frame, x1, y1, text, color):
+        """Draw a label directly, for the few that the frame edge cuts off."""
+        if self.filled:
+            (width, height), _ = cv2.getTextSize(text, self.font, self.font_scale, self.text_thickness)
+            cv2.rectangle(frame, (x1, y1 - height - 10), (x1 + width, y1), color, -1)
+        text_color = self.text_color or ((255, 255, 255) if self.filled else color)
+        cv2.putText(frame, text, (x1, y1 - 10), self.font, self.font_scale, text_color, self.text_thickness)
+
+    def stats(self):
+        return {"sprites": len(self._sprites), "hits": self.hits, "misses": self.misses}
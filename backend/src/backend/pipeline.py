@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+
+class DropOldestQueue:
+    """Bounded asyncio queue that evicts the oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize=1):
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def put(self, item):
+        while self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+@dataclass
+class FrameResult:
+    frame_id: int
+    timestamp: float  # Capture time (time.time())
+    image: Any  # BGR frame, annotated unless the pipeline has no annotate stage
+    detected_objects: List[Any] = field(default_factory=list)
+    encoded: Any = None  # Output of the encode stage
+    latency: float = 0.0  # Capture to encode, in seconds
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total_time += seconds
+        self.last_time = seconds
+
+    def as_dict(self):
+        avg = self.total_time / self.count if self.count else 0.0
+        return {"count": self.count, "avg_ms": avg * 1000, "last_ms": self.last_time * 1000}
+
+
+class FramePipeline:
+    """
+    Runs capture -> inference -> annotation -> encoding as concurrent stages.
+
+    Stages are connected by small drop-oldest queues, so a slow stage only ever sees the
+    freshest frame and end-to-end latency stays bounded. Blocking work (inference, drawing,
+    JPEG encoding) runs on one dedicated thread per stage, keeping the event loop free.
+    With `annotate=None` frames are encoded clean and consumers draw overlays themselves.
+    """
+
+    STAGES = ("capture", "inference", "annotate", "encode")
+
+    def __init__(self,
+                 capture: Callable[[], Any],
+                 detect: Callable[[Any], List[Any]],
+                 annotate: Optional[Callable[[Any, List[Any]], Any]],
+                 encode: Callable[[Any], Any],
+                 period: float = 0.1,
+                 queue_size: int = 1,
+                 on_result: Optional[Callable[[FrameResult], None]] = None):
+        self.capture = capture
+        self.detect = detect
+        self.annotate = annotate
+        self.encode = encode
+        self.period = period
+        self.on_result = on_result
+
+        self.queues = {
+            "inference": DropOldestQueue(queue_size),
+            "annotate": DropOldestQueue(queue_size),
+            "encode": DropOldestQueue(queue_size),
+        }
+        self.stats = {name: StageStats() for name in self.STAGES}
+        self.latest: Optional[FrameResult] = None
+
+        self._executors = {}
+        self._tasks = []
+        self._frame_id = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    def start(self):
+        if self.running:
+            return
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pipeline-{name}")
+            for name in self.STAGES
+        }
+        self._tasks = [
+            asyncio.create_task(self._capture_loop()),
+            asyncio.create_task(self._inference_loop()),
+            asyncio.create_task(self._annotate_loop()),
+            asyncio.create_task(self._encode_loop()),
+        ]
+        logging.info("Frame pipeline started")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors = {}
+        logging.info("Frame pipeline stopped")
+
+    def metrics(self):
+        return {
+            "stages": {name: stats.as_dict() for name, stats in self.stats.items()},
+            "dropped": {name: queue.dropped for name, queue in self.queues.items()},
+            "latency_ms": self.latest.latency * 1000 if self.latest else None,
+        }
+
+    async def _run(self, stage, fn, *args):
+        start = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self._executors[stage], fn, *args)
+        self.stats[stage].record(time.perf_counter() - start)
+        return result
+
+    async def _capture_loop(self):
+        while True:
+            started = time.perf_counter()
+            try:
+                frame = await self._run("capture", self.capture)
+            except Exception:
+                logging.exception("Frame capture failed")
+                frame = None
+            if frame is not None:
+                self._frame_id += 1
+                self.queues["inference"].put(FrameResult(self._frame_id, time.time(), frame))
+            # Keep a steady capture rate regardless of downstream speed
+            await asyncio.sleep(max(0.0, self.period - (time.perf_counter() - started)))
+
+    async def _inference_loop(self):
+        while True:
+            result = await self.queues["inference"].get()
+            try:
+                result.detected_objects = await self._run("inference", self.detect, result.image)
+            except Exception:
+                logging.exception(f"Inference failed for frame {result.frame_id}")
+                continue
+            self.queues["annotate"].put(result)
+
+    async def _annotate_loop(self):
+        while True:
+            result = await self.queues["annotate"].get()
+            if self.annotate is None:
+                # Frames stay clean; overlays are drawn later, per consumer
+                self.queues["encode"].put(result)
+                continue
+            try:
+                result.image = await self._run("annotate", self.annotate, result.image, result.detected_objects)
+            except Exception:
+                logging.exception(f"Annotation failed for frame {result.frame_id}")
+                continue
+            self.queues["encode"].put(result)
+
+    async def _encode_loop(self):
+        while True:
+            result = await self.queues["encode"].get()
+            try:
+                result.encoded = await self._run("encode", self.encode, result.image)
+            except Exception:
+                logging.exception(f"Encoding failed for frame {result.frame_id}")
+                continue
+            result.latency = time.time() - result.timestamp
+            self.latest = result
+            if self.on_result:
+                self.on_result(result)
@@ -0,0 +1,263 @@
+import datetime
+import decimal
+import re
+import time
+from collections import OrderedDict
+
+from db import run_query
+
+READ_ONLY = re.compile(r"^\s*(select|with|show|describe|desc|explain)\b", re.IGNORECASE)
+# Statements that are not a result set, so they cannot go in FROM ( ... )
+NOT_WRAPPABLE = re.compile(r"^\s*(show|describe|desc|explain)\b", re.IGNORECASE)
+DUPLICATE_COLUMN = 1060  # MySQL ER_DUP_FIELDNAME: a SELECT whose column names repeat cannot be a subquery
+ORDER_BY = re.compile(r"\border\s+by\b", re.IGNORECASE)
+LIMIT = re.compile(r"\blimit\b", re.IGNORECASE)
+NUMERIC = (int, float, decimal.Decimal)
+TEMPORAL = (datetime.date, datetime.datetime, datetime.time, datetime.timedelta)
+
+
+def is_read_only(sql):
+    return bool(READ_ONLY.match(sql))
+
+
+def normalize(sql):
+    """Cache key form of a statement (whitespace collapsed)."""
+    return " ".join(sql.split())
+
+
+def format_value(value, max_cell=80):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, TEMPORAL):
+        return value.isoformat() if hasattr(value, "isoformat") else str(value)
+    text = str(value).replace("\n", " ").replace("|", "/")
+    if len(text) > max_cell:
+        return f"{text[:max_cell]}...({len(text)} chars)"
+    return text
+
+
+def error_code(error):
+    """MySQL error number of a driver exception (singlestoredb sets errno, PyMySQL args[0]), or None."""
+    code = getattr(error, "errno", None)
+    if code is None and error.args and isinstance(error.args[0], int):
+        code = error.args[0]
+    return code
+
+
+def top_level(sql):
+    """`sql` with quoted text and everything inside parentheses blanked out, to find top-level clauses."""
+    out, depth, quote = [], 0, None
+    for ch in sql:
+        if quote:
+            quote = None if ch == quote else quote
+            out.append(" ")
+        elif ch in "'\"`":
+            quote = ch
+            out.append(" ")
+        else:
+            depth += (ch == "(") - (ch == ")")
+            out.append(ch if depth == 0 and ch != ")" else " ")
+    return "".join(out)
+
+
+def page_query(sql, offset, limit):
+    """
+    The statement for one page (plus one row, to tell whether there is more). A derived
+    table is unordered, so a query ending in ORDER BY gets LIMIT/OFFSET appended instead of
+    being wrapped; wrapping would let the database return its rows in any order.
+    """
+    if ORDER_BY.search(top_level(sql)):
+        return f"{sql} LIMIT {limit + 1} OFFSET {offset}"
+    return f"SELECT * FROM ({sql}) AS q LIMIT {limit + 1} OFFSET {offset}"
+
+
+def pageable(sql):
+    """
+    Whether fetch_page can run `sql`: it must be a result set that can go in a subquery, and
+    an ordered one must not have its own LIMIT (ordered rows cannot be re-paged in a
+    derived table, so those are streamed as they are).
+    """
+    if NOT_WRAPPABLE.match(sql):
+        return False
+    clauses = top_level(sql)
+    return not (ORDER_BY.search(clauses) and LIMIT.search(clauses))
+
+
+def _quote(column):
+    return "`" + column.replace("`", "``") + "`"
+
+
+def fetch_page(conn, sql, offset, limit):
+    """
+    One page of a read-only query, with LIMIT/OFFSET applied by the database. For results
+    larger than the page, a second query gets the total count and per-column min/max/avg.
+    Returns (columns, rows, total, summary).
+    """
+    columns, rows = run_query(conn, page_query(sql, offset, limit))
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not more and offset == 0:
+        return columns, rows, len(rows), {}
+
+    # Only columns whose values on this page are numbers or dates get aggregates
+    aggregated = []
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows if row[i] is not None]
+        if values and all(isinstance(v, NUMERIC) and not isinstance(v, bool) for v in values):
+            aggregated.append((column, True))
+        elif values and all(isinstance(v, TEMPORAL) for v in values):
+            aggregated.append((column, False))
+    selects = ["COUNT(*)"]
+    for column, numeric in aggregated:
+        selects += [f"MIN({_quote(column)})", f"MAX({_quote(column)})"]
+        if numeric:
+            selects.append(f"AVG({_quote(column)})")
+    _, (stats,) = run_query(conn, f"SELECT {', '.join(selects)} FROM ({sql}) AS q")
+
+    total, summary, i = stats[0], {}, 1
+    for column, numeric in aggregated:
+        summary[column] = {"min": stats[i], "max": stats[i + 1]}
+        i += 2
+        if numeric:
+            summary[column]["mean"] = stats[i]
+            i += 1
+    return columns, rows, total, summary
+
+
+def fetch_streamed(conn, sql, offset, limit, max_scan):
+    """
+    Fallback for statements that cannot be wrapped in a subquery (SHOW, DESCRIBE, duplicate
+    column names, ...): read the page with fetchmany and count the rest up to `max_scan`.
+    On an unbuffered connection (see QueryLayer's stream_pool) only the page is held in
+    memory; when counting stops early the driver still reads off, without keeping, the rest
+    as the cursor closes. Returns (columns, rows, total, summary); total is None when
+    counting stopped early.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        if cursor.description is None:
+            conn.commit()
+            return [], [], cursor.rowcount, {}
+        columns = [column[0] for column in cursor.description]
+        seen = 0
+        while seen < offset:
+            chunk = cursor.fetchmany(min(10000, offset - seen))
+            if not chunk:
+                break
+            seen += len(chunk)
+        rows = cursor.fetchmany(limit) if seen >= offset else []
+        total = seen + len(rows)
+        while len(rows) == limit:
+            chunk = cursor.fetchmany(10000)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total >= max_scan:
+                return columns, rows, None, {}
+        return columns, rows, total, {}
+
+
+def render(columns, rows, total, summary, offset, limit, max_cell=80):
+    """Rows as a compact pipe-separated table, with the range shown, how to page, and summaries."""
+    if not columns:
+        return f"OK, {total} rows affected."
+    if not rows:
+        return f"No rows{f' at offset {offset}' if offset else ''} (total {total if total is not None else 'unknown'})."
+
+    of = f"{total}" if total is not None else "more than shown"
+    lines = [f"Rows {offset + 1}-{offset + len(rows)} of {of}."]
+    if total is None or offset + len(rows) < total:
+        lines[0] += f" Call again with offset={offset + len(rows)} for more, or narrow the query."
+    lines.append(" | ".join(columns))
+    lines += [" | ".join(format_value(v, max_cell) for v in row) for row in rows]
+    if summary:
+        lines.append("Summary over all rows:")
+        for column, stats in summary.items():
+            lines.append(f"  {column}: " + ", ".join(f"{k} {format_value(v, max_cell)}" for k, v in stats.items()))
+    return "\n".join(lines)
+
+
+class QueryLayer:
+    """
+    Runs SQL for the agent's execute_sql tool with bounded, compact output.
+
+    Reads return one page (`limit` rows, default `default_limit`, at most `max_limit`)
+    rendered as a small table with the total row count, plus per-column summaries when the
+    result is larger than the page. Repeated reads are served from an LRU cache keyed on
+    the statement, the page and the data version, which `bump` advances (hook it to the
+    batch writer's on_flush) and write statements advance themselves. `ttl` bounds how long
+    a cached page can miss writes made outside this process.
+
+    Statements that cannot be paged by the database are read with fetch_streamed on
+    `stream_pool`, whose connections should not buffer results (singlestoredb:
+    connect(buffered=False)); without one they use `pool`.
+    """
+
+    def __init__(self, pool, default_limit=50, max_limit=200, max_scan=100_000, max_cell=80,
+                 cache_size=128, ttl=30.0, stream_pool=None):
+        self.pool = pool
+        self.stream_pool = stream_pool or pool
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.max_scan = max_scan
+        self.max_cell = max_cell
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.version = 0
+        self._cache = OrderedDict()  # (sql, offset, limit, version) -> (text, time)
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def bump(self, *_):
+        """Mark cached results stale; accepts and ignores the table name passed by on_flush."""
+        self.version += 1
+
+    async def _fetch(self, sql, offset, limit):
+        if pageable(sql):
+            try:
+                return await self.pool.run(fetch_page, sql, offset, limit)
+            except Exception as e:
+                # Any other error is the query's own and is reported as is, without running it again
+                if error_code(e) != DUPLICATE_COLUMN:
+                    raise
+        return await self.stream_pool.run(fetch_streamed, sql, offset, limit, self.max_scan)
+
+    async def execute(self, sql, offset=0, limit=None):
+        sql = sql.strip().rstrip(";").strip()
+        offset = max(0, int(offset or 0))
+        limit = min(self.max_limit, max(1, int(limit or self.default_limit)))
+
+        if not is_read_only(sql):
+            await self.pool.query(sql)
+            self.writes += 1
+            self.bump()
+            return "OK, statement executed."
+
+        key = (normalize(sql), offset, limit, self.version)
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached[0]
+
+        self.misses += 1
+        version = self.version
+        columns, rows, total, summary = await self._fetch(sql, offset, limit)
+        text = render(columns, rows, total, summary, offset, limit, self.max_cell)
+        # A write that landed while we were reading makes this result stale before it is cached
+        if version == self.version:
+            self._cache[key] = (text, time.monotonic())
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return text
+
+    def stats(self):
+        return {"version": self.version, "cached": len(self._cache), "hits": self.hits,
+                "misses": self.misses, "writes": self.writes}
@@ -0,0 +1,397 @@
+import asyncio
+import heapq
+import math
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from spatial import METERS_PER_DEG_LAT, haversine_m
+
+# Radius of influence per hazard type, in meters
+HAZARD_RADIUS_M = {'pole': 15.0, 'tree': 10.0, 'fire': 60.0, 'flood': 80.0}
+# Extra cost multiplier for walking through a hazard's area; Critical hazards are impassable
+SEVERITY_COST = {'Low': 2.0, 'Moderate': 5.0, 'High': 20.0, 'Critical': math.inf}
+# Names the agent and frontend use for hazard types
+HAZARD_ALIASES = {'power': 'pole', 'power line': 'pole'}
+
+
+def hazard_types(names):
+    """Normalize plan_route hazard names ("all", "power", ...) to hazard table types."""
+    if not names or "all" in names:
+        return frozenset(HAZARD_RADIUS_M) if names else frozenset()
+    return frozenset(HAZARD_ALIASES.get(name, name) for name in names if HAZARD_ALIASES.get(name, name) in HAZARD_RADIUS_M)
+
+
+class CostGrid:
+    """
+    Weighted raster over a lat/lng box. Each cell stores the summed penalty of the hazards
+    covering it and how many impassable hazards cover it, so hazards can be added and
+    removed incrementally.
+    """
+
+    def __init__(self, min_lat, min_lng, max_lat, max_lng, cell_m):
+        self.min_lat, self.min_lng = min_lat, min_lng
+        self.max_lat, self.max_lng = max_lat, max_lng
+        self.cell_m = cell_m
+        self.dlat = cell_m / METERS_PER_DEG_LAT
+        self.dlng = cell_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians((min_lat + max_lat) / 2)), 1e-6))
+        self.rows = max(1, math.ceil((max_lat - min_lat) / self.dlat))
+        self.cols = max(1, math.ceil((max_lng - min_lng) / self.dlng))
+        self.penalty = [0.0] * (self.rows * self.cols)
+        self.blocked = [0] * (self.rows * self.cols)
+        self.hazards = {}  # hazard id -> (cells, cost)
+
+    def contains(self, lat, lng):
+        return self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng
+
+    def index(self, lat, lng):
+        row = min(self.rows - 1, max(0, int((lat - self.min_lat) / self.dlat)))
+        col = min(self.cols - 1, max(0, int((lng - self.min_lng) / self.dlng)))
+        return row * self.cols + col
+
+    def center(self, index):
+        row, col = divmod(index, self.cols)
+        return self.min_lat + (row + 0.5) * self.dlat, self.min_lng + (col + 0.5) * self.dlng
+
+    def add_hazard(self, hazard):
+        """Rasterize a hazard row; returns the indices of the cells whose cost changed."""
+        changed = self.remove_hazard(hazard["id"])
+        radius = HAZARD_RADIUS_M[hazard["type"]]
+        cost = SEVERITY_COST.get(hazard["severity"], SEVERITY_COST['Moderate'])
+        lat, lng = hazard["location_lat"], hazard["location_lng"]
+        row0 = math.floor((lat - radius / METERS_PER_DEG_LAT - self.min_lat) / self.dlat)
+        row1 = math.floor((lat + radius / METERS_PER_DEG_LAT - self.min_lat) / self.dlat)
+        span = radius / self.cell_m * self.dlng
+        col0 = math.floor((lng - span - self.min_lng) / self.dlng)
+        col1 = math.floor((lng + span - self.min_lng) / self.dlng)
+
+        # Local equirectangular distances are accurate enough at hazard scale
+        m_lat = METERS_PER_DEG_LAT
+        m_lng = self.cell_m / self.dlng
+        reach2 = (radius + self.cell_m * 0.71) ** 2  # A cell is covered if any part of it can be within the radius
+        cells = []
+        for row in range(max(0, row0), min(self.rows - 1, row1) + 1):
+            dy = (self.min_lat + (row + 0.5) * self.dlat - lat) * m_lat
+            for col in range(max(0, col0), min(self.cols - 1, col1) + 1):
+                dx = (self.min_lng + (col + 0.5) * self.dlng - lng) * m_lng
+                if dx * dx + dy * dy <= reach2:
+                    cells.append(row * self.cols + col)
+        for index in cells:
+            if cost == math.inf:
+                self.blocked[index] += 1
+            else:
+                self.penalty[index] += cost
+        self.hazards[hazard["id"]] = (cells, cost)
+        return changed | set(cells)
+
+    def remove_hazard(self, hazard_id):
+        cells, cost = self.hazards.pop(hazard_id, ((), 0.0))
+        for index in cells:
+            if cost == math.inf:
+                self.blocked[index] -= 1
+            else:
+                self.penalty[index] -= cost
+        return set(cells)
+
+
+class LPAStar:
+    """
+    Lifelong Planning A* between two cells of a CostGrid (8-connected, octile heuristic).
+
+    The first `search` is an ordinary A*. After that, `update(cells)` marks cells whose cost
+    changed, and the next `search` repairs only the part of the previous search that those
+    changes affect instead of starting over. Per-cell costs are kept in two float arrays
+    (16 bytes per grid cell) for as long as the search is cached.
+
+    Cost increases that miss the current path cannot make another path cheaper, so they
+    are only queued and the path is kept. Other repairs can cascade through much of the old
+    search, so a repair may take at most `repair_budget` times as long as the last fresh
+    search; past that it starts over, which bounds the worst case near planning from scratch.
+    """
+
+    def __init__(self, grid, start, goal, repair_budget=0.25):
+        self.grid = grid
+        self.start, self.goal = start, goal
+        self.repair_budget = repair_budget
+        self.goal_row, self.goal_col = divmod(goal, grid.cols)
+        diagonal = math.sqrt(2)
+        # (row step, col step, flat index step, step length in meters)
+        self.steps = [(dr, dc, dr * grid.cols + dc, grid.cell_m * (diagonal if dr and dc else 1.0))
+                      for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+        self.fresh_seconds = None  # How long the last search from scratch took
+        self.result = None  # (cell path, cost) or None, valid while not dirty
+        self.dirty = True
+        self.searches = 0
+        self.restarts = 0
+        self._reset()
+
+    def _reset(self):
+        cells = self.grid.rows * self.grid.cols
+        self.g = array('d', [math.inf]) * cells  # Cost of the best path found so far
+        self.rhs = array('d', [math.inf]) * cells  # One-step lookahead cost from the neighbors' g
+        self.rhs[self.start] = 0.0
+        self.open = {}  # cell -> its current key; heap entries with another key are stale
+        self.heap = []  # (key, tie-break, cell)
+        self._queue(self.start)
+
+    def _key(self, index):
+        best = min(self.g[index], self.rhs[index])
+        # Octile distance; admissible because every step costs at least its length
+        row, col = divmod(index, self.grid.cols)
+        h_r, h_c = abs(row - self.goal_row), abs(col - self.goal_col)
+        return best + self.grid.cell_m * (h_r + h_c + (math.sqrt(2) - 2) * min(h_r, h_c)), best
+
+    def _neighbors(self, index):
+        rows, cols = self.grid.rows, self.grid.cols
+        row, col = divmod(index, cols)
+        for dr, dc, delta, length in self.steps:
+            if 0 <= row + dr < rows and 0 <= col + dc < cols:
+                yield index + delta, length
+
+    def _cost(self, index, length):
+        """Cost of a step of `length` meters into `index`. The goal is always enterable."""
+        if self.grid.blocked[index] and index != self.goal:
+            return math.inf
+        return length * (1.0 + self.grid.penalty[index])
+
+    def _queue(self, index):
+        if self.g[index] != self.rhs[index]:
+            key, tie = self._key(index)
+            self.open[index] = key, tie
+            heapq.heappush(self.heap, (key, tie, index))
+        else:
+            self.open.pop(index, None)
+
+    def _update(self, index):
+        """Recompute a cell's lookahead cost from its neighbors and requeue it if inconsistent."""
+        if index != self.start:
+            g = self.g
+            self.rhs[index] = min(g[neighbor] + self._cost(index, length) for neighbor, length in self._neighbors(index))
+        self._queue(index)
+
+    def update(self, cells, increased=False):
+        """Tell the search that stepping into `cells` now costs something else (`increased`: only more)."""
+        for index in cells:
+            self._update(index)
+        if not increased or (self.result is not None and not cells.isdisjoint(self.result[0])):
+            self.dirty = True
+
+    def search(self):
+        """Bring the search up to date; returns (cell path, cost), or None if the goal is unreachable."""
+        if not self.dirty:
+            return self.result
+        self.searches += 1
+        started = time.perf_counter()
+        fresh = self.fresh_seconds is None
+        if not self._run(None if fresh else started + self.fresh_seconds * self.repair_budget):
+            self.restarts += 1
+            self._reset()
+            fresh, started = True, time.perf_counter()
+            self._run(None)
+        if fresh:
+            self.fresh_seconds = time.perf_counter() - started
+        self.dirty = False
+        self.result = self._path()
+        return self.result
+
+    def _path(self):
+        g = self.g
+        cost = g[self.goal]
+        if cost == math.inf:
+            return None
+        # Walk back from the goal through whichever neighbor the cost came from
+        path, index = [self.goal], self.goal
+        while index != self.start:
+            index = min(self._neighbors(index), key=lambda n: g[n[0]] + self._cost(index, n[1]))[0]
+            path.append(index)
+        return path[::-1], cost
+
+    def _run(self, deadline):
+        """Expand until the goal is consistent; returns False if stopped at `deadline` (perf_counter) first."""
+        g, rhs, open_, heap = self.g, self.rhs, self.open, self.heap
+        grid = self.grid
+        rows, cols, cell_m = grid.rows, grid.cols, grid.cell_m
+        penalty, blocked = grid.penalty, grid.blocked
+        start, goal, goal_row, goal_col = self.start, self.goal, self.goal_row, self.goal_col
+        steps, inf, octile = self.steps, math.inf, math.sqrt(2) - 2
+        push, pop, clock = heapq.heappush, heapq.heappop, time.perf_counter
+        expanded = 0
+        while True:
+            while heap and open_.get(heap[0][2]) != heap[0][:2]:
+                pop(heap)
+            goal_best = min(g[goal], rhs[goal])
+            if not heap or (heap[0][:2] >= (goal_best, goal_best) and g[goal] == rhs[goal]):
+                return True
+            expanded += 1
+            if deadline is not None and expanded % 256 == 0 and clock() > deadline:
+                return False
+
+            _, _, index = pop(heap)
+            del open_[index]
+            best = rhs[index]
+            if g[index] > best:
+                # Overconsistent: the cell got cheaper, which can only lower its neighbors' lookahead
+                g[index] = best
+                row, col = divmod(index, cols)
+                for dr, dc, delta, length in steps:
+                    r, c = row + dr, col + dc
+                    if r < 0 or r >= rows or c < 0 or c >= cols:
+                        continue
+                    neighbor = index + delta
+                    if neighbor == start or (blocked[neighbor] and neighbor != goal):
+                        continue
+                    cost = best + length * (1.0 + penalty[neighbor])
+                    if cost < rhs[neighbor]:
+                        rhs[neighbor] = cost
+                        neighbor_g = g[neighbor]
+                        if neighbor_g == cost:
+                            open_.pop(neighbor, None)
+                            continue
+                        low = cost if cost < neighbor_g else neighbor_g
+                        h_r, h_c = abs(r - goal_row), abs(c - goal_col)
+                        key = low + cell_m * (h_r + h_c + octile * (h_r if h_r < h_c else h_c))
+                        open_[neighbor] = key, low
+                        push(heap, (key, low, neighbor))
+            else:
+                # Underconsistent: the cell got dearer; re-derive it and everything that leaned on it
+                g[index] = inf
+                self._update(index)
+                for neighbor, _ in self._neighbors(index):
+                    self._update(neighbor)
+
+
+def simplify(path, cols):
+    """Drop cells that continue a straight run, keeping only turning points."""
+    if len(path) < 3:
+        return path
+    kept = [path[0]]
+    for prev, cur, nxt in zip(path, path[1:], path[2:]):
+        (r0, c0), (r1, c1), (r2, c2) = divmod(prev, cols), divmod(cur, cols), divmod(nxt, cols)
+        if (r1 - r0, c1 - c0) != (r2 - r1, c2 - c1):
+            kept.append(cur)
+    kept.append(path[-1])
+    return kept
+
+
+class RoutePlanner:
+    """
+    Hazard-aware route planning over cached cost grids.
+
+    One grid is kept per set of avoided hazard types and reused while both route endpoints
+    fall inside it. Each cached route keeps its LPA* search (keyed by its start and goal
+    cells), so when hazards are added or removed the grids are updated in place and the
+    next request for a route repairs its search around the changed cells.
+
+    Grids and searches are only touched by the planner's own worker thread. Hazard changes
+    from the event loop are queued and applied by that thread before the next plan, and new
+    grids are built from a hazard snapshot taken on the loop, so neither side takes a lock.
+    """
+
+    def __init__(self, hazard_source, cell_m=10.0, margin_m=300.0, max_cells=250000, max_routes=8):
+        self.hazard_source = hazard_source  # (min_lat, min_lng, max_lat, max_lng) -> hazard rows
+        self.cell_m = cell_m
+        self.margin_m = margin_m
+        self.max_cells = max_cells
+        self.max_routes = max_routes
+        self.grids = {}  # frozenset of hazard types -> CostGrid
+        self.routes = OrderedDict()  # (types, start cell, goal cell) -> LPAStar, least recently used first
+        self._changes = deque()  # ("add", hazard row) or ("remove", hazard id), appended on the loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="route-planner")
+
+    def _box(self, points):
+        """Grid bounds around `points` with a margin, and the cell size that fits the cell budget."""
+        lats, lngs = [p[0] for p in points], [p[1] for p in points]
+        span_m = haversine_m(min(lats), min(lngs), max(lats), max(lngs))
+        margin = max(self.margin_m, 0.25 * span_m)
+        dlat = margin / METERS_PER_DEG_LAT
+        dlng = margin / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lats[0])), 1e-6))
+        box = (min(lats) - dlat, min(lngs) - dlng, max(lats) + dlat, max(lngs) + dlng)
+
+        # Coarsen cells if the box would exceed the cell budget
+        height_m = (box[2] - box[0]) * METERS_PER_DEG_LAT
+        width_m = (box[3] - box[1]) * METERS_PER_DEG_LAT * math.cos(math.radians(lats[0]))
+        return box, max(self.cell_m, math.sqrt(height_m * width_m / self.max_cells))
+
+    @staticmethod
+    def _covers(grid, start, goal):
+        return grid is not None and grid.contains(*start) and grid.contains(*goal)
+
+    def _build_grid(self, types, box, cell_m, hazards):
+        grid = CostGrid(*box, cell_m)
+        for hazard in hazards:
+            grid.add_hazard(hazard)
+        self.grids[types] = grid
+        # Searches index cells of the old grid
+        for key in [key for key in self.routes if key[0] == types]:
+            del self.routes[key]
+        return grid
+
+    def _apply_changes(self):
+        while self._changes:
+            action, value = self._changes.popleft()
+            for types, grid in self.grids.items():
+                if action == "add" and value["type"] in types:
+                    # A hazard not seen before only adds cost; a changed one may also free cells
+                    increased = value["id"] not in grid.hazards
+                    changed = grid.add_hazard(value)
+                else:
+                    increased = False
+                    changed = grid.remove_hazard(value if action == "remove" else value["id"])
+                if changed:
+                    for key, search in self.routes.items():
+                        if key[0] == types:
+                            search.update(changed, increased)
+
+    async def plan(self, start, goal, avoid):
+        """Plan from start to goal ((lat, lng) tuples) avoiding the given hazard names."""
+        started = time.perf_counter()
+        types = hazard_types(avoid)
+        build = None
+        grid = self.grids.get(types)
+        if not self._covers(grid, start, goal):
+            points = [start, goal]
+            if grid is not None:
+                # Grow to cover the old area too, so earlier routes stay valid
+                points += [(grid.min_lat, grid.min_lng), (grid.max_lat, grid.max_lng)]
+            box, cell_m = self._box(points)
+            build = (box, cell_m, [h for h in self.hazard_source(*box) if h["type"] in types])
+        waypoints, distance = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._plan, start, goal, types, build)
+        return {
+            "waypoints": [{"lat": lat, "lng": lng} for lat, lng in waypoints],
+            "distance_m": distance,
+            "found": bool(waypoints),
+            "elapsed_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    def _plan(self, start, goal, types, build):
+        # Runs on the planner thread. The grid is built before queued changes are applied, so
+        # changes made after the snapshot was taken are not lost
+        grid = self.grids.get(types)
+        if not self._covers(grid, start, goal):
+            grid = self._build_grid(types, *build)
+        self._apply_changes()
+
+        key = (types, grid.index(*start), grid.index(*goal))
+        search = self.routes.get(key)
+        if search is None:
+            search = self.routes[key] = LPAStar(grid, key[1], key[2])
+            while len(self.routes) > self.max_routes:
+                self.routes.popitem(last=False)
+        else:
+            self.routes.move_to_end(key)
+        found = search.search()
+        if found is None:
+            return [], None
+        # Searches are shared by every request in the same cells; the endpoints are this request's own
+        path, _ = found
+        waypoints = [start] + [grid.center(i) for i in simplify(path, grid.cols)[1:-1]] + [goal]
+        return waypoints, sum(haversine_m(*a, *b) for a, b in zip(waypoints, waypoints[1:]))
+
+    def add_hazard(self, hazard):
+        """Queue a new or changed hazard row; cheap enough to call from the event loop."""
+        self._changes.append(("add", hazard))
+
+    def remove_hazard(self, hazard_id):
+        self._changes.append(("remove", hazard_id))
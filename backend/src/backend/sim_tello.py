@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class _FrameRead:
+    """Stand-in for djitellopy's BackgroundFrameRead: `.frame` is the newest RGB frame."""
+
+    def __init__(self, drone):
+        self.drone = drone
+        self.stopped = False
+
+    @property
+    def frame(self):
+        return self.drone.render()
+
+    def stop(self):
+        self.stopped = True
+
+
+class SimulatedTello:
+    """
+    In-process stand-in for djitellopy.Tello, for running the fleet without hardware.
+
+    Implements the calls the backend uses. Moves update a simple kinematic state; RC
+    velocities are integrated over wall-clock time; each call sleeps `command_delay` to
+    mimic the radio round trip. Frames are synthetic 960x720 RGB images that change with
+    the drone's pose, rendered at most `fps` times per second.
+    """
+
+    def __init__(self, host="sim", command_delay=0.02, fps=30, battery_drain=0.01, size=(960, 720),
+                 command_log=1000):
+        self.host = host
+        self.command_delay = command_delay
+        self.fps = fps
+        self.battery_drain = battery_drain  # Percent per second while flying
+        self.size = size
+        self.connected = False
+        self.stream_on = False
+        self.is_flying = False
+        self.x = self.y = self.z = 0.0  # cm
+        self.yaw = 0.0  # degrees
+        self.rc = (0, 0, 0, 0)
+        self.battery = 100.0
+        self.commands = deque(maxlen=command_log)  # Newest (time, command, *args), for tests
+        self._lock = threading.Lock()
+        self._last_update = time.monotonic()
+        self._frame = None
+        self._frame_at = 0.0
+        self._frame_read = None
+
+    def _command(self, name, *args):
+        time.sleep(self.command_delay)
+        with self._lock:
+            self._integrate()
+            self.commands.append((time.monotonic(), name) + args)
+
+    def _integrate(self):
+        now = time.monotonic()
+        dt, self._last_update = now - self._last_update, now
+        if not self.is_flying:
+            return
+        lr, fb, ud, yaw = self.rc
+        heading = math.radians(self.yaw)
+        self.x += (fb * math.cos(heading) - lr * math.sin(heading)) * dt
+        self.y += (fb * math.sin(heading) + lr * math.cos(heading)) * dt
+        self.z = max(0.0, self.z + ud * dt)
+        self.yaw = (self.yaw + yaw * dt) % 360
+        self.battery = max(0.0, self.battery - self.battery_drain * dt)
+
+    def _move(self, forward=0, right=0, up=0):
+        heading = math.radians(self.yaw)
+        self.x += forward * math.cos(heading) - right * math.sin(heading)
+        self.y += forward * math.sin(heading) + right * math.cos(heading)
+        self.z = max(0.0, self.z + up)
+
+    # Connection and stream
+    def connect(self):
+        self._command("command")
+        self.connected = True
+
+    def streamon(self):
+        self._command("streamon")
+        self.stream_on = True
+
+    def streamoff(self):
+        self._command("streamoff")
+        self.stream_on = False
+
+    def end(self):
+        if self.is_flying:
+            self.land()
+        self.connected = False
+        self.stream_on = False
+
+    def get_frame_read(self):
+        if self._frame_read is None:
+            self._frame_read = _FrameRead(self)
+        return self._frame_read
+
+    # Flight
+    def takeoff(self):
+        self._command("takeoff")
+        self.is_flying = True
+        self.z = 80.0
+
+    def land(self):
+        self._command("land")
+        self.is_flying = False
+        self.rc = (0, 0, 0, 0)
+        self.z = 0.0
+
+    def send_rc_control(self, left_right, forward_backward, up_down, yaw):
+        self._command("rc", left_right, forward_backward, up_down, yaw)
+        clamp = lambda v: max(-100, min(100, int(v)))
+        self.rc = (clamp(left_right), clamp(forward_backward), clamp(up_down), clamp(yaw))
+
+    def move_forward(self, x):
+        self._command("forward", x)
+        self._move(forward=x)
+
+    def move_back(self, x):
+        self._command("back", x)
+        self._move(forward=-x)
+
+    def move_left(self, x):
+        self._command("left", x)
+        self._move(right=-x)
+
+    def move_right(self, x):
+        self._command("right", x)
+        self._move(right=x)
+
+    def move_up(self, x):
+        self._command("up", x)
+        self._move(up=x)
+
+    def move_down(self, x):
+        self._command("down", x)
+        self._move(up=-x)
+
+    def rotate_clockwise(self, x):
+        self._command("cw", x)
+        self.yaw = (self.yaw + x) % 360
+
+    def rotate_counter_clockwise(self, x):
+        self._command("ccw", x)
+        self.yaw = (self.yaw - x) % 360
+
+    # State, shaped like the Tello state packet
+    def get_current_state(self):
+        with self._lock:
+            self._integrate()
+            lr, fb, ud, _ = self.rc
+            return {
+                "pitch": 0, "roll": 0, "yaw": int((self.yaw + 180) % 360 - 180),
+                "vgx": fb, "vgy": lr, "vgz": -ud,
+                "templ": 60, "temph": 62, "tof": int(self.z) + 10, "h": int(self.z),
+                "bat": int(self.battery), "baro": round(self.z / 100, 2), "time": 0,
+                "agx": 0.0, "agy": 0.0, "agz": -1000.0,
+            }
+
+    def get_battery(self):
+        return self.get_current_state()["bat"]
+
+    def get_height(self):
+        return self.get_current_state()["h"]
+
+    def render(self):
+        """Synthetic RGB frame: a pose-dependent gradient with a moving target and an overlay of the pose."""
+        now = time.monotonic()
+        if self._frame is not None and now - self._frame_at < 1.0 / self.fps:
+            return self._frame
+        width, height = self.size
+        shift = int(self.x + self.yaw * 4) % width
+        gradient = np.roll(np.linspace(0, 255, width, dtype=np.uint8), shift)
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = gradient[None, :, None]
+        frame[..., 1] = 255 - frame[..., 1]
+        cx = int(width / 2 + 200 * math.sin(now))
+        cv2.rectangle(frame, (cx - 40, 300), (cx + 40, 520), (200, 30, 30), -1)
+        cv2.putText(frame, f"{self.host} x={self.x:.0f} y={self.y:.0f} z={self.z:.0f} yaw={self.yaw:.0f}",
+                    (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
+        self._frame, self._frame_at = frame, now
+        return frame
@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import logging
+import math
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEG_LAT = 111320.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Point index over a uniform lat/lng grid (geohash-style bucketing).
+
+    Each item lives in exactly one cell, so inserts and removals are O(1) and queries only
+    visit the cells that overlap the query area.
+    """
+
+    def __init__(self, cell_deg=0.005):  # ~550 m cells at the equator
+        self.cell_deg = cell_deg
+        self.cells = {}  # (row, col) -> {id: (lat, lng, payload)}
+        self.items = {}  # id -> (lat, lng, payload, cell)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def insert(self, item_id, lat, lng, payload=None):
+        self.remove(item_id)
+        cell = self._cell(lat, lng)
+        self.cells.setdefault(cell, {})[item_id] = (lat, lng, payload)
+        self.items[item_id] = (lat, lng, payload, cell)
+
+    def remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return
+        bucket = self.cells[item[3]]
+        del bucket[item_id]
+        if not bucket:
+            del self.cells[item[3]]
+
+    def within_box(self, min_lat, min_lng, max_lat, max_lng):
+        """Items inside the box, as (id, lat, lng, payload)."""
+        row0, col0 = self._cell(min_lat, min_lng)
+        row1, col1 = self._cell(max_lat, max_lng)
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self.cells):
+            # Box covers more cells than are occupied; walking the occupied ones is cheaper
+            cells = [c for c in self.cells if row0 <= c[0] <= row1 and col0 <= c[1] <= col1]
+        else:
+            cells = [(r, c) for r in range(row0, row1 + 1) for c in range(col0, col1 + 1)]
+
+        found = []
+        for cell in cells:
+            for item_id, (lat, lng, payload) in self.cells.get(cell, {}).items():
+                if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                    found.append((item_id, lat, lng, payload))
+        return found
+
+    def within_radius(self, lat, lng, radius_m):
+        """Items within `radius_m` meters, nearest first, as (distance_m, id, lat, lng, payload)."""
+        dlat = radius_m / METERS_PER_DEG_LAT
+        dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        found = []
+        for item_id, ilat, ilng, payload in self.within_box(lat - dlat, lng - dlng, lat + dlat, lng + dlng):
+            distance = haversine_m(lat, lng, ilat, ilng)
+            if distance <= radius_m:
+                found.append((distance, item_id, ilat, ilng, payload))
+        found.sort(key=lambda f: f[0])
+        return found
+
+    @staticmethod
+    def _ring(row, col, ring):
+        """Cells at Chebyshev distance `ring` from (row, col)."""
+        if ring == 0:
+            yield row, col
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield row - ring, c
+            yield row + ring, c
+        for r in range(row - ring + 1, row + ring):
+            yield r, col - ring
+            yield r, col + ring
+
+    def nearest(self, lat, lng, k=1, max_radius_m=None):
+        """The k nearest items (optionally within `max_radius_m`), as (distance_m, id, lat, lng, payload)."""
+        if not self.items or k <= 0:
+            return []
+        row, col = self._cell(lat, lng)
+        rows = [c[0] for c in self.cells]
+        cols = [c[1] for c in self.cells]
+        min_row, max_row, min_col, max_col = min(rows), max(rows), min(cols), max(cols)
+        # Rings closer than the occupied bounding box are empty, so start at its edge
+        first_ring = max(0, min_row - row, row - max_row, min_col - col, col - max_col)
+        last_ring = max(row - min_row, max_row - row, col - min_col, max_col - col)
+        # Smallest possible distance per ring step; longitude cells shrink away from the equator
+        step_m = self.cell_deg * METERS_PER_DEG_LAT * min(1.0, math.cos(math.radians(lat)))
+
+        candidates = []
+        visited = 0
+        for ring in range(first_ring, last_ring + 1):
+            visited += max(1, 8 * ring)
+            if visited > 2 * len(self.cells):
+                # Walking rings now costs more than scanning every item
+                candidates = [(haversine_m(lat, lng, ilat, ilng), item_id, ilat, ilng, payload)
+                              for item_id, (ilat, ilng, payload, _) in self.items.items()]
+                break
+            for cell in self._ring(row, col, ring):
+                for item_id, (ilat, ilng, payload) in self.cells.get(cell, {}).items():
+                    candidates.append((haversine_m(lat, lng, ilat, ilng), item_id, ilat, ilng, payload))
+            # Anything in the next ring is at least `ring * step_m` away
+            if len(candidates) >= k and heapq.nsmallest(k, candidates, key=lambda f: f[0])[-1][0] <= ring * step_m:
+                break
+            if max_radius_m is not None and ring * step_m > max_radius_m:
+                break
+
+        found = heapq.nsmallest(k, candidates, key=lambda f: f[0])
+        if max_radius_m is not None:
+            found = [f for f in found if f[0] <= max_radius_m]
+        return found
+
+
+class SpatialIndex:
+    """
+    Grid indexes over the `hazards` and `persons` tables, shared by REST endpoints and agent tools.
+
+    `refresh` loads rows newer than the last one it read, so it is cheap to call after writes
+    or on a timer to pick up rows inserted by other clients. Only `refresh` moves that cursor:
+    a row indexed locally with `insert` may have a higher id than rows other writers have
+    committed but `refresh` has not read yet.
+    """
+
+    QUERIES = {
+        "hazards": "SELECT id, location_lat, location_lng, type, severity, details, created_at FROM hazards WHERE id > %s",
+        "persons": "SELECT id, location_lat, location_lng, timestamp FROM persons WHERE id > %s",
+    }
+
+    def __init__(self, cell_deg=0.005):
+        self.indexes = {kind: GridIndex(cell_deg) for kind in self.QUERIES}
+        self.last_ids = {kind: 0 for kind in self.QUERIES}
+        self._locks = {kind: asyncio.Lock() for kind in self.QUERIES}
+        self.on_insert = []  # Callbacks called with (kind, row) for every indexed row
+
+    def __getitem__(self, kind):
+        return self.indexes[kind]
+
+    def insert(self, kind, row):
+        """Index one row (a column -> value dict with id, location_lat and location_lng)."""
+        if row.get("location_lat") is None or row.get("location_lng") is None:
+            return
+        payload = {k: v for k, v in row.items() if k not in ("location_lat", "location_lng")}
+        self.indexes[kind].insert(row["id"], row["location_lat"], row["location_lng"], payload)
+        for callback in self.on_insert:
+            callback(kind, row)
+
+    async def refresh(self, pool, kind=None):
+        for kind in [kind] if kind else self.QUERIES:
+            async with self._locks[kind]:
+                try:
+                    columns, rows = await pool.query(self.QUERIES[kind], (self.last_ids[kind],))
+                except Exception:
+                    logging.exception(f"Failed to refresh spatial index for {kind}")
+                    continue
+                for row in rows:
+                    row = dict(zip(columns, row))
+                    # Rows without a location are skipped, but still count as read so they are not fetched again
+                    self.last_ids[kind] = max(self.last_ids[kind], row["id"])
+                    if row["id"] not in self.indexes[kind].items:  # Else already indexed by a local insert
+                        self.insert(kind, row)
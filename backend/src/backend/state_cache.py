@@ -0,0 +1,68 @@
+import asyncio
+from collections import deque
+
+
+class LatestStateCache:
+    """
+    In-memory view of the newest drone status per drone and the most recent persons.
+
+    Drone status is written straight from the ingest path. Person rows only get their ids
+    once the batch writer has inserted them, so the persons ring buffer is marked stale after
+    each flush and re-read from the database once, on the next request. Every change bumps a
+    per-resource version that doubles as a weak ETag.
+    """
+
+    def __init__(self, persons_size=10):
+        self.drone_status = {}  # name -> API-shaped status dict
+        self.latest_drone = None
+        self.persons = deque(maxlen=persons_size)
+        self.versions = {"drone_status": 0, "persons": 0}
+        self._stale = {"drone_status": True, "persons": True}
+        self._locks = {"drone_status": asyncio.Lock(), "persons": asyncio.Lock()}
+
+    def etag(self, resource):
+        return f'W/"{resource}-{self.versions[resource]}"'
+
+    def update_drone_status(self, row):
+        """Record a drone_status row (as passed to the batch writer) as the drone's latest state."""
+        self.drone_status[row["name"]] = {
+            "name": row["name"],
+            "isConnected": row["is_connected"],
+            "batteryLevel": row["battery_level"],
+            "location": {"lat": row["location_lat"], "lng": row["location_lng"]},
+            "timestamp": row["timestamp"]
+        }
+        self.latest_drone = row["name"]
+        self._stale["drone_status"] = False
+        self.versions["drone_status"] += 1
+
+    def invalidate(self, resource):
+        self._stale[resource] = True
+
+    async def get_drone_status(self, loader, name=None):
+        """Latest status of `name` (or the most recently updated drone); `loader` is only awaited on a cold cache."""
+        if self._stale["drone_status"] and not self.drone_status:
+            async with self._locks["drone_status"]:
+                if not self.drone_status:
+                    for row in await loader():
+                        self.update_drone_status(row)
+                self._stale["drone_status"] = False
+        return self.drone_status.get(name or self.latest_drone)
+
+    async def get_persons(self, loader):
+        """Most recent persons, newest first; `loader` re-reads them after new rows were written."""
+        if self._stale["persons"]:
+            async with self._locks["persons"]:
+                if self._stale["persons"]:
+                    # Cleared before loading so a flush during the load marks it stale again
+                    self._stale["persons"] = False
+                    try:
+                        persons = await loader()
+                    except BaseException:
+                        self._stale["persons"] = True
+                        raise
+                    if list(self.persons) != persons:
+                        self.persons.clear()
+                        self.persons.extend(persons)
+                        self.versions["persons"] += 1
+        return list(self.persons)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# How far a value must move before a drone_status row is worth writing or publishing
+DEFAULT_DELTAS = {
+    "is_connected": 0,  # Any change
+    "battery_level": 2,  # Percent
+    "location_lat": 1e-5,  # About a metre
+    "location_lng": 1e-5,
+}
+
+
+@dataclass(frozen=True)
+class TelemetrySnapshot:
+    version: int  # Increases whenever a tracked value changes
+    timestamp: float  # time.time() of the read that produced this version
+    connected: bool
+    battery_level: int
+    height: int  # cm
+    yaw: int  # degrees
+    state: Dict[str, Any] = field(default_factory=dict)  # The full Tello state packet
+
+    @classmethod
+    def from_state(cls, state, connected, version=0, timestamp=None):
+        return cls(version=version, timestamp=timestamp or time.time(), connected=connected,
+                   battery_level=int(state.get("bat", 0)), height=int(state.get("h", 0)),
+                   yaw=int(state.get("yaw", 0)), state=dict(state))
+
+    def key(self):
+        return (self.connected, self.battery_level, self.height, self.yaw)
+
+
+class DeltaFilter:
+    """
+    Decides which status updates are worth persisting or publishing: the first one for a
+    key, any whose watched values moved by at least their delta since the last one let
+    through, and at least one every `heartbeat` seconds so readers can tell it is alive.
+    """
+
+    def __init__(self, deltas=None, heartbeat=30.0):
+        self.deltas = DEFAULT_DELTAS if deltas is None else deltas
+        self.heartbeat = heartbeat
+        self._last = {}  # key -> (row, time let through)
+        self.passed = 0
+        self.suppressed = 0
+
+    def changed(self, previous, row):
+        for name, delta in self.deltas.items():
+            old, new = previous.get(name), row.get(name)
+            if old is None or new is None or isinstance(new, bool) or not delta:
+                if old != new:
+                    return True
+            elif abs(new - old) >= delta:
+                return True
+        return False
+
+    def should_emit(self, key, row, now=None):
+        now = time.monotonic() if now is None else now
+        last = self._last.get(key)
+        if last is None or now - last[1] >= self.heartbeat or self.changed(last[0], row):
+            self._last[key] = (dict(row), now)
+            self.passed += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def stats(self):
+        return {"passed": self.passed, "suppressed": self.suppressed, "heartbeat_s": self.heartbeat}
+
+
+class TelemetryFeed:
+    """
+    One drone's telemetry, read once per `period` into a shared, immutable snapshot.
+
+    Everyone reads `snapshot` (or `latest()`) from memory instead of querying the drone per
+    frame. The version only moves when a tracked value (connection, battery, height, yaw)
+    changes, so consumers can skip work by comparing versions, and `on_change` callbacks
+    run once per new version.
+    """
+
+    def __init__(self, read_state, connected=lambda: True, period=0.5):
+        self.read_state = read_state  # () -> Tello state dict, e.g. tello.get_current_state
+        self.connected = connected
+        self.period = period
+        self.snapshot: Optional[TelemetrySnapshot] = None
+        self.read_at = 0.0  # time.monotonic() of the last read, changed or not
+        self.reads = 0
+        self.on_change = []  # Callbacks taking the new snapshot
+
+    def poll(self):
+        """Read the drone's state now; returns the current snapshot."""
+        state = self.read_state()
+        self.reads += 1
+        self.read_at = time.monotonic()
+        previous = self.snapshot
+        version = previous.version if previous else 0
+        snapshot = TelemetrySnapshot.from_state(state, bool(self.connected()), version + 1)
+        if previous is not None and snapshot.key() == previous.key():
+            return previous
+        self.snapshot = snapshot
+        for callback in self.on_change:
+            try:
+                callback(self.snapshot)
+            except Exception:
+                logging.exception("Telemetry callback failed")
+        return self.snapshot
+
+    def latest(self):
+        """The snapshot, re-reading the drone only if the last read is older than `period`."""
+        if self.snapshot is None or time.monotonic() - self.read_at >= self.period:
+            return self.poll()
+        return self.snapshot
+
+    async def run(self):
+        """Poll every `period` seconds until cancelled."""
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logging.exception("Reading telemetry failed")
+            await asyncio.sleep(self.period)
@@ -0,0 +1,118 @@
+import itertools
+
+
+def iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter == 0.0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+class Track:
+    """A tracked box with an alpha-beta (constant velocity) motion model, in pixels per frame."""
+
+    def __init__(self, track_id, detection, alpha=0.85, beta=0.5):
+        x1, y1, x2, y2, confidence, class_id, model_type = detection
+        self.id = track_id
+        self.box = [x1, y1, x2, y2]
+        self.velocity = [0.0, 0.0, 0.0, 0.0]
+        self.confidence = confidence
+        self.class_id = class_id
+        self.model_type = model_type
+        self.alpha = alpha
+        self.beta = beta
+        self.hits = 1
+        self.misses = 0
+        self.frames_since_update = 0
+
+    def predict(self):
+        self.box = [b + v for b, v in zip(self.box, self.velocity)]
+        self.frames_since_update += 1
+
+    def correct(self, detection):
+        measured = detection[:4]
+        dt = max(self.frames_since_update, 1)
+        residual = [m - p for m, p in zip(measured, self.box)]
+        # With a single previous observation there is no velocity estimate yet, so take it directly
+        beta = 1.0 if self.hits == 1 else self.beta
+        alpha = 1.0 if self.hits == 1 else self.alpha
+        self.velocity = [v + beta * r / dt for v, r in zip(self.velocity, residual)]
+        self.box = [p + alpha * r for p, r in zip(self.box, residual)]
+        self.confidence = detection[4]
+        self.hits += 1
+        self.misses = 0
+        self.frames_since_update = 0
+
+    def as_detection(self):
+        x1, y1, x2, y2 = self.box
+        return (x1, y1, x2, y2, self.confidence, self.class_id, self.model_type)
+
+
+class IoUTracker:
+    """
+    Lightweight multi-object tracker for propagating detections between keyframes.
+
+    `update` associates fresh detections with predicted track boxes by greedy IoU matching
+    (same class and model only); `predict` advances every track one frame along its
+    estimated velocity. Both return detection tuples in the YOLODetector format.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=2, alpha=0.85, beta=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses  # Keyframes a track may go unmatched before it is dropped
+        self.alpha = alpha
+        self.beta = beta
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def predict(self):
+        for track in self.tracks:
+            track.predict()
+        return self.detections()
+
+    def update(self, detections):
+        for track in self.tracks:
+            track.predict()
+
+        candidates = []
+        for t, track in enumerate(self.tracks):
+            for d, detection in enumerate(detections):
+                if detection[5] != track.class_id or detection[6] != track.model_type:
+                    continue
+                overlap = iou(track.box, detection[:4])
+                if overlap >= self.iou_threshold:
+                    candidates.append((overlap, t, d))
+        candidates.sort(reverse=True)
+
+        matched_tracks, matched_detections = set(), set()
+        for _, t, d in candidates:
+            if t in matched_tracks or d in matched_detections:
+                continue
+            self.tracks[t].correct(detections[d])
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                survivors.append(Track(next(self._ids), detection, self.alpha, self.beta))
+        self.tracks = survivors
+        return self.detections()
+
+    def detections(self):
+        # Tracks that missed the latest keyframe are kept for re-association but not drawn
+        return [track.as_detection() for track in self.tracks if track.misses == 0]
+
+    def reset(self):
+        self.tracks = []
@@ -0,0 +1,28 @@
+import json
+import struct
+
+# Binary frame message layout (network byte order):
+#   magic "DF" | version u8 | flags u8 | frame_id u32 | timestamp f64 | metadata length u32
+#   followed by the UTF-8 JSON metadata and then the raw JPEG bytes.
+MAGIC = b"DF"
+VERSION = 1
+HEADER = struct.Struct("!2sBBIdI")
+# Flag bits
+FLAG_ANNOTATED = 0x01  # Boxes are already drawn into the JPEG; otherwise draw them from the metadata
+
+
+def pack_frame(frame_id, timestamp, jpeg, metadata=None, flags=0):
+    """Pack a JPEG frame and its metadata (detections, status, ...) into one binary WebSocket message."""
+    meta = json.dumps(metadata or {}, separators=(",", ":"), default=str).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, flags, frame_id & 0xFFFFFFFF, timestamp, len(meta))
+    return b"".join((header, meta, bytes(jpeg)))
+
+
+def unpack_frame(message):
+    """Inverse of pack_frame. Returns (frame_id, timestamp, metadata, jpeg, flags)."""
+    magic, version, flags, frame_id, timestamp, meta_len = HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a v{VERSION} frame message")
+    meta_end = HEADER.size + meta_len
+    metadata = json.loads(message[HEADER.size:meta_end]) if meta_len else {}
+    return frame_id, timestamp, metadata, message[meta_end:], flags
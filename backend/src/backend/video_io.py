@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+
+from pipeline import StageStats
+
+_END = object()
+
+
+class FrameReader:
+    """
+    Decodes frames from a cv2.VideoCapture on a background thread into a bounded queue.
+
+    Iterating yields every frame in order (nothing is dropped), so results match a plain
+    `cap.read()` loop while decoding overlaps with whatever the consumer does per frame.
+    """
+
+    def __init__(self, cap, queue_size=8):
+        self.cap = cap
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.decode = StageStats()  # Time spent in cap.read()
+        self.wait = StageStats()  # Time the consumer spent waiting for a frame
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self.decode.record(time.perf_counter() - started)
+                self._put(frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            started = time.perf_counter()
+            frame = self.queue.get()
+            self.wait.record(time.perf_counter() - started)
+            if frame is _END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield frame
+
+    def stop(self):
+        """Stop decoding early (e.g. the user quit); safe to call after the stream ended."""
+        self._stop.set()
+        self._thread.join()
+
+
+class FrameWriter:
+    """Encodes frames to a cv2.VideoWriter on a background thread, in submission order."""
+
+    def __init__(self, out, queue_size=8):
+        self.out = out
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.encode = StageStats()  # Time spent in out.write()
+        self.wait = StageStats()  # Time the producer spent blocked on a full queue
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _END:
+                return
+            if self.error is not None:
+                continue  # Keep draining so the producer never blocks forever
+            try:
+                started = time.perf_counter()
+                self.out.write(frame)
+                self.encode.record(time.perf_counter() - started)
+            except Exception as e:
+                self.error = e
+
+    def write(self, frame):
+        if self.error is not None:
+            raise self.error
+        started = time.perf_counter()
+        self.queue.put(frame)
+        self.wait.record(time.perf_counter() - started)
+
+    def close(self):
+        """Flush queued frames and release the underlying writer."""
+        self.queue.put(_END)
+        self._thread.join()
+        self.out.release()
+        if self.error is not None:
+            raise self.error
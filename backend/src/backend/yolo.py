@@ -2,64 +2,150 @@ import cv2
 import torch
 import numpy as np
 import argparse
-from ultralytics import YOLO
-from collections import deque
+from ultralytics.utils import ops
+from tracker import IoUTracker
+from fusion import DetectionFusion
+from overlay import OverlayRenderer
 import logging
 import os
+import time
+from pipeline import StageStats
+from video_io import FrameReader, FrameWriter
+from model_registry import registry, load_yolo
+from inference_server import inference_server
 
 def setup_logging():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def select_device(preferred=None):
+    """Pick the inference device: an explicit choice, else CUDA, else Apple MPS, else CPU."""
+    if preferred:
+        return preferred
+    if torch.cuda.is_available():
+        return 'cuda:0'
+    if getattr(torch.backends, 'mps', None) and torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+def letterbox(frame, imgsz=640, stride=32, pad_value=114):
+    """Resize keeping aspect ratio and pad to a stride multiple, like ultralytics' LetterBox(auto=True)."""
+    h, w = frame.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    pad_w, pad_h = (stride - new_w % stride) % stride, (stride - new_h % stride) % stride
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = pad_h // 2, pad_w // 2
+    return cv2.copyMakeBorder(frame, top, pad_h - top, left, pad_w - left,
+                              cv2.BORDER_CONSTANT, value=(pad_value, pad_value, pad_value))
+
 class YOLODetector:
-    def __init__(self, frame_interval=5):
+    def __init__(self, frame_interval=5, device=None, execution='concurrent', imgsz=640, track=True):
         setup_logging()
         logging.info("Initializing YOLO detector")
         
         self.frame_interval = frame_interval
-        torch.cuda.set_device(0)  # Set to your desired GPU number
-        logging.info(f"Using GPU: {torch.cuda.get_device_name(0)}")
+        self.imgsz = imgsz
+        self.execution = execution
+        self.device = select_device(device)
+        if self.device.startswith('cuda'):
+            torch.cuda.set_device(self.device)
+            logging.info(f"Using GPU: {torch.cuda.get_device_name(self.device)}")
+        else:
+            logging.info(f"Using device: {self.device}")
 
-        # Load the YOLO models
+        # Load the YOLO models, once per device however many detectors a process creates.
+        # Each model gets an inference server thread that batches keyframes from all of them,
+        # and with execution='concurrent' both models' forward passes overlap on a keyframe.
         logging.info("Loading YOLO models")
-        self.model_np = YOLO('yolo11s_NP.pt')
-        self.model_x = YOLO('yolo11x.pt')
+        self.servers = {}
+        for model_type, weights in (('NP', 'yolo11s_NP.pt'), ('X', 'yolo11x.pt')):
+            name = f"{weights}@{self.device}"
+            registry.register(name, lambda weights=weights: load_yolo(weights, self.device))
+            # Letterboxed tensors of different sizes cannot share a forward pass. The server runs the
+            # first detector's _predict_batch, so detectors with another imgsz get their own server.
+            self.servers[model_type] = inference_server(name, variant=f"imgsz={imgsz}", run=self._predict_batch,
+                                                        key=lambda t: tuple(t.shape))
+        self.model_np = registry.get(f"yolo11s_NP.pt@{self.device}")
+        self.model_x = registry.get(f"yolo11x.pt@{self.device}")
         logging.info("YOLO models loaded successfully")
 
+        # Propagates boxes along their motion between keyframes instead of redrawing stale ones
+        self.tracker = IoUTracker() if track else None
+
         self.frame_count = 0
         self.current_detections = []
-        self.detection_history = deque(maxlen=30)  # Assuming 30 FPS, store 1 second of detections
+        # Groups keyframe detections into stable entities; timestamps are frame numbers
+        self.fusion = DetectionFusion(min_hits=2, ttl=6 * frame_interval)
+        self.overlay = OverlayRenderer(filled=True, box_thickness=4)  # Increased thickness to 4
 
-    def process_frame(self, frame):
-        self.frame_count += 1
-        logging.info(f"Processing frame {self.frame_count}")
+    def reset(self, frame_count=0):
+        """Forget tracking state and continue numbering from `frame_count`, e.g. at the start of a new clip."""
+        self.frame_count = frame_count
+        self.current_detections = []
+        if self.tracker:
+            self.tracker.reset()
+        self.fusion = DetectionFusion(min_hits=2, ttl=6 * self.frame_interval)
+
+    def preprocess(self, frame):
+        """Letterbox and convert a BGR frame to a normalized BCHW tensor shared by both models."""
+        img = letterbox(frame, self.imgsz)
+        img = np.ascontiguousarray(img[..., ::-1].transpose(2, 0, 1))  # BGR HWC -> RGB CHW
+        tensor = torch.from_numpy(img).to(self.device).float().div_(255.0)
+        return tensor.unsqueeze(0)
 
-        # Run YOLO detection every self.frame_interval frames
-        if self.frame_count % self.frame_interval == 1:
-            # Run YOLO detection with yolo11s_NP model
-            results_np = self.model_np.predict(source=frame, conf=0.25, iou=0.45, imgsz=640)
-            logging.info(f"YOLO11s_NP detection completed for frame {self.frame_count}")
+    def _predict_batch(self, model, tensors):
+        batch = torch.cat(tensors)
+        return list(model.predict(source=batch, conf=0.25, iou=0.45, imgsz=self.imgsz, device=self.device, verbose=False))
 
-            # Run YOLO detection with yolo11x model
-            results_x = self.model_x.predict(source=frame, conf=0.25, iou=0.45, imgsz=640)
-            logging.info(f"YOLO11x detection completed for frame {self.frame_count}")
+    def detect(self, frame):
+        """Run both models on one frame and return merged detections in frame coordinates."""
+        tensor = self.preprocess(frame)
+        if self.execution == 'concurrent':
+            future_np = self.servers['NP'].submit(tensor)
+            future_x = self.servers['X'].submit(tensor)
+            result_np, result_x = future_np.result(), future_x.result()
+        else:
+            result_np = self.servers['NP'].infer(tensor)
+            result_x = self.servers['X'].infer(tensor)
+        logging.info(f"YOLO11s_NP and YOLO11x detection completed for frame {self.frame_count}")
 
-            # Process results
-            self.current_detections = []
-            for result in results_np[0].boxes.data.tolist():
-                x1, y1, x2, y2, confidence, class_id = result
-                self.current_detections.append((x1, y1, x2, y2, confidence, class_id, 'NP'))
-                self.detection_history.append((x1, y1, x2, y2, confidence, class_id, 'NP'))
+        detections = []
+        for model_type, model, result in (('NP', self.model_np, result_np), ('X', self.model_x, result_x)):
+            data = result.boxes.data
+            if not len(data):
+                continue
+            # Boxes come back in letterboxed tensor coordinates; map them to the original frame
+            data = data.clone()
+            data[:, :4] = ops.scale_boxes(tensor.shape[2:], data[:, :4], frame.shape)
+            for x1, y1, x2, y2, confidence, class_id in data.tolist():
+                if model_type == 'X' and model.names[int(class_id)] != 'person':
+                    continue
+                detections.append((x1, y1, x2, y2, confidence, class_id, model_type))
+        return detections
 
-            for result in results_x[0].boxes.data.tolist():
-                x1, y1, x2, y2, confidence, class_id = result
-                if self.model_x.names[int(class_id)] == 'person':
-                    self.current_detections.append((x1, y1, x2, y2, confidence, class_id, 'X'))
-                    self.detection_history.append((x1, y1, x2, y2, confidence, class_id, 'X'))
+    def label(self, detection):
+        class_id, model_type = detection[5], detection[6]
+        return self.model_np.names[int(class_id)] if model_type == 'NP' else 'person'
 
-            logging.info(f"Found {len(self.current_detections)} detections in frame {self.frame_count}")
+    def process_frame(self, frame):
+        self.frame_count += 1
+        logging.info(f"Processing frame {self.frame_count}")
+
+        # Run YOLO detection every self.frame_interval frames, starting with the first
+        if (self.frame_count - 1) % self.frame_interval == 0:
+            detections = self.detect(frame)
+            for change, entity in self.fusion.update([(self.label(d), d[4], d[:4]) for d in detections], self.frame_count):
+                if change == "new":
+                    logging.info(f"New {entity.class_name} #{entity.id} in frame {self.frame_count}")
+            self.current_detections = self.tracker.update(detections) if self.tracker else detections
+            logging.info(f"Found {len(detections)} detections in frame {self.frame_count}")
+        elif self.tracker:
+            self.current_detections = self.tracker.predict()
 
         # Draw bounding boxes for current detections
         logging.info(f"Drawing bounding boxes for detections in frame {self.frame_count}")
+        boxes = []
         for detection in self.current_detections:
             x1, y1, x2, y2, confidence, class_id, model_type = detection
             if model_type == 'NP':
@@ -69,11 +155,8 @@ class YOLODetector:
                     color = (255, 191, 0)  # Light blue for other NP detections
             else:
                 color = (128, 0, 128)  # Purple for people (X model)
-            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), color, 4)  # Increased thickness to 4
-            label = f'{self.model_np.names[int(class_id)] if model_type == "NP" else "person"}: {confidence:.2f}'
-            label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)
-            cv2.rectangle(frame, (int(x1), int(y1) - label_size[1] - 10), (int(x1) + label_size[0], int(y1)), color, -1)
-            cv2.putText(frame, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+            boxes.append((x1, y1, x2, y2, self.label(detection), confidence, color))
+        self.overlay.draw(frame, boxes)
 
         return frame
 
@@ -81,16 +164,40 @@ def main():
     setup_logging()
     logging.info("Starting YOLO detection script")
 
-    parser = argparse.ArgumentParser(description='Run YOLO on a video file')
-    parser.add_argument('video_path', type=str, help='Path to the input video file')
-    parser.add_argument('-o', '--output', type=str, help='Path to the output file', default=None)
+    parser = argparse.ArgumentParser(description='Run YOLO on a video file, or on many videos in batch mode')
+    parser.add_argument('video_paths', type=str, nargs='+', help='Input video file(s) or directories of videos')
+    parser.add_argument('-o', '--output', type=str, help='Path to the output file (output directory in batch mode)', default=None)
     parser.add_argument('-f', '--frames', type=int, help='Frame interval for running analysis', default=5)
+    parser.add_argument('-d', '--device', type=str, help='Inference device (e.g. cuda:0, mps, cpu). Auto-detected by default', default=None)
+    parser.add_argument('--sequential', action='store_true', help='Run the two models one after the other instead of concurrently')
+    parser.add_argument('--no-track', action='store_true', help='Redraw keyframe detections as-is instead of tracking them between keyframes')
+    parser.add_argument('--queue-size', type=int, help='Frames buffered between the reader, detector and writer', default=8)
+    parser.add_argument('--batch', action='store_true', help='Batch mode; implied by several inputs or a directory')
+    parser.add_argument('--workers', type=int, help='Batch mode: number of worker processes (default: one per device)', default=None)
+    parser.add_argument('--devices', type=str, nargs='+', help='Batch mode: devices to spread workers over', default=None)
+    parser.add_argument('--shard-frames', type=int, help='Batch mode: frames per shard', default=1800)
+    parser.add_argument('--keep-shards', action='store_true', help='Batch mode: keep per-shard outputs after assembly')
     args = parser.parse_args()
+
+    if args.batch or len(args.video_paths) > 1 or os.path.isdir(args.video_paths[0]):
+        if args.output is None:
+            parser.error("batch mode needs an output directory (-o)")
+        from yolo_batch import run_batch
+        run_batch(args.video_paths, args.output, frame_interval=args.frames,
+                  devices=args.devices or ([args.device] if args.device else None), workers=args.workers,
+                  shard_frames=args.shard_frames, execution='sequential' if args.sequential else 'concurrent',
+                  track=not args.no_track, keep_shards=args.keep_shards)
+        logging.info("Batch completed successfully")
+        return
+
+    args.video_path = args.video_paths[0]
     logging.info(f"Input video path: {args.video_path}")
     logging.info(f"Output file path: {args.output}")
     logging.info(f"Frame interval: {args.frames}")
 
-    detector = YOLODetector(frame_interval=args.frames)
+    detector = YOLODetector(frame_interval=args.frames, device=args.device,
+                            execution='sequential' if args.sequential else 'concurrent',
+                            track=not args.no_track)
 
     # Open the video file
     logging.info("Opening video file")
@@ -106,45 +213,59 @@ def main():
     logging.info(f"Video properties - FPS: {fps}, Width: {width}, Height: {height}")
 
     # Create a window if not saving to file
+    writer = None
     if args.output is None:
         cv2.namedWindow('YOLO Detection', cv2.WINDOW_NORMAL)
         cv2.resizeWindow('YOLO Detection', width, height)
         logging.info("Created display window")
     else:
-        # Create VideoWriter object if saving to file
+        # Create VideoWriter object if saving to file; frames are encoded on a background thread
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(args.output, fourcc, fps, (width, height))
+        writer = FrameWriter(cv2.VideoWriter(args.output, fourcc, fps, (width, height)), args.queue_size).start()
         logging.info(f"Created output video file: {args.output}")
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            logging.info("Reached end of video")
-            break
+    # Decode ahead on a background thread so the detector never waits on I/O
+    reader = FrameReader(cap, args.queue_size).start()
+    inference = StageStats()
+    started = time.perf_counter()
+    try:
+        for frame in reader:
+            frame_started = time.perf_counter()
+            processed_frame = detector.process_frame(frame)
+            inference.record(time.perf_counter() - frame_started)
 
-        processed_frame = detector.process_frame(frame)
+            if writer is None:
+                # Display the frame
+                cv2.imshow('YOLO Detection', processed_frame)
+                logging.info(f"Displayed frame {detector.frame_count}")
 
-        if args.output is None:
-            # Display the frame
-            cv2.imshow('YOLO Detection', processed_frame)
-            logging.info(f"Displayed frame {detector.frame_count}")
-
-            # Break the loop if 'q' is pressed
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                logging.info("User pressed 'q'. Exiting.")
-                break
+                # Break the loop if 'q' is pressed
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    logging.info("User pressed 'q'. Exiting.")
+                    break
+            else:
+                # Queue the frame for the output file
+                writer.write(processed_frame)
+                logging.info(f"Queued frame {detector.frame_count} for output file")
         else:
-            # Write the frame to the output file
-            out.write(processed_frame)
-            logging.info(f"Wrote frame {detector.frame_count} to output file")
-
-    # Release resources
-    logging.info("Releasing resources")
-    cap.release()
-    if args.output is not None:
-        out.release()
-    else:
-        cv2.destroyAllWindows()
+            logging.info("Reached end of video")
+    finally:
+        # Release resources
+        logging.info("Releasing resources")
+        reader.stop()
+        cap.release()
+        if writer is not None:
+            writer.close()
+        else:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - started
+    logging.info(f"Processed {inference.count} frames in {elapsed:.1f}s ({inference.count / max(elapsed, 1e-9):.1f} FPS)")
+    stages = {"decode": reader.decode, "decode wait": reader.wait, "inference": inference}
+    if writer is not None:
+        stages.update({"encode": writer.encode, "encode wait": writer.wait})
+    for stage, stats in stages.items():
+        logging.info(f"  {stage:<12} avg {stats.as_dict()['avg_ms']:.1f} ms, total {stats.total_time:.1f}s")
     logging.info("Script completed successfully")
 
 if __name__ == '__main__':
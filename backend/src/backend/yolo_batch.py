@@ -0,0 +1,226 @@
+import cv2
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.m4v')
+
+# Set in each worker process by _init_worker
+detector = None
+
+
+def collect_videos(paths):
+    """Expand the given files and directories (non-recursively) into a sorted list of video files."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                       if name.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            videos.append(path)
+    return videos
+
+
+def output_names(videos):
+    """
+    Map each video to the name its outputs and shards are stored under.
+
+    That is the file stem, unless several videos share a stem (a/clip.mp4 and b/clip.mp4);
+    those get a short hash of their absolute path appended so they cannot overwrite each
+    other or be skipped as already processed.
+    """
+    stems = {video: os.path.splitext(os.path.basename(video))[0] for video in videos}
+    counts = {}
+    for stem in stems.values():
+        counts[stem] = counts.get(stem, 0) + 1
+    return {video: stem if counts[stem] == 1 else
+            f"{stem}-{hashlib.sha1(os.path.abspath(video).encode()).hexdigest()[:8]}"
+            for video, stem in stems.items()}
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Error opening video file {path}")
+    info = {
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 30.0,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+    cap.release()
+    return info
+
+
+def plan_shards(frames, shard_frames, frame_interval):
+    """Split [0, frames) into ranges that each start on a keyframe, so detection cadence matches a single pass."""
+    if frames <= 0:
+        return [(0, 0)]  # Unknown length; a single shard that reads to the end
+    shard_frames = max(frame_interval, shard_frames - shard_frames % frame_interval)
+    return [(start, min(start + shard_frames, frames)) for start in range(0, frames, shard_frames)]
+
+
+def _init_worker(devices, frame_interval, execution, track, log_level):
+    global detector
+    from yolo import YOLODetector, setup_logging
+
+    setup_logging()
+    logging.getLogger().setLevel(log_level)
+    # Each worker takes the next device, so several GPUs are shared round-robin
+    device = devices.get() if devices is not None else None
+    detector = YOLODetector(frame_interval=frame_interval, device=device, execution=execution, track=track)
+
+
+def open_at(video, start):
+    """
+    Open `video` so the next read returns frame `start`.
+
+    Seeking lands on the nearest keyframe with some codecs and containers, so the position
+    is checked afterwards and the remaining frames up to `start` are read forward.
+    """
+    cap = cv2.VideoCapture(video)
+    if not start:
+        return cap
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) if cap.set(cv2.CAP_PROP_POS_FRAMES, start) else -1
+    if not 0 <= position <= start:
+        cap.release()
+        cap = cv2.VideoCapture(video)
+        position = 0
+    for _ in range(start - position):
+        if not cap.grab():
+            break
+    return cap
+
+
+def process_shard(video, start, end, shard_dir):
+    """Annotate frames [start, end) of `video` into a shard video and JSONL file, then mark the shard done."""
+    name = f"{start:09d}-{end:09d}"
+    info = video_info(video)
+    cap = open_at(video, start)
+    out_path = os.path.join(shard_dir, name + ".mp4")
+    # The writer picks the container from the extension, so the temporary name keeps .mp4
+    part_path = os.path.join(shard_dir, name + ".part.mp4")
+    out = cv2.VideoWriter(part_path, cv2.VideoWriter_fourcc(*'mp4v'), info["fps"],
+                          (info["width"], info["height"]))
+    detector.reset(start)
+
+    written = 0
+    with open(os.path.join(shard_dir, name + ".jsonl.part"), 'w') as sidecar:
+        index = start
+        while end == 0 or index < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            keyframe = (index % detector.frame_interval) == 0
+            out.write(detector.process_frame(frame))
+            record = {
+                "video": os.path.basename(video),
+                "frame": index,
+                "time": index / info["fps"],
+                "keyframe": keyframe,
+                "detections": [
+                    {"label": detector.label(d), "confidence": round(d[4], 4),
+                     "bbox": [round(v, 1) for v in d[:4]], "model": d[6]}
+                    for d in detector.current_detections
+                ],
+            }
+            sidecar.write(json.dumps(record) + "\n")
+            written += 1
+            index += 1
+    cap.release()
+    out.release()
+
+    # Rename into place before writing the marker, so a marked shard is always complete
+    os.replace(part_path, out_path)
+    os.replace(os.path.join(shard_dir, name + ".jsonl.part"), os.path.join(shard_dir, name + ".jsonl"))
+    with open(os.path.join(shard_dir, name + ".done"), 'w') as f:
+        json.dump({"start": start, "end": end, "frames": written}, f)
+    return video, start, written
+
+
+def assemble(video, name, shards, shard_dir, output_dir, keep_shards=False):
+    """Concatenate a video's finished shards, in frame order, into the annotated video and its sidecar."""
+    info = video_info(video)
+    video_path = os.path.join(output_dir, name + "_annotated.mp4")
+    sidecar_path = os.path.join(output_dir, name + ".detections.jsonl")
+
+    out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), info["fps"], (info["width"], info["height"]))
+    with open(sidecar_path + ".part", 'w') as sidecar:
+        for start, end in shards:
+            shard = os.path.join(shard_dir, f"{start:09d}-{end:09d}")
+            cap = cv2.VideoCapture(shard + ".mp4")
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+            with open(shard + ".jsonl") as f:
+                shutil.copyfileobj(f, sidecar)
+    out.release()
+    # The sidecar appears last, so its presence marks the video as finished
+    os.replace(sidecar_path + ".part", sidecar_path)
+
+    if not keep_shards:
+        shutil.rmtree(shard_dir)
+    logging.info(f"Wrote {video_path} and {sidecar_path}")
+    return video_path, sidecar_path
+
+
+def run_batch(paths, output_dir, frame_interval=5, devices=None, workers=None, shard_frames=1800,
+              execution='concurrent', track=True, keep_shards=False):
+    """
+    Annotate many videos with a process pool.
+
+    Videos are split into keyframe-aligned frame ranges that workers process independently.
+    Each finished shard leaves a .done marker under output_dir/.shards, so re-running the
+    same command after an interruption only processes the missing shards. When all shards
+    of a video are done they are joined, in order, into <name>_annotated.mp4 plus a
+    <name>.detections.jsonl sidecar with one record per frame (see output_names).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    videos = collect_videos(paths)
+    names = output_names(videos)
+    pending = {}  # video -> (all shards, shard dir, set of unfinished shards)
+    jobs = []
+    for video in videos:
+        if os.path.exists(os.path.join(output_dir, names[video] + ".detections.jsonl")):
+            logging.info(f"Skipping {video}; already processed")
+            continue
+        shard_dir = os.path.join(output_dir, ".shards", names[video])
+        os.makedirs(shard_dir, exist_ok=True)
+        shards = plan_shards(video_info(video)["frames"], shard_frames, frame_interval)
+        todo = {(s, e) for s, e in shards if not os.path.exists(os.path.join(shard_dir, f"{s:09d}-{e:09d}.done"))}
+        pending[video] = (shards, shard_dir, todo)
+        jobs += [(video, s, e, shard_dir) for s, e in sorted(todo)]
+        logging.info(f"{video}: {len(shards)} shards, {len(shards) - len(todo)} already done")
+
+    # Videos whose shards all finished in an earlier run only need assembling
+    for video, (shards, shard_dir, todo) in list(pending.items()):
+        if not todo:
+            assemble(video, names[video], shards, shard_dir, output_dir, keep_shards)
+            del pending[video]
+    if not jobs:
+        return
+
+    devices = devices or [None]
+    workers = workers or len(devices)
+    context = multiprocessing.get_context('spawn')  # CUDA cannot be used in forked workers
+    device_queue = context.Queue()
+    for i in range(workers):
+        device_queue.put(devices[i % len(devices)])
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(device_queue, frame_interval, execution, track, logging.WARNING)) as executor:
+        futures = [executor.submit(process_shard, *job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            video, start, written = future.result()
+            logging.info(f"[{done}/{len(futures)}] {os.path.basename(video)} frames {start}-{start + written} done")
+            shards, shard_dir, todo = pending[video]
+            todo.discard(next(s for s in todo if s[0] == start))
+            if not todo:
+                assemble(video, names[video], shards, shard_dir, output_dir, keep_shards)
@@ -0,0 +1,178 @@
+import asyncio
+
+from db import BatchWriter, SQLiteBackend
+
+
+def sqlite_backend():
+    backend = SQLiteBackend()
+    backend.conn.execute("CREATE TABLE drone_status (name TEXT, battery_level INT)")
+    return backend
+
+
+def count(backend, table="drone_status"):
+    return backend.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_flushes_when_batch_is_full():
+    async def main():
+        backend = sqlite_backend()
+        writer = BatchWriter(backend, max_batch=10, flush_interval=60.0)
+        flushed = []
+        writer.on_flush.append(flushed.append)
+        writer.start()
+        for i in range(10):
+            writer.add("drone_status", {"name": "Drone 1", "battery_level": i})
+        for _ in range(100):
+            if count(backend) == 10:
+                break
+            await asyncio.sleep(0.01)
+        await writer.stop()
+        return backend, writer, flushed
+
+    backend, writer, flushed = asyncio.run(main())
+    assert count(backend) == 10
+    assert writer.stats()["rows_written"] == 10
+    assert flushed == ["drone_status"]
+
+
+def test_flushes_after_interval():
+    async def main():
+        backend = sqlite_backend()
+        writer = BatchWriter(backend, max_batch=500, flush_interval=0.05)
+        writer.start()
+        writer.add("drone_status", {"name": "Drone 1", "battery_level": 90})
+        assert count(backend) == 0  # Buffered, not written yet
+        await asyncio.sleep(0.3)
+        written = count(backend)
+        await writer.stop()
+        return written
+
+    assert asyncio.run(main()) == 1
+
+
+def test_stop_flushes_what_is_buffered():
+    async def main():
+        backend = sqlite_backend()
+        writer = BatchWriter(backend, max_batch=500, flush_interval=60.0)
+        writer.start()
+        writer.add("drone_status", {"name": "Drone 1", "battery_level": 90})
+        await writer.stop()
+        return backend
+
+    assert count(asyncio.run(main())) == 1
+
+
+def test_failing_flush_is_counted_and_other_tables_still_written():
+    async def main():
+        backend = sqlite_backend()
+        writer = BatchWriter(backend)
+        flushed = []
+        writer.on_flush.append(flushed.append)
+        writer.add("missing_table", {"name": "Drone 1"})
+        writer.add("drone_status", {"name": "Drone 1", "battery_level": 90})
+        await writer.flush()
+        return backend, writer, flushed
+
+    backend, writer, flushed = asyncio.run(main())
+    stats = writer.stats()
+    assert stats["errors"] == 1
+    assert stats["rows_written"] == 1
+    assert stats["buffered"] == 0
+    assert stats["retrying"] == 1
+    assert flushed == ["drone_status"]
+    assert count(backend) == 1
+
+
+def test_oldest_rows_dropped_when_buffer_is_full():
+    writer = BatchWriter(SQLiteBackend(), max_batch=500, max_buffered=3)
+    for i in range(5):
+        writer.add("drone_status", {"name": "Drone 1", "battery_level": i})
+    stats = writer.stats()
+    assert stats["buffered"] == 3
+    assert stats["rows_dropped"] == 2
+
+
+def test_on_written_gets_row_ids():
+    async def main():
+        backend = sqlite_backend()
+        backend.conn.execute("CREATE TABLE persons (id INTEGER PRIMARY KEY AUTOINCREMENT, confidence REAL)")
+        writer = BatchWriter(backend, max_batch=100, flush_interval=60.0)
+        ids = {}
+        writer.add("drone_status", {"name": "Drone 1", "battery_level": 90})
+        for i in range(3):
+            writer.add("persons", {"confidence": i / 10}, on_written=lambda row_id, i=i: ids.__setitem__(i, row_id))
+        await writer.stop()
+        return backend, ids
+
+    backend, ids = asyncio.run(main())
+    rows = dict(backend.conn.execute("SELECT id, confidence FROM persons").fetchall())
+    assert sorted(ids) == [0, 1, 2]
+    assert [rows[ids[i]] for i in range(3)] == [0.0, 0.1, 0.2]
+    assert count(backend) == 1
+
+
+class FlakyBackend(SQLiteBackend):
+    """Fails the first `failures` inserts, as a dropped database link would."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.conn.execute("CREATE TABLE persons (id INTEGER PRIMARY KEY AUTOINCREMENT, confidence REAL)")
+        self.failures = failures
+
+    def _insert_each(self, sql, rows):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("lost connection")
+        return super()._insert_each(sql, rows)
+
+
+def test_failed_group_is_retried_after_backoff():
+    async def main():
+        backend = FlakyBackend(failures=1)
+        writer = BatchWriter(backend, retry_backoff=0.05)
+        ids = []
+        writer.add("persons", {"confidence": 0.9}, on_written=ids.append)
+        await writer.flush()
+        failed = (writer.stats(), list(ids))
+        # Not due yet: nothing is written
+        await writer.flush()
+        await asyncio.sleep(0.06)
+        await writer.flush()
+        return backend, writer.stats(), failed, ids
+
+    backend, stats, (failed_stats, failed_ids), ids = asyncio.run(main())
+    assert failed_stats["errors"] == 1 and failed_stats["retrying"] == 1 and failed_ids == []
+    assert stats["rows_written"] == 1 and stats["retrying"] == 0 and stats["rows_dropped"] == 0
+    assert ids == [1]
+    assert count(backend, "persons") == 1
+
+
+def test_rows_are_dropped_with_none_after_the_last_retry():
+    async def main():
+        writer = BatchWriter(FlakyBackend(failures=10), max_retries=2, retry_backoff=0.0)
+        ids = []
+        writer.add("persons", {"confidence": 0.9}, on_written=ids.append)
+        writer.add("persons", {"confidence": 0.8}, on_written=ids.append)
+        for _ in range(3):
+            await writer.flush()
+        return writer.stats(), ids
+
+    stats, ids = asyncio.run(main())
+    assert stats["errors"] == 3
+    assert stats["rows_dropped"] == 2 and stats["retrying"] == 0
+    assert ids == [None, None]
+
+
+def test_stop_gives_failed_groups_a_last_try():
+    async def main():
+        backend = FlakyBackend(failures=1)
+        writer = BatchWriter(backend, retry_backoff=60.0)
+        ids = []
+        writer.add("persons", {"confidence": 0.9}, on_written=ids.append)
+        await writer.flush()
+        await writer.stop()
+        return backend, ids
+
+    backend, ids = asyncio.run(main())
+    assert ids == [1]
+    assert count(backend, "persons") == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+o3d = pytest.importorskip("open3d")
+pytest.importorskip("tqdm")
+
+from clean_ply import load_downsampled, voxel_cluster  # noqa: E402
+
+
+def scan(seed=0):
+    """Three dense blobs far apart, plus a few isolated floaters."""
+    rng = np.random.default_rng(seed)
+    blobs = [rng.uniform(0, 0.5, (n, 3)) + offset for n, offset in
+             ((800, (0, 0, 0)), (400, (3, 0, 0)), (200, (0, 3, 3)))]
+    floaters = np.array([[6.0, 6.0, 6.0], [-3.0, 5.0, 0.0], [8.0, -4.0, 2.0]])
+    return np.vstack(blobs + [floaters]), rng
+
+
+def same_partition(a, b):
+    """Whether two label arrays agree on noise and group the other points identically."""
+    if not np.array_equal(a < 0, b < 0):
+        return False
+    pairs = set(zip(a[a >= 0].tolist(), b[b >= 0].tolist()))
+    return len(pairs) == len({x for x, _ in pairs}) == len({y for _, y in pairs})
+
+
+def test_voxel_clusters_match_dbscan_on_separated_blobs():
+    points, _ = scan()
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    dbscan = np.array(pcd.cluster_dbscan(eps=0.2, min_points=5))
+    voxel = voxel_cluster(points, eps=0.2, min_points=5)
+
+    assert len(set(voxel[voxel >= 0])) == 3
+    assert (voxel[-3:] == -1).all()
+    assert same_partition(voxel, dbscan)
+
+
+def test_small_clusters_become_noise():
+    points, _ = scan()
+    labels = voxel_cluster(points, eps=0.2, min_points=300)
+    # Only the 800- and 400-point blobs are big enough
+    assert sorted(np.bincount(labels[labels >= 0])) == [400, 800]
+    assert (labels[1200:] == -1).all()
+    assert len(voxel_cluster(np.empty((0, 3)), eps=0.2, min_points=5)) == 0
+
+
+def write_ply(path, xyz, rgb):
+    vertices = np.empty(len(xyz), dtype=[('x', '<f8'), ('y', '<f8'), ('z', '<f8'),
+                                         ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    vertices['x'], vertices['y'], vertices['z'] = xyz.T
+    vertices['red'], vertices['green'], vertices['blue'] = rgb.T
+    with open(path, 'wb') as f:
+        f.write(f"ply\nformat binary_little_endian 1.0\nelement vertex {len(xyz)}\n"
+                "property double x\nproperty double y\nproperty double z\n"
+                "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n".encode())
+        f.write(vertices.tobytes())
+
+
+def sorted_rows(pcd):
+    rows = np.hstack([np.asarray(pcd.points), np.asarray(pcd.colors)])
+    return rows[np.lexsort(rows.T[::-1])]
+
+
+def test_streamed_downsampling_matches_the_in_memory_path(tmp_path):
+    points, rng = scan(seed=1)
+    colors = rng.integers(0, 256, (len(points), 3), dtype=np.uint8)
+    path = str(tmp_path / "scan.ply")
+    write_ply(path, points, colors)
+
+    # Many small chunks, so voxels are merged across chunk boundaries
+    streamed = load_downsampled(path, voxel_size=0.25, chunk_points=100)
+    in_memory = load_downsampled(path, voxel_size=0.25, chunk_points=10 ** 9)
+    assert len(streamed.points) == len(in_memory.points)
+    np.testing.assert_allclose(sorted_rows(streamed), sorted_rows(in_memory), atol=1e-9)
@@ -0,0 +1,137 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from db import ConnectionPool, SQLiteConnection, run_query
+
+
+class Connection(SQLiteConnection):
+    """An in-memory SQLite connection that can be made to fail like a dropped link."""
+
+    def __init__(self):
+        super().__init__()
+        self.alive = True
+        self.closed = False
+
+    def cursor(self):
+        if not self.alive:
+            raise sqlite3.OperationalError("connection lost")
+        return super().cursor()
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+def make_pool(size=2, **options):
+    opened = []
+
+    def connect():
+        opened.append(Connection())
+        return opened[-1]
+
+    return ConnectionPool(connect, size=size, **options), opened
+
+
+def test_connections_open_lazily_and_are_reused():
+    async def main():
+        pool, opened = make_pool(size=2)
+        assert opened == []
+        for _ in range(3):
+            assert await pool.query("SELECT 1") == (["1"], [(1,)])
+        return pool, opened
+
+    pool, opened = asyncio.run(main())
+    assert len(opened) == 1
+    assert pool.stats()["checkouts"] == 3
+
+
+def test_concurrent_checkouts_never_exceed_size():
+    async def main():
+        pool, opened = make_pool(size=2)
+        in_use, peak = 0, 0
+
+        def work(conn):
+            nonlocal in_use, peak
+            in_use += 1
+            peak = max(peak, in_use)
+            threading.Event().wait(0.02)
+            in_use -= 1
+            return run_query(conn, "SELECT 1")
+
+        await asyncio.gather(*(pool.run(work) for _ in range(6)))
+        return pool, opened, peak
+
+    pool, opened, peak = asyncio.run(main())
+    assert len(opened) == 2
+    assert peak == 2
+    assert pool.stats()["idle"] == 2
+
+
+def test_dead_connection_is_replaced_on_checkout():
+    async def main():
+        pool, opened = make_pool(size=1, health_check_interval=0.0)
+        await pool.query("SELECT 1")
+        opened[0].alive = False
+        result = await pool.query("SELECT 1")
+        return pool, opened, result
+
+    pool, opened, result = asyncio.run(main())
+    assert result == (["1"], [(1,)])
+    assert len(opened) == 2
+    assert opened[0].closed
+    assert pool.stats()["reconnects"] == 1
+
+
+def test_error_forces_health_check_before_reuse():
+    async def main():
+        pool, opened = make_pool(size=1)
+        with pytest.raises(sqlite3.OperationalError):
+            await pool.query("SELECT * FROM missing_table")
+        # The statement failed but the connection is fine: it passes the ping and is reused
+        await pool.query("SELECT 1")
+        return pool, opened
+
+    pool, opened = asyncio.run(main())
+    assert len(opened) == 1
+    assert pool.stats()["reconnects"] == 0
+
+
+def test_cancelled_call_does_not_return_connection_in_use():
+    async def main():
+        pool, opened = make_pool(size=1)
+        started, release = threading.Event(), threading.Event()
+
+        def slow(conn):
+            started.set()
+            release.wait(5)
+            return run_query(conn, "SELECT 1")
+
+        task = asyncio.create_task(pool.run(slow))
+        await asyncio.to_thread(started.wait, 5)
+        # Queued behind the busy connection
+        waiter = asyncio.create_task(pool.query("SELECT 1"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The worker thread still holds the first connection; the waiter gets a new one
+        result = await asyncio.wait_for(waiter, 5)
+        assert opened[1] is not opened[0] and not opened[0].closed
+
+        release.set()
+        for _ in range(100):
+            if opened[0].closed:
+                break
+            await asyncio.sleep(0.01)
+        return pool, opened, result
+
+    pool, opened, result = asyncio.run(main())
+    assert result == (["1"], [(1,)])
+    assert len(opened) == 2
+    assert opened[0].closed  # Closed once the abandoned thread finished
+    assert pool.stats()["open"] == 1
+    assert pool.stats()["idle"] == 1
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from encoder import ClientStreamController, frame_signature
+
+
+def scene(x=None, noise=0, seed=0):
+    """A textured 960x720 background with an optional person-sized box at `x`."""
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(np.random.default_rng(1).integers(0, 255, (720, 960, 3), dtype=np.uint8), (31, 31), 0)
+    if x is not None:
+        cv2.rectangle(frame, (x, 300), (x + 80, 520), (40, 40, 160), -1)
+    if noise:
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def person(x):
+    return SimpleNamespace(class_name="person", confidence=0.9, bbox=[x, 300, x + 80, 520])
+
+
+def test_moving_object_is_sent():
+    controller = ClientStreamController()
+    first = frame_signature(scene(400))
+    controller.on_sent(1, first, 0.001, now=0.0)
+    assert controller.should_send(frame_signature(scene(420)), now=0.2)
+
+
+def test_appearing_object_is_sent():
+    controller = ClientStreamController()
+    controller.on_sent(1, frame_signature(scene()), 0.001, now=0.0)
+    assert controller.should_send(frame_signature(scene(400)), now=0.2)
+
+
+def test_changed_detections_are_sent():
+    controller = ClientStreamController()
+    image = scene()
+    controller.on_sent(1, frame_signature(image, [person(400)]), 0.001, now=0.0)
+    assert controller.should_send(frame_signature(image, [person(440)]), now=0.2)
+    assert controller.should_send(frame_signature(image, []), now=0.2)
+
+
+def test_static_noisy_scene_is_skipped_until_keepalive():
+    controller = ClientStreamController()
+    controller.on_sent(1, frame_signature(scene(400, noise=4, seed=1), [person(400)]), 0.001, now=0.0)
+    assert not controller.should_send(frame_signature(scene(400, noise=4, seed=2), [person(400)]), now=0.2)
+    assert controller.skipped_identical == 1
+    assert controller.should_send(frame_signature(scene(400, noise=4, seed=3), [person(400)]), now=1.1)
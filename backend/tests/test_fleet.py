@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from fleet import DroneSession, Fleet
+from sim_tello import SimulatedTello
+
+
+def simulated_fleet(drones=2):
+    drones_made = []
+
+    def factory(i):
+        def connect():
+            tello = SimulatedTello(host=f"sim-{i}", command_delay=0.001, size=(160, 120))
+            drones_made.append(tello)
+            return tello
+        return connect
+
+    sessions = [DroneSession(f"drone-{i + 1}", f"Drone {i + 1}", factory(i + 1), lambda frame: [],
+                             lambda frame: b"jpeg", period=0.02, telemetry_period=0.02)
+                for i in range(drones)]
+    return Fleet(sessions), drones_made
+
+
+def commands(tello):
+    return [command[1:] for command in tello.commands]
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("Timed out")
+        await asyncio.sleep(0.01)
+
+
+def test_deploy_connects_takes_off_and_flies_the_mission():
+    async def main():
+        fleet, drones = simulated_fleet()
+        flown = []
+
+        async def mission(session):
+            await session.call(session.tello.move_forward, 30)
+            flown.append(session.drone_id)
+
+        await fleet.get("drone-2").deploy(mission, stream_warmup=0.01)
+        state = fleet.get("drone-2").state
+        # Frames flow through the session's pipeline once connected
+        await wait_for(lambda: fleet.get("drone-2").latest() is not None)
+        await fleet.close()
+        return drones, flown, state
+
+    drones, flown, state = asyncio.run(main())
+    assert flown == ["drone-2"]
+    assert state == "flying"
+    # Only the deployed drone was connected
+    assert len(drones) == 1
+    assert commands(drones[0])[:4] == [("command",), ("streamon",), ("takeoff",), ("forward", 30)]
+
+
+def test_second_deploy_while_deploying_is_ignored():
+    async def main():
+        fleet, drones = simulated_fleet(1)
+        session = fleet.get()
+        first = session.deploy(stream_warmup=0.05)
+        second = session.deploy(stream_warmup=0.05)
+        await first
+        await fleet.close()
+        return first is second, drones
+
+    same, drones = asyncio.run(main())
+    assert same
+    assert len(drones) == 1
+
+
+def test_move_sends_rc_to_the_addressed_drone_only():
+    async def main():
+        fleet, drones = simulated_fleet()
+        # Ignored: not connected yet
+        fleet.get("drone-1").move(10, 0, 0, 0)
+        await fleet.get("drone-1").deploy(stream_warmup=0.01)
+        for value in range(5):
+            fleet.get("drone-1").move(value, 20, 0, -10)
+        await wait_for(lambda: ("rc", 4, 20, 0, -10) in commands(drones[0]))
+        await fleet.close()
+        return drones
+
+    drones = asyncio.run(main())
+    rc = [command for command in commands(drones[0]) if command[0] == "rc"]
+    # A burst collapses to its newest value instead of queueing every one
+    assert rc[-1] == ("rc", 4, 20, 0, -10)
+    assert len(rc) < 5
+    assert len(drones) == 1
+
+
+def test_close_lands_and_disconnects():
+    async def main():
+        fleet, drones = simulated_fleet(1)
+        session = fleet.get()
+        await session.deploy(stream_warmup=0.01)
+        await fleet.close()
+        return session, drones[0]
+
+    session, tello = asyncio.run(main())
+    assert commands(tello)[-2:] == [("land",), ("streamoff",)]
+    assert not tello.is_flying and not tello.connected
+    assert session.state == "idle" and session.tello is None
+
+
+def test_unknown_drone_raises_key_error():
+    fleet, _ = simulated_fleet(1)
+    assert fleet.get("") is fleet.get("drone-1")
+    with pytest.raises(KeyError):
+        fleet.get("drone-9")
+
+
+def test_simulator_command_log_is_bounded():
+    tello = SimulatedTello(command_delay=0, command_log=3)
+    for x in range(10):
+        tello.move_forward(x)
+    assert commands(tello) == [("forward", 7), ("forward", 8), ("forward", 9)]
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from hub import Hub
+
+
+def drain(subscription):
+    messages = []
+    while (message := subscription.get_nowait()) is not None:
+        messages.append(message)
+    return messages
+
+
+def test_message_is_serialized_once_and_shared():
+    hub = Hub()
+    first, second = hub.subscribe(["events"]), hub.subscribe(["events"])
+    assert hub.publish("events", {"kind": "person", "id": 3}) == 2
+    assert hub.publish("nobody", {"ignored": True}) == 0
+
+    [a], [b] = drain(first), drain(second)
+    assert a is b
+    assert json.loads(a.data) == {"kind": "person", "id": 3}
+    assert hub.serialized == 1
+    assert hub.publish("events", b"\xff", serialize=True) == 2
+    assert drain(first)[0].binary
+
+
+def test_drop_policy_keeps_the_newest_messages_up_to_maxsize():
+    hub = Hub()
+    subscription = hub.subscribe({"events": "drop"}, maxsize=3)
+    for i in range(5):
+        hub.publish("events", str(i))
+    assert [message.data for message in drain(subscription)] == ["2", "3", "4"]
+    assert subscription.stats()["dropped"] == 2
+
+
+def test_latest_policy_keeps_one_message_per_topic():
+    hub = Hub()
+    subscription = hub.subscribe({"frames/1": "latest", "frames/2": "latest", "events": "drop"})
+    hub.publish("frames/1", "f1-a")
+    hub.publish("frames/2", "f2-a")
+    hub.publish("frames/1", "f1-b")
+    hub.publish("events", "e")
+    # Queued messages come first, then latest-only topics oldest first
+    assert [message.data for message in drain(subscription)] == ["e", "f2-a", "f1-b"]
+    assert subscription.stats()["replaced"] == 1
+    assert subscription.stats()["dropped"] == 0
+
+
+def test_slow_subscriber_does_not_hold_back_a_fast_one():
+    async def main():
+        hub = Hub()
+        slow = hub.subscribe({"frames": "latest"}, name="slow")
+        fast = hub.subscribe({"frames": "latest"}, name="fast")
+        received = []
+
+        async def read_fast():
+            async for message in fast:
+                received.append(message.data)
+
+        reader = asyncio.create_task(read_fast())
+        for i in range(20):
+            hub.publish("frames", str(i))
+            await asyncio.sleep(0)
+        fast.close()
+        await reader
+        return received, slow
+
+    received, slow = asyncio.run(main())
+    assert received == [str(i) for i in range(20)]
+    # The slow one never read, so it holds just the newest frame
+    assert slow.pending() == 1
+    assert slow.get_nowait().data == "19"
+    assert slow.stats()["replaced"] == 19
+
+
+def test_lag_metrics_and_unsubscribe():
+    async def main():
+        hub = Hub()
+        subscription = hub.subscribe(["events"], name="viewer")
+        hub.publish("events", "late")
+        await asyncio.sleep(0.02)
+        message = await subscription.get()
+        stats = hub.stats()
+        subscription.close()
+        return message, stats, await subscription.get(), hub
+
+    message, stats, after_close, hub = asyncio.run(main())
+    assert message.data == "late"
+    [viewer] = stats["subscribers"]
+    assert viewer["name"] == "viewer" and viewer["delivered"] == 1 and viewer["pending"] == 0
+    assert viewer["lag_ms"] >= 20 and viewer["max_lag_ms"] == viewer["lag_ms"]
+    assert stats["topics"] == {"events": 1} and stats["published"] == {"events": 1}
+    assert after_close is None
+    assert not hub.has_subscribers("events")
+    assert hub.publish("events", "unheard") == 0
@@ -0,0 +1,41 @@
+import pytest
+
+from inference_server import inference_server, server_stats
+from model_registry import ModelRegistry
+
+
+def registry_with(name):
+    registry = ModelRegistry()
+    registry.register(name, lambda: "model")
+    return registry
+
+
+def test_variants_get_their_own_server_and_settings():
+    registry = registry_with("variants.pt")
+    small = inference_server("variants.pt", variant="imgsz=320", registry=registry,
+                             run=lambda model, items: [("small", item) for item in items])
+    large = inference_server("variants.pt", variant="imgsz=640", registry=registry,
+                             run=lambda model, items: [("large", item) for item in items])
+    try:
+        assert small is not large
+        assert small.infer(1, timeout=5) == ("small", 1)
+        assert large.infer(2, timeout=5) == ("large", 2)
+        assert {"variants.pt[imgsz=320]", "variants.pt[imgsz=640]"} <= set(server_stats())
+    finally:
+        small.stop()
+        large.stop()
+
+
+def test_same_variant_shares_the_server():
+    registry = registry_with("shared.pt")
+    first = inference_server("shared.pt", variant="imgsz=640", registry=registry, max_batch=4)
+    # Later callers' run is not used; the first caller's server is shared
+    second = inference_server("shared.pt", variant="imgsz=640", run=lambda model, items: [], max_batch=4)
+    assert first is second
+    assert inference_server("shared.pt", variant="imgsz=640") is first
+
+
+def test_mismatched_batching_options_raise():
+    inference_server("mismatch.pt", variant="a", registry=registry_with("mismatch.pt"), max_batch=4)
+    with pytest.raises(ValueError, match="max_batch=4"):
+        inference_server("mismatch.pt", variant="a", max_batch=8)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from octree_tiles import TileSet, build_tiles
+
+GRID = 4
+
+
+def read_tile(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    header, body = data.split(b"end_header\n", 1)
+    count = int(header.split(b"element vertex ")[1].split()[0])
+    dtype = [('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')]
+    vertices = np.frombuffer(body, dtype=dtype, count=count)
+    return np.stack([vertices['x'], vertices['y'], vertices['z']], axis=1)
+
+
+@pytest.fixture
+def tiles(tmp_path):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 8, (20000, 3))
+    build_tiles(points, rng.uniform(0, 1, (20000, 3)), str(tmp_path), max_points=1000, grid=GRID)
+    return TileSet(str(tmp_path))
+
+
+def test_every_point_lands_in_exactly_one_tile_within_its_bounds(tiles):
+    nodes = tiles.nodes
+    assert sum(node["points"] for node in nodes.values()) == tiles.index["points"] == 20000
+    for name, node in nodes.items():
+        xyz = read_tile(tiles.path(name))
+        assert len(xyz) == node["points"]
+        lo, hi = np.array(node["bounds"][:3]), np.array(node["bounds"][3:])
+        assert ((xyz >= lo - 1e-4) & (xyz <= hi + 1e-4)).all()
+        if node["children"]:
+            # Inner nodes keep at most one point per grid cell and pass the rest down
+            assert node["points"] <= GRID ** 3
+            assert all(nodes[child]["level"] == node["level"] + 1 for child in node["children"])
+        else:
+            assert node["points"] <= 1000
+
+
+def test_select_by_level(tiles):
+    selected = tiles.select(max_level=1)
+    assert [tile["name"] for tile in selected][0] == "r"
+    assert {tile["name"] for tile in selected} == {"r"} | set(tiles.nodes["r"]["children"])
+    for tile in selected:
+        assert tile["points"] == tiles.nodes[tile["name"]]["points"]
+    assert len(tiles.select(max_level=0)) == 1
+
+
+def test_select_by_bounds_skips_tiles_outside_the_frustum(tiles):
+    # Only x <= 4: children in the upper x half (octants 4-7) are outside
+    selected = tiles.select(planes=[(-1, 0, 0, 4)], max_level=1)
+    assert {tile["name"] for tile in selected} == {"r", "r0", "r1", "r2", "r3"}
+    deeper = tiles.select(planes=[(-1, 0, 0, 4)])
+    assert all(tile["bounds"][0] < 4 for tile in deeper)
+    assert sum(tile["points"] for tile in deeper) < 20000
+
+
+def test_select_stops_at_the_point_budget(tiles):
+    budget = 3 * GRID ** 3
+    selected = tiles.select(max_points=budget)
+    assert sum(tile["points"] for tile in selected) <= budget
+    # Breadth-first without a camera, so coarser levels come first
+    levels = [tile["level"] for tile in selected]
+    assert levels == sorted(levels)
+
+
+def test_path_rejects_unknown_or_malformed_names(tiles):
+    with pytest.raises(KeyError):
+        tiles.path("r9")
+    with pytest.raises(KeyError):
+        tiles.path("../index")
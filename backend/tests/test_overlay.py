@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+from overlay import OverlayRenderer
+
+
+def put_text_labels(frame, boxes):
+    # The per-frame drawing the renderer replaces
+    for x1, y1, x2, y2, name, confidence, color in boxes:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"{name}: {confidence:.2f}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+    return frame
+
+
+def background(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+
+def test_label_rounds_like_format():
+    renderer = OverlayRenderer()
+    assert renderer.label_text("person", 0.005) == f"person: {0.005:.2f}" == "person: 0.01"
+    assert renderer.label_text("person", 0.125) == "person: 0.12"
+
+
+def test_labels_cut_by_the_frame_edge_match_put_text():
+    # OpenCV clips strokes that leave the frame, which moves pixels that stay inside it
+    renderer = OverlayRenderer(box_thickness=2)
+    for x1, y1 in [(169, 128), (-30, 50), (0, 5), (280, 100), (100, -4), (-50, -10)]:
+        boxes = [(x1, y1, x1 + 40, y1 + 60, "person", 0.44, (0, 255, 0))]
+        for seed in range(7):
+            frame = background(seed)
+            expected = put_text_labels(frame.copy(), boxes)
+            assert np.array_equal(renderer.draw(frame, boxes), expected), (x1, y1, seed)
+
+
+def test_labels_inside_the_frame_within_one_level():
+    renderer = OverlayRenderer(box_thickness=2)
+    for seed in range(50):
+        boxes = [(20 + seed, 60 + seed, 120, 200, "person", seed / 50, (255, 191, 0))]
+        frame = background(seed)
+        expected = put_text_labels(frame.copy(), boxes).astype(int)
+        assert np.abs(renderer.draw(frame, boxes).astype(int) - expected).max() <= 1
@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import query_layer
+from db import BatchWriter, ConnectionPool, SQLiteBackend, SQLiteConnection, run_query
+from query_layer import QueryLayer, fetch_page
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE readings (id INTEGER PRIMARY KEY, value INT, name TEXT)")
+    conn.executemany("INSERT INTO readings VALUES (?, ?, ?)", [(i, i * 2, f"r{i}") for i in range(1, 26)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def layer(path, **options):
+    return QueryLayer(ConnectionPool(lambda: SQLiteConnection(path), size=2), **options)
+
+
+def ids(text):
+    # Data lines are "id | value | name"
+    return [int(line.split(" | ")[0]) for line in text.splitlines() if line[:1].isdigit()]
+
+
+def test_pages_report_their_range_and_whether_there_is_more(path):
+    async def main():
+        queries = layer(path, default_limit=10)
+        return [await queries.execute("SELECT * FROM readings", offset) for offset in (0, 10, 20, 30)]
+
+    first, second, last, past = asyncio.run(main())
+    assert first.startswith("Rows 1-10 of 25. Call again with offset=10")
+    assert ids(first) == list(range(1, 11))
+    assert second.startswith("Rows 11-20 of 25. Call again with offset=20")
+    assert ids(second) == list(range(11, 21))
+    assert last.startswith("Rows 21-25 of 25.\n")
+    assert ids(last) == list(range(21, 26))
+    assert past == "No rows at offset 30 (total 25)."
+
+
+def test_a_result_that_fits_one_page_has_no_summary(path):
+    conn = SQLiteConnection(path)
+    columns, rows, total, summary = fetch_page(conn, "SELECT * FROM readings WHERE id <= 10", 0, 10)
+    assert (columns, len(rows), total, summary) == (["id", "value", "name"], 10, 10, {})
+
+
+def test_larger_results_get_summaries_over_all_rows(path):
+    conn = SQLiteConnection(path)
+    columns, rows, total, summary = fetch_page(conn, "SELECT * FROM readings", 5, 5)
+    assert [row[0] for row in rows] == [6, 7, 8, 9, 10]
+    assert total == 25
+    # Text columns are not aggregated
+    assert summary == {"id": {"min": 1, "max": 25, "mean": 13.0}, "value": {"min": 2, "max": 50, "mean": 26.0}}
+    assert "  value: min 2, max 50, mean 26" in asyncio.run(layer(path, default_limit=5).execute("SELECT * FROM readings"))
+
+
+def test_ordered_queries_page_in_order(path):
+    sql = "SELECT * FROM readings WHERE id IN (SELECT id FROM readings ORDER BY id) ORDER BY value DESC"
+    assert query_layer.page_query(sql, 10, 10) == f"{sql} LIMIT 11 OFFSET 10"
+
+    async def main():
+        queries = layer(path, default_limit=10)
+        return [ids(await queries.execute(sql, offset)) for offset in (0, 10, 20)]
+
+    assert sum(asyncio.run(main()), []) == list(range(25, 0, -1))
+
+
+def test_ordered_queries_with_their_own_limit_are_streamed_in_order(path):
+    async def main():
+        stream_pool = ConnectionPool(lambda: SQLiteConnection(path), size=1)
+        queries = layer(path, stream_pool=stream_pool)
+        text = await queries.execute("SELECT * FROM readings ORDER BY id DESC LIMIT 5", offset=1, limit=2)
+        return text, queries.pool.checkouts, stream_pool.checkouts
+
+    text, paged, streamed = asyncio.run(main())
+    assert text.startswith("Rows 2-3 of 5.")
+    assert ids(text) == [24, 23]
+    assert (paged, streamed) == (0, 1)
+
+
+def test_statements_that_are_not_result_sets_are_streamed(path):
+    text = asyncio.run(layer(path).execute("EXPLAIN QUERY PLAN SELECT * FROM readings"))
+    assert text.startswith("Rows 1-1 of 1.")
+
+
+def test_invalid_queries_raise(path):
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(layer(path).execute("SELECT missing FROM readings"))
+
+
+def test_cached_until_the_writer_bumps_the_version(path):
+    async def main():
+        queries = layer(path, default_limit=5)
+        writer = BatchWriter(SQLiteBackend(path))
+        writer.on_flush.append(queries.bump)
+        before = await queries.execute("SELECT * FROM readings")
+        again = await queries.execute("SELECT *\n  FROM readings;")
+        hits = queries.stats()["hits"]
+
+        writer.add("readings", {"id": 26, "value": 52, "name": "r26"})
+        await writer.stop()
+        after = await queries.execute("SELECT * FROM readings")
+        return before, again, hits, after, queries.stats()
+
+    before, again, hits, after, stats = asyncio.run(main())
+    assert again == before and hits == 1
+    assert "of 26." in after
+    assert stats["hits"] == 1 and stats["misses"] == 2 and stats["version"] == 1
+
+
+def test_writes_run_once_and_invalidate(path):
+    async def main():
+        queries = layer(path)
+        await queries.execute("SELECT COUNT(*) FROM readings")
+        result = await queries.execute("DELETE FROM readings WHERE id > 20")
+        count = await queries.execute("SELECT COUNT(*) FROM readings")
+        return result, count, queries.stats()
+
+    result, count, stats = asyncio.run(main())
+    assert result == "OK, statement executed."
+    assert count.splitlines()[-1] == "20"
+    assert stats["writes"] == 1 and stats["hits"] == 0
+    assert run_query(SQLiteConnection(path), "SELECT COUNT(*) FROM readings")[1] == [(20,)]
+
+
+def test_error_code_reads_errno_or_first_argument():
+    error = Exception(1060, "Duplicate column name 'id'")
+    error.errno = 1060
+    assert query_layer.error_code(error) == 1060
+    assert query_layer.error_code(Exception(1064, "syntax")) == 1064
+    assert query_layer.error_code(ValueError("no code")) is None
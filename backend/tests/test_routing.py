@@ -0,0 +1,81 @@
+import asyncio
+import random
+
+from routing import CostGrid, LPAStar, RoutePlanner
+
+LAT, LNG = 35.77, -78.64
+
+
+def random_hazard(rng, hazard_id, span=0.01):
+    return {"id": hazard_id, "type": rng.choice(["pole", "tree", "fire", "flood"]),
+            "severity": rng.choice(["Low", "Moderate", "High", "Critical"]),
+            "location_lat": LAT + rng.uniform(0, span), "location_lng": LNG + rng.uniform(0, span)}
+
+
+def test_repaired_search_matches_fresh_search():
+    rng = random.Random(0)
+    for _ in range(10):
+        grid = CostGrid(LAT, LNG, LAT + 0.01, LNG + 0.01, 25.0)
+        hazards = [random_hazard(rng, i) for i in range(30)]
+        for hazard in hazards:
+            grid.add_hazard(hazard)
+        cells = grid.rows * grid.cols
+        search = LPAStar(grid, rng.randrange(cells), rng.randrange(cells))
+        for step in range(6):
+            repaired, fresh = search.search(), LPAStar(grid, search.start, search.goal).search()
+            assert (repaired is None) == (fresh is None)
+            if fresh is not None:
+                assert abs(repaired[1] - fresh[1]) < 1e-6
+            if hazards and rng.random() < 0.5:
+                changed, increased = grid.remove_hazard(hazards.pop(rng.randrange(len(hazards)))["id"]), False
+            else:
+                hazard = random_hazard(rng, 100 + step)
+                hazards.append(hazard)
+                changed, increased = grid.add_hazard(hazard), True
+            search.update(changed, increased)
+
+
+def run_planner(planner, *requests):
+    async def main():
+        return [await planner.plan(*request) for request in requests]
+    return asyncio.run(main())
+
+
+def test_cached_route_uses_each_requests_own_endpoints():
+    planner = RoutePlanner(lambda *box: [])
+    run_planner(planner, ((LAT, LNG), (LAT + 0.005, LNG + 0.005), []))
+    grid = planner.grids[frozenset()]
+    start = grid.center(grid.index(LAT, LNG))
+    goal = grid.center(grid.index(LAT + 0.005, LNG + 0.005))
+    # Two requests for different points in the same start and goal cells
+    nudged_start, nudged_goal = (start[0] + 0.00002, start[1] - 0.00002), (goal[0] - 0.00002, goal[1] + 0.00002)
+    first, second = run_planner(planner, (start, goal, []), (nudged_start, nudged_goal, []))
+    assert len(planner.routes) == 1  # All three requests share one search
+    assert first["waypoints"][0] == {"lat": start[0], "lng": start[1]}
+    assert second["waypoints"][0] == {"lat": nudged_start[0], "lng": nudged_start[1]}
+    assert second["waypoints"][-1] == {"lat": nudged_goal[0], "lng": nudged_goal[1]}
+
+
+def test_new_hazard_on_route_is_avoided():
+    planner = RoutePlanner(lambda *box: [])
+    start, goal = (LAT, LNG), (LAT, LNG + 0.01)
+    before, = run_planner(planner, (start, goal, ["fire"]))
+    # Critical fire straddling the straight line between start and goal
+    planner.add_hazard({"id": 1, "type": "fire", "severity": "Critical",
+                        "location_lat": LAT, "location_lng": LNG + 0.005})
+    after, = run_planner(planner, (start, goal, ["fire"]))
+    assert after["found"]
+    assert after["distance_m"] > before["distance_m"]
+    planner.remove_hazard(1)
+    cleared, = run_planner(planner, (start, goal, ["fire"]))
+    assert abs(cleared["distance_m"] - before["distance_m"]) < 1e-6
+
+
+def test_hazards_of_other_types_are_ignored():
+    planner = RoutePlanner(lambda *box: [])
+    start, goal = (LAT, LNG), (LAT, LNG + 0.01)
+    before, = run_planner(planner, (start, goal, ["flood"]))
+    planner.add_hazard({"id": 1, "type": "fire", "severity": "Critical",
+                        "location_lat": LAT, "location_lng": LNG + 0.005})
+    after, = run_planner(planner, (start, goal, ["flood"]))
+    assert after["distance_m"] == before["distance_m"]
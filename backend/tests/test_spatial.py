@@ -0,0 +1,48 @@
+import asyncio
+
+from spatial import SpatialIndex
+
+
+class Pool:
+    """Answers the index's refresh queries from a list of rows, honouring `id > last_id`."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = 0
+
+    async def query(self, sql, params):
+        rows = [row for row in self.rows if row[0] > params[0]]
+        self.fetched += len(rows)
+        return ["id", "location_lat", "location_lng", "timestamp"], rows
+
+
+def test_refresh_skips_rows_without_location_once():
+    pool = Pool([(1, None, None, None), (2, 35.78, -78.64, None), (3, None, None, None)])
+    index = SpatialIndex()
+
+    asyncio.run(index.refresh(pool, "persons"))
+    assert pool.fetched == 3
+    assert index.last_ids["persons"] == 3
+    assert list(index["persons"].items) == [2]
+
+    # Nothing new: the location-less rows are not read again
+    asyncio.run(index.refresh(pool, "persons"))
+    assert pool.fetched == 3
+
+
+def test_local_insert_does_not_skip_rows_written_elsewhere():
+    pool = Pool([(1, 35.78, -78.64, None)])
+    index = SpatialIndex()
+    inserted = []
+    index.on_insert.append(lambda kind, row: inserted.append(row["id"]))
+    asyncio.run(index.refresh(pool, "persons"))
+
+    # Row 3 is indexed locally (e.g. by an API handler) before row 2, written elsewhere, is read
+    index.insert("persons", {"id": 3, "location_lat": 35.79, "location_lng": -78.65, "timestamp": None})
+    pool.rows += [(2, 35.77, -78.63, None), (3, 35.79, -78.65, None)]
+    asyncio.run(index.refresh(pool, "persons"))
+
+    assert sorted(index["persons"].items) == [1, 2, 3]
+    assert index.last_ids["persons"] == 3
+    # Row 3 was not announced a second time
+    assert inserted == [1, 3, 2]
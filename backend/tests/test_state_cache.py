@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from state_cache import LatestStateCache
+
+
+def test_failed_persons_load_is_retried():
+    calls = []
+
+    async def loader():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ConnectionError("database unavailable")
+        return [{"id": 1}]
+
+    async def main():
+        cache = LatestStateCache()
+        with pytest.raises(ConnectionError):
+            await cache.get_persons(loader)
+        return await cache.get_persons(loader), cache
+
+    persons, cache = asyncio.run(main())
+    assert persons == [{"id": 1}]
+    assert len(calls) == 2
+    assert cache.versions["persons"] == 1
+
+
+def test_persons_reloaded_only_after_invalidate():
+    calls = []
+
+    async def loader():
+        calls.append(None)
+        return [{"id": len(calls)}]
+
+    async def main():
+        cache = LatestStateCache()
+        first = await cache.get_persons(loader)
+        second = await cache.get_persons(loader)
+        cache.invalidate("persons")
+        third = await cache.get_persons(loader)
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert first == second == [{"id": 1}]
+    assert third == [{"id": 2}]
+    assert len(calls) == 2
@@ -0,0 +1,102 @@
+import asyncio
+
+from telemetry import DeltaFilter, TelemetryFeed
+
+
+def status(**values):
+    row = {"name": "Drone 1", "is_connected": True, "battery_level": 80, "location_lat": 37.0, "location_lng": -122.0}
+    row.update(values)
+    return row
+
+
+def test_delta_filter_lets_through_the_first_row_and_real_changes():
+    deltas = DeltaFilter(heartbeat=30)
+    assert deltas.should_emit("Drone 1", status(), now=0)
+    # Below every delta
+    assert not deltas.should_emit("Drone 1", status(battery_level=79, location_lat=37.000001), now=1)
+    # Battery moved 2% from the last row let through, not from the suppressed one
+    assert deltas.should_emit("Drone 1", status(battery_level=78), now=2)
+    assert deltas.should_emit("Drone 1", status(battery_level=78, location_lng=-122.00002), now=3)
+    assert deltas.should_emit("Drone 1", status(battery_level=78, location_lng=-122.00002, is_connected=False), now=4)
+    assert deltas.stats() == {"passed": 4, "suppressed": 1, "heartbeat_s": 30}
+
+
+def test_delta_filter_heartbeat_and_keys_are_independent():
+    deltas = DeltaFilter(heartbeat=10)
+    assert deltas.should_emit("Drone 1", status(), now=0)
+    assert deltas.should_emit("Drone 2", status(name="Drone 2"), now=1)
+    assert not deltas.should_emit("Drone 1", status(), now=9.9)
+    assert deltas.should_emit("Drone 1", status(), now=10)
+    # The heartbeat restarts from the row it let through
+    assert not deltas.should_emit("Drone 1", status(), now=15)
+    assert not deltas.should_emit("Drone 2", status(name="Drone 2"), now=10.5)
+
+
+def test_delta_filter_compares_missing_values_exactly():
+    deltas = DeltaFilter(deltas={"battery_level": 5})
+    assert deltas.should_emit("Drone 1", {"battery_level": None}, now=0)
+    assert not deltas.should_emit("Drone 1", {"battery_level": None}, now=1)
+    assert deltas.should_emit("Drone 1", {"battery_level": 50}, now=2)
+
+
+class Drone:
+    def __init__(self):
+        self.state = {"bat": 90, "h": 0, "yaw": 0, "templ": 60}
+        self.reads = 0
+
+    def get_current_state(self):
+        self.reads += 1
+        return dict(self.state)
+
+
+def test_feed_version_moves_only_when_tracked_values_change():
+    drone = Drone()
+    feed = TelemetryFeed(drone.get_current_state)
+    changes = []
+    feed.on_change.append(changes.append)
+
+    first = feed.poll()
+    assert (first.version, first.battery_level, first.connected) == (1, 90, True)
+    # An untracked field changing keeps the same snapshot
+    drone.state["templ"] = 61
+    assert feed.poll() is first
+    drone.state["h"] = 120
+    second = feed.poll()
+    assert (second.version, second.height) == (2, 120)
+    assert changes == [first, second]
+    assert feed.reads == 3
+
+
+def test_feed_latest_rereads_only_after_the_period():
+    drone = Drone()
+    cached = TelemetryFeed(drone.get_current_state, period=60)
+    for _ in range(5):
+        cached.latest()
+    assert drone.reads == 1
+    uncached = TelemetryFeed(drone.get_current_state, period=0)
+    uncached.latest()
+    uncached.latest()
+    assert drone.reads == 3
+
+
+def test_feed_keeps_running_when_a_read_or_callback_fails():
+    drone = Drone()
+    reads = iter([RuntimeError("timeout"), None, None])
+
+    def read_state():
+        error = next(reads)
+        if error:
+            raise error
+        return drone.get_current_state()
+
+    async def main():
+        feed = TelemetryFeed(read_state, connected=lambda: False, period=0.001)
+        feed.on_change.append(lambda snapshot: 1 / 0)
+        task = asyncio.create_task(feed.run())
+        while feed.reads < 2:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        return feed
+
+    feed = asyncio.run(main())
+    assert feed.snapshot.version == 1 and not feed.snapshot.connected
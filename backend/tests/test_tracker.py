@@ -0,0 +1,74 @@
+import pytest
+
+from tracker import IoUTracker, iou
+
+
+def person(x, y=100, size=50, confidence=0.9):
+    return (x, y, x + size, y + size, confidence, 0, "person")
+
+
+def ids(tracker):
+    return [track.id for track in tracker.tracks]
+
+
+def test_iou():
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(1 / 3)
+    assert iou((0, 0, 10, 10), (10, 0, 20, 10)) == 0.0
+
+
+def test_moving_object_keeps_its_id_across_keyframes():
+    tracker = IoUTracker()
+    tracker.update([person(0)])
+    [first] = ids(tracker)
+    # Moves 4 px per frame; a keyframe every 5 frames
+    for keyframe in range(1, 6):
+        for _ in range(4):
+            tracker.predict()
+        tracker.update([person(20 * keyframe)])
+        assert ids(tracker) == [first]
+
+    # Between keyframes the box follows the estimated velocity
+    [predicted] = tracker.predict()
+    assert predicted[0] == pytest.approx(104, abs=1)
+
+
+def test_unmatched_tracks_are_hidden_then_expire():
+    tracker = IoUTracker(max_misses=2)
+    tracker.update([person(0)])
+    [track_id] = ids(tracker)
+
+    assert tracker.update([]) == []  # Missed once: kept, but not drawn
+    assert ids(tracker) == [track_id]
+    # Re-detected in place before expiry: same id, drawn again
+    assert len(tracker.update([person(0)])) == 1
+    assert ids(tracker) == [track_id]
+
+    for _ in range(3):
+        tracker.update([])
+    assert tracker.tracks == []
+    tracker.update([person(0)])
+    assert ids(tracker) == [track_id + 1]
+
+
+def test_only_keyframes_match_or_expire_tracks():
+    tracker = IoUTracker(max_misses=0)
+    tracker.update([person(0)])
+    [track_id] = ids(tracker)
+    # Any number of in-between frames neither counts as a miss nor drops the track
+    for _ in range(50):
+        assert len(tracker.predict()) == 1
+    assert tracker.tracks[0].misses == 0
+    tracker.update([person(0)])
+    assert ids(tracker) == [track_id]
+
+
+def test_matching_respects_class_and_model():
+    tracker = IoUTracker()
+    tracker.update([person(0)])
+    same_box_other_class = (0, 100, 50, 150, 0.9, 2, "person")
+    same_box_other_model = (0, 100, 50, 150, 0.9, 0, "fire")
+    tracker.update([person(0), same_box_other_class, same_box_other_model])
+    assert ids(tracker) == [1, 2, 3]
+    tracker.reset()
+    assert tracker.update([]) == []
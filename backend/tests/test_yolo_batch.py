@@ -0,0 +1,105 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import yolo_batch
+from yolo_batch import assemble, output_names, plan_shards, process_shard
+
+FRAMES = 40
+
+
+class FakeDetector:
+    """Stands in for YOLODetector: on keyframes it 'detects' the frame index painted into the frame."""
+
+    frame_interval = 5
+
+    def __init__(self):
+        self.current_detections = []
+
+    def reset(self, start=0):
+        self.current_detections = []
+
+    def process_frame(self, frame):
+        index = int(round(frame.mean() / 4))
+        if index % self.frame_interval == 0:
+            self.current_detections = [(0.0, 0.0, 10.0, 10.0, float(index), 0, "fake")]
+        return frame
+
+    def label(self, detection):
+        return "thing"
+
+
+class KeyframeSeekCapture:
+    """A capture whose seeks land on the previous keyframe (every 7th frame), as with many codecs."""
+
+    real = cv2.VideoCapture
+
+    def __init__(self, path):
+        self.cap = self.real(path)
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            value -= value % 7
+        return self.cap.set(prop, value)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for index in range(FRAMES):
+        out.write(np.full((48, 64, 3), index * 4, np.uint8))
+    out.release()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def detector(monkeypatch):
+    monkeypatch.setattr(yolo_batch, "detector", FakeDetector())
+
+
+def run(video, output_dir, shards):
+    shard_dir = os.path.join(output_dir, ".shards")
+    os.makedirs(shard_dir)
+    for start, end in shards:
+        process_shard(video, start, end, shard_dir)
+    _, sidecar = assemble(video, "clip", shards, shard_dir, output_dir)
+    with open(sidecar) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_sharded_output_matches_a_single_pass(video, tmp_path):
+    shards = plan_shards(FRAMES, 12, FakeDetector.frame_interval)
+    assert shards == [(0, 10), (10, 20), (20, 30), (30, 40)]
+    single = run(video, str(tmp_path / "single"), [(0, FRAMES)])
+    sharded = run(video, str(tmp_path / "sharded"), shards)
+
+    assert [record["frame"] for record in single] == list(range(FRAMES))
+    # Each frame carries the detections from its own most recent keyframe
+    assert [record["detections"][0]["confidence"] for record in single] == [i - i % 5 for i in range(FRAMES)]
+    assert sharded == single
+    assert int(cv2.VideoCapture(str(tmp_path / "sharded" / "clip_annotated.mp4")).get(cv2.CAP_PROP_FRAME_COUNT)) == FRAMES
+
+
+def test_inexact_seeks_read_forward_to_the_shard_start(video, tmp_path, monkeypatch):
+    single = run(video, str(tmp_path / "single"), [(0, FRAMES)])
+    monkeypatch.setattr(cv2, "VideoCapture", KeyframeSeekCapture)
+    # Seeking to 10 lands on 7; the three frames in between are read forward
+    cap = yolo_batch.open_at(video, 10)
+    assert int(round(cap.read()[1].mean() / 4)) == 10
+    assert run(video, str(tmp_path / "sharded"), plan_shards(FRAMES, 10, 5)) == single
+
+
+def test_videos_sharing_a_stem_get_distinct_names():
+    names = output_names(["a/clip.mp4", "b/clip.mp4", "b/other.mov"])
+    assert names["b/other.mov"] == "other"
+    assert names["a/clip.mp4"] != names["b/clip.mp4"]
+    assert all(names[video].startswith("clip-") for video in ("a/clip.mp4", "b/clip.mp4"))
+    # Stable across runs, so an interrupted batch resumes into the same shard directories
+    assert output_names(["b/clip.mp4", "a/clip.mp4"]) == {video: names[video] for video in ("a/clip.mp4", "b/clip.mp4")}
@@ -0,0 +1,93 @@
+// Decoder for binary frame messages sent by the backend /ws endpoint when
+// connecting with `?transport=binary` (see backend/src/backend/transport.py).
+//
+// Layout (big endian): magic "DF" | version u8 | flags u8 | frame id u32 |
+// timestamp f64 | metadata length u32 | metadata JSON | JPEG bytes
+
+const HEADER_SIZE = 20;
+const VERSION = 1;
+
+// Flag bits
+export const FLAG_ANNOTATED = 0x01; // Boxes are already drawn into the JPEG
+
+export interface DetectedObject {
+    class_name: string;
+    confidence: number;
+    bbox: [number, number, number, number];
+}
+
+export interface FrameMessage<T = Record<string, unknown>> {
+    frameId: number;
+    timestamp: number;
+    flags: number;
+    metadata: T;
+    jpeg: Blob;
+}
+
+export function decodeFrameMessage<T = Record<string, unknown>>(
+    buffer: ArrayBuffer
+): FrameMessage<T> {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1));
+    if (magic !== "DF" || view.getUint8(2) !== VERSION) {
+        throw new Error("Not a v1 frame message");
+    }
+
+    const metaLength = view.getUint32(16);
+    const metaEnd = HEADER_SIZE + metaLength;
+    const metadata = metaLength
+        ? JSON.parse(
+              new TextDecoder().decode(
+                  new Uint8Array(buffer, HEADER_SIZE, metaLength)
+              )
+          )
+        : {};
+
+    return {
+        flags: view.getUint8(3),
+        frameId: view.getUint32(4),
+        timestamp: view.getFloat64(8),
+        metadata,
+        jpeg: new Blob([buffer.slice(metaEnd)], { type: "image/jpeg" }),
+    };
+}
+
+// Metadata of a DRONE_DATA frame. Boxes are in source-frame pixels
+// (sourceWidth x sourceHeight); the JPEG is the source resized by `scale`,
+// which is below 1 when the server degrades quality for a slow link.
+export interface FrameMetadata {
+    event: "DRONE_DATA";
+    detected_objects: DetectedObject[];
+    annotated: boolean;
+    sourceWidth: number;
+    sourceHeight: number;
+    scale: number;
+}
+
+// Draws detection boxes over a clean frame (sent when connecting with
+// `?overlay=client`). Boxes are scaled from source-frame pixels to the canvas,
+// whatever size the JPEG arrived at, so the overlay style can differ per viewer.
+export function drawDetections(
+    ctx: CanvasRenderingContext2D,
+    metadata: FrameMetadata,
+    color = "#00ff00"
+) {
+    const sx = ctx.canvas.width / metadata.sourceWidth;
+    const sy = ctx.canvas.height / metadata.sourceHeight;
+    ctx.save();
+    ctx.strokeStyle = color;
+    ctx.fillStyle = color;
+    ctx.lineWidth = 2;
+    ctx.font = "16px sans-serif";
+    ctx.textBaseline = "bottom";
+    for (const { class_name, confidence, bbox } of metadata.detected_objects) {
+        const [x1, y1, x2, y2] = bbox;
+        ctx.strokeRect(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy);
+        ctx.fillText(
+            `${class_name}: ${confidence.toFixed(2)}`,
+            x1 * sx,
+            y1 * sy - 4
+        );
+    }
+    ctx.restore();
+}